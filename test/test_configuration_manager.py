@@ -30,6 +30,26 @@ def test_config_values(cm):
     assert isinstance(config, str)
     assert config in ["yfinance", "alpha_vantage"]
 
+    config = cm.get_replay_engine()
+    assert isinstance(config, str)
+    assert config in ["python", "numpy"]
+
+    config = cm.get_trading_log_journal()
+    assert isinstance(config, bool)
+    assert config is False
+
+    config = cm.get_trading_log_cache()
+    assert isinstance(config, bool)
+    assert config is False
+
+    config = cm.get_trading_log_compact()
+    assert isinstance(config, bool)
+    assert config is False
+
+    config = cm.get_trading_log_watch_period()
+    assert isinstance(config, float)
+    assert config == 0
+
     config = cm.get_alpha_vantage_api_key()
     assert isinstance(config, str)
     assert config == "API_KEY"
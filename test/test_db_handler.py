@@ -4,6 +4,8 @@ from pathlib import Path
 import pytest
 
 from tradingmate.model import ConfigurationManager, DatabaseHandler, Trade
+from tradingmate.model.storage import JsonStorage
+from tradingmate.utils import Utils
 
 
 @pytest.fixture
@@ -39,6 +41,20 @@ def test_write_data(dbh):
     assert mock_path.is_file()
 
 
+def test_save_data(configuration, dbh, tmp_path):
+    """
+    Test background saves write a snapshot of the trade history
+    """
+    mock_path = Path(tmp_path, "test.json")
+    dbh.save_data(mock_path)
+    # Changes made after the request are not part of the snapshot
+    dbh.delete_trade("mock_last_trade")
+    assert dbh.wait_for_saves()
+    saved = DatabaseHandler(configuration, mock_path)
+    assert len(saved.get_trades_list()) == len(dbh.get_trades_list()) + 1
+    assert list(tmp_path.iterdir()) == [mock_path]
+
+
 def test_get_db_filepath(dbh):
     """
     Test it returns the correct filepath
@@ -77,8 +93,83 @@ def test_add_trade(dbh):
         "notes": "hello",
     }
     trade = Trade.from_dict(item)
+    history = dbh.trading_history
     dbh.add_trade(trade)
     assert len(dbh.trading_history) == prev_len + 1
+    # The trade is inserted in place in the date sorted history
+    assert dbh.trading_history is history
+    assert dbh.trading_history[0] is trade
+    # Trades with the same date keep the insertion order
+    same_date = Trade.from_dict(item)
+    dbh.add_trade(same_date)
+    assert dbh.trading_history[1] is same_date
+    last = dbh.trading_history[-1]
+    item["date"] = last.date.strftime("%d/%m/%Y %H:%M")
+    newest = Trade.from_dict(item)
+    dbh.add_trade(newest)
+    assert dbh.trading_history[-1] is newest
+    assert dbh.trading_history[-2] is last
+    dates = [t.date for t in dbh.trading_history]
+    assert dates == sorted(dates)
+
+
+def test_add_trades(dbh):
+    """
+    Test it merges the trades in the in memory list sorted by date
+    """
+    prev_len = len(dbh.trading_history)
+    item = {
+        "id": "0",
+        "date": "01/01/0001 00:00",
+        "action": "BUY",
+        "quantity": 1,
+        "symbol": "MOCK",
+        "price": 1.0,
+        "fee": 1.0,
+        "stamp_duty": 1.0,
+        "notes": "hello",
+    }
+    trades = []
+    for date in ["01/01/2030 00:00", "01/01/0001 00:00", "01/01/2018 00:00"]:
+        item["date"] = date
+        trades.append(Trade.from_dict(item))
+    dbh.add_trades(trades)
+    assert len(dbh.trading_history) == prev_len + 3
+    assert dbh.trading_history[0] is trades[1]
+    assert dbh.trading_history[-1] is trades[0]
+    dates = [t.date for t in dbh.trading_history]
+    assert dates == sorted(dates)
+
+
+def test_add_trades_journaled(configuration, tmp_path):
+    """
+    Test the trades added at once are journaled once even if they trigger
+    a compaction of the journal
+    """
+    filepath = Path(tmp_path, "trading_log.json")
+    JsonStorage(filepath).write("mock", [])
+    configuration.config["general"]["trading_log_journal"] = True
+    dbh = DatabaseHandler(configuration, filepath)
+    dbh._storage._compaction_threshold = 20
+    item = {
+        "id": "0",
+        "date": "01/01/2020 00:00",
+        "action": "DEPOSIT",
+        "quantity": 1,
+        "symbol": "",
+        "price": 0.0,
+        "fee": 0.0,
+        "stamp_duty": 0.0,
+        "notes": "mock",
+    }
+    trades = []
+    for i in range(25):
+        item["id"] = str(i)
+        trades.append(Trade.from_dict(item))
+    dbh.add_trades(trades)
+    dbh.close()
+    reloaded = DatabaseHandler(configuration, filepath)
+    assert [t.id for t in reloaded.get_trades_list()] == [t.id for t in trades]
 
 
 def test_delete_trade(dbh):
@@ -104,6 +195,124 @@ def test_delete_trade(dbh):
     assert len(dbh.trading_history) == prev_len
 
 
+def test_storage_failures_keep_history(dbh, monkeypatch):
+    """
+    Test the trade history is not changed if the storage fails to store a change
+    """
+
+    def fail(*args):
+        raise OSError("mock failure")
+
+    for method in ["on_trade_added", "on_trades_added", "on_trade_deleted"]:
+        monkeypatch.setattr(dbh._storage, method, fail)
+    history = list(dbh.trading_history)
+    symbol_trades = dbh.get_symbol_trades("MOCK13")
+    position = dbh.find_trade_position("mock")
+    item = {
+        "id": "mock",
+        "date": "01/01/2018 00:00",
+        "action": "BUY",
+        "quantity": 1,
+        "symbol": "MOCK13",
+        "price": 1.0,
+        "fee": 1.0,
+        "stamp_duty": 1.0,
+        "notes": "hello",
+    }
+    with pytest.raises(RuntimeError):
+        dbh.add_trade(Trade.from_dict(item))
+    with pytest.raises(RuntimeError):
+        dbh.add_trades([Trade.from_dict(item)])
+    with pytest.raises(RuntimeError):
+        dbh.delete_trade("mock")
+    assert dbh.trading_history == history
+    assert dbh.get_symbol_trades("MOCK13") == symbol_trades
+    assert dbh.find_trade_position("mock") == position
+
+
 def test_get_trading_log_name(dbh):
     """Test the db name is read"""
     assert dbh.get_trading_log_name() == "mock1"
+
+
+def test_trade_indexes(dbh):
+    """
+    Test the symbol and id indexes follow the changes of the trade history
+    """
+    assert dbh.get_symbol_trades("MOCK13") == [
+        t for t in dbh.trading_history if t.symbol == "MOCK13"
+    ]
+    assert dbh.get_symbol_trades("UNKNOWN") == []
+    # Ids are not unique so the first trade with the id is found
+    position = dbh.find_trade_position("mock")
+    assert position == next(
+        i for i, t in enumerate(dbh.trading_history) if t.id == "mock"
+    )
+    assert dbh.find_trade_position("unknown") is None
+    item = {
+        "id": "mock",
+        "date": "01/01/0001 00:00",
+        "action": "BUY",
+        "quantity": 1,
+        "symbol": "MOCK13",
+        "price": 1.0,
+        "fee": 1.0,
+        "stamp_duty": 1.0,
+        "notes": "hello",
+    }
+    trade = Trade.from_dict(item)
+    dbh.add_trade(trade)
+    assert dbh.find_trade_position("mock") == 0
+    assert dbh.get_symbol_trades("MOCK13")[0] is trade
+    dbh.delete_trade("mock")
+    assert trade not in dbh.trading_history
+    assert trade not in dbh.get_symbol_trades("MOCK13")
+    assert dbh.find_trade_position("mock") == position
+    with pytest.raises(RuntimeError):
+        dbh.delete_trade("unknown")
+
+
+def test_read_external_changes(configuration, dbh, tmp_path):
+    mock_path = Path(tmp_path, "test.json")
+    assert dbh.write_data(mock_path)
+    dbh.read_data(mock_path)
+    assert not dbh.has_external_changes()
+    # Remove one of the trades with a duplicated id and add a new one
+    other = DatabaseHandler(configuration, mock_path)
+    other.delete_trade("mock")
+    other.add_trade(
+        Trade.from_dict(dict(dbh.get_trades_list()[-1].to_dict(), id="new"))
+    )
+    assert other.write_data()
+    assert dbh.has_external_changes()
+    added, removed = dbh.read_external_changes()
+    assert [t.id for t in added] == ["new"]
+    assert removed == ["mock"]
+    # The trade history is not modified and the changes are reported until
+    # they are applied
+    assert len(dbh.get_trades_list()) == 54
+    assert dbh.has_external_changes()
+    dbh.accept_external_changes()
+    assert not dbh.has_external_changes()
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz", ".bz2"])
+def test_compressed_trading_log(configuration, dbh, tmp_path, suffix):
+    mock_path = Path(tmp_path, "test.json" + suffix)
+    assert dbh.write_data(mock_path)
+    # The file is compressed with the format of its extension
+    data = Utils.load_json_file(mock_path)
+    assert data["name"] == dbh.get_trading_log_name()
+    with mock_path.open(mode="rb") as f:
+        assert f.read(1) != b"{"
+    compressed = DatabaseHandler(configuration, mock_path)
+    assert [t.to_dict() for t in compressed.get_trades_list()] == [
+        t.to_dict() for t in dbh.get_trades_list()
+    ]
+    # Compact files are written without indentation
+    assert JsonStorage(mock_path, compact=True).write(
+        dbh.get_trading_log_name(), dbh.get_trades_list()
+    )
+    with Utils.open_file(mock_path, "r") as f:
+        assert "\n" not in f.read()
+    assert Utils.load_json_file(mock_path) == data
@@ -105,3 +105,12 @@ def test_set_last_price_invalid():
     assert h.get_last_price_valid()
     h.set_last_price_invalid()
     assert h.get_last_price_valid() is False
+
+
+def test_slots():
+    h = Holding("".join(["mo", "ck"]), 1)
+    assert not hasattr(h, "__dict__")
+    assert h.get_symbol() is Holding("mock", 2).get_symbol()
+    # Instances do not share any state
+    h.set_open_price(100)
+    assert Holding("mock", 1).get_open_price() is None
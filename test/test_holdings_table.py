@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+import pytest
+
+from tradingmate.model import Holding, HoldingsTable, PortfolioSummary
+
+
+def summarize(holdings):
+    """Summary of the holdings computed one Holding at a time"""
+    values = [h.get_value() for h in holdings]
+    costs = [h.get_cost() for h in holdings]
+    value_sum = None if None in values else sum(values)
+    cost_sum = None if None in costs else sum(costs)
+    if value_sum is None or cost_sum is None:
+        return PortfolioSummary(value_sum, None, None)
+    pl_sum = sum(v - c for v, c in zip(values, costs))
+    pl_perc = ((value_sum - cost_sum) / cost_sum) * 100 if cost_sum >= 1 else None
+    return PortfolioSummary(value_sum, pl_sum, pl_perc)
+
+
+@pytest.fixture
+def holdings():
+    return [
+        Holding("MOCK2", 20, 150.5),
+        Holding("MOCK1", 10, 100.0),
+        Holding("MOCK3", 5, None),
+    ]
+
+
+def test_create(holdings):
+    table = HoldingsTable.create(holdings, {"MOCK1": 120.0, "MOCK42": 1.0})
+    assert len(table) == 3
+    assert table.symbols == ["MOCK1", "MOCK2", "MOCK3"]
+    assert "MOCK1" in table and "MOCK42" not in table
+    assert table.get_quantity("MOCK2") == 20
+    assert table.get_quantity("MOCK42") == 0
+    assert table.get_open_price("MOCK3") is None
+    assert table.get_last_price("MOCK1") == 120.0
+    assert table.get_last_price("MOCK2") is None
+    assert list(table.open_price_valid) == [True, True, False]
+    assert list(table.last_price_valid) == [True, False, False]
+    holding = table.get_holding("MOCK1")
+    assert holding.get_quantity() == 10
+    assert holding.get_open_price() == 100.0
+    assert holding.get_last_price() == 120.0
+    # The arrays can not be modified
+    with pytest.raises(ValueError):
+        table.quantity[0] = 1
+
+
+def test_with_last_prices(holdings):
+    table = HoldingsTable.create(holdings, {})
+    updated = table.with_last_prices({"MOCK2": 160.0})
+    assert updated.get_last_price("MOCK2") == 160.0
+    assert table.get_last_price("MOCK2") is None
+    with pytest.raises(ValueError):
+        table.with_last_prices({"MOCK1": -1.0})
+
+
+def test_rows(holdings):
+    table = HoldingsTable.create(holdings, {"MOCK1": 120.0, "MOCK3": 10.0})
+    for index, symbol in enumerate(table.symbols):
+        holding = table.get_holding(symbol)
+        for rows, expected in [
+            (table.get_costs(), holding.get_cost()),
+            (table.get_values(), holding.get_value()),
+            (table.get_profit_loss(), holding.get_profit_loss()),
+            (table.get_profit_loss_perc(), holding.get_profit_loss_perc()),
+        ]:
+            if expected is None:
+                assert math.isnan(rows[index])
+            else:
+                assert rows[index] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "last_prices",
+    [
+        {},
+        {"MOCK1": 120.0, "MOCK2": 140.0},
+        {"MOCK1": 120.0, "MOCK2": 140.0, "MOCK3": 10.0},
+    ],
+)
+def test_get_summary(holdings, last_prices):
+    expected = []
+    for holding in holdings:
+        copy = Holding(
+            holding.get_symbol(), holding.get_quantity(), holding.get_open_price()
+        )
+        if copy.get_symbol() in last_prices:
+            copy.set_last_price(last_prices[copy.get_symbol()])
+        expected.append(copy)
+    # Summaries of all the holdings and of the ones with an open price
+    for rows in [expected, expected[:2]]:
+        table = HoldingsTable.create(rows, last_prices)
+        assert table.get_summary() == pytest.approx(summarize(rows))
+
+
+def test_profit_loss_perc_without_cost():
+    table = HoldingsTable.create([Holding("MOCK1", 10, 0.0)], {"MOCK1": 1.0})
+    assert table.get_profit_loss()[0] == pytest.approx(0.1)
+    assert math.isnan(table.get_profit_loss_perc()[0])
+
+
+def test_empty():
+    table = HoldingsTable.create([], {"MOCK1": 1.0})
+    assert len(table) == 0
+    assert table.get_summary() == PortfolioSummary(0.0, 0.0, None)
+    assert np.array_equal(table.get_values(), np.array([]))
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tradingmate.model import Trade
+from tradingmate.model.storage import JournalStorage, JsonStorage
+
+
+def make_trade(trade_id, date):
+    return Trade.from_dict(
+        {
+            "id": trade_id,
+            "date": date,
+            "action": "DEPOSIT",
+            "quantity": 100,
+            "symbol": "",
+            "price": 0.0,
+            "fee": 0.0,
+            "stamp_duty": 0.0,
+            "notes": "mock",
+        }
+    )
+
+
+@pytest.fixture
+def filepath(tmp_path):
+    path = Path(tmp_path, "trading_log.json")
+    shutil.copy("test/test_data/trading_log.json", path)
+    return path
+
+
+def test_read(filepath):
+    name, trades = JournalStorage(filepath).read()
+    expected = JsonStorage(filepath).read()
+    assert name == expected[0]
+    assert [t.to_dict() for t in trades] == [t.to_dict() for t in expected[1]]
+
+
+def test_changes_are_journaled(filepath):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    base = filepath.read_text()
+    new_trade = make_trade("journal_trade", "01/01/2030 00:00")
+    trades.append(new_trade)
+    storage.on_trade_added(new_trade, name, trades)
+    deleted = next(t for t in trades if t.id == "mock_last_trade")
+    trades.remove(deleted)
+    storage.on_trade_deleted(deleted, name, trades)
+    # The trading log is untouched and the journal holds one line per change
+    assert filepath.read_text() == base
+    lines = storage.get_journal_filepath().read_text().splitlines()
+    assert [json.loads(line)["sequence"] for line in lines] == [1, 2]
+    # Reading the trading log again replays the journal
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+
+
+def test_incomplete_entry_is_skipped(filepath):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    new_trade = make_trade("journal_trade", "01/01/2030 00:00")
+    trades.append(new_trade)
+    storage.on_trade_added(new_trade, name, trades)
+    # Simulate a crash in the middle of an append
+    with storage.get_journal_filepath().open(mode="a") as f:
+        f.write('{"add": {"id": "partial"')
+    storage = JournalStorage(filepath)
+    _, reloaded = storage.read()
+    assert reloaded[-1].id == "journal_trade"
+    other_trade = make_trade("other_trade", "02/01/2030 00:00")
+    reloaded.append(other_trade)
+    storage.on_trade_added(other_trade, name, reloaded)
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.id for t in reloaded[-2:]] == ["journal_trade", "other_trade"]
+
+
+def test_failed_append_is_dropped(filepath, monkeypatch):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    first = make_trade("first", "01/01/2030 00:00")
+    storage.on_trade_added(first, name, trades + [first])
+
+    def fail(fd):
+        raise OSError("mock failure")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    failed = make_trade("failed", "02/01/2030 00:00")
+    with pytest.raises(OSError):
+        storage.on_trade_added(failed, name, trades + [first, failed])
+    monkeypatch.undo()
+    assert storage.get_version() == 1
+    _, reloaded = JournalStorage(filepath).read()
+    assert reloaded[-1].id == "first"
+
+
+def test_compaction(filepath):
+    storage = JournalStorage(filepath, compaction_threshold=3)
+    name, trades = storage.read()
+    for i in range(3):
+        trade = make_trade(f"trade_{i}", "01/01/2030 00:00")
+        trades.append(trade)
+        storage.on_trade_added(trade, name, trades)
+    storage.close()
+    # The journal has been compacted into the trading log
+    assert storage.get_journal_filepath().read_text() == ""
+    json_obj = json.loads(filepath.read_text())
+    assert json_obj["journal_sequence"] == 3
+    assert len(json_obj["trades"]) == len(trades)
+    # The trading log is still readable as a plain json file
+    _, reloaded = JsonStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+    # New entries continue the sequence
+    trade = make_trade("trade_3", "01/01/2030 00:00")
+    trades.append(trade)
+    storage.on_trade_added(trade, name, trades)
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+    # Saving compacts the pending entries
+    assert storage.write(name, trades)
+    storage.close()
+    assert storage.get_journal_filepath().read_text() == ""
+    assert json.loads(filepath.read_text())["journal_sequence"] == 4
+
+
+def test_write_snapshot_keeps_later_changes(filepath):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    first = make_trade("first", "01/01/2030 00:00")
+    trades.append(first)
+    storage.on_trade_added(first, name, trades)
+    # A background save takes the snapshot before the next change
+    snapshot = list(trades)
+    version = storage.get_version()
+    second = make_trade("second", "02/01/2030 00:00")
+    trades.append(second)
+    storage.on_trade_added(second, name, trades)
+    assert storage.write_snapshot(name, snapshot, version)
+    storage.wait_for_compaction()
+    # The change made after the snapshot is still in the journal
+    assert json.loads(filepath.read_text())["journal_sequence"] == 1
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+    # Older snapshots never replace a newer compaction
+    assert storage.write(name, trades)
+    storage.wait_for_compaction()
+    third = make_trade("third", "03/01/2030 00:00")
+    trades.append(third)
+    storage.on_trade_added(third, name, trades)
+    assert storage.write_snapshot(name, snapshot, version)
+    storage.wait_for_compaction()
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+
+
+def test_close_compacts_pending_changes(filepath):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    trade = make_trade("journal_trade", "01/01/2030 00:00")
+    trades.append(trade)
+    storage.on_trade_added(trade, name, trades)
+    # Journaled changes can not be read with the journal disabled
+    with pytest.raises(RuntimeError):
+        JsonStorage(filepath).read()
+    storage.close()
+    assert storage.get_journal_filepath().read_text() == ""
+    _, reloaded = JsonStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
+    # Plain writes followed by a journal enabled read do not replay old entries
+    assert JsonStorage(filepath).write(name, reloaded[:-1])
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades[:-1]]
+
+
+def test_older_compaction_does_not_replace_newer(filepath):
+    storage = JournalStorage(filepath)
+    name, trades = storage.read()
+    snapshots = []
+    for i in range(2):
+        trade = make_trade(f"trade_{i}", "01/01/2030 00:00")
+        trades.append(trade)
+        storage.on_trade_added(trade, name, trades)
+        snapshots.append(list(trades))
+    # The compaction of the newer snapshot completes first
+    storage._compact(name, snapshots[1], 2)
+    storage._compact(name, snapshots[0], 1)
+    assert json.loads(filepath.read_text())["journal_sequence"] == 2
+    assert list(filepath.parent.glob("*.tmp")) == []
+    _, reloaded = JournalStorage(filepath).read()
+    assert [t.to_dict() for t in reloaded] == [t.to_dict() for t in trades]
@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from tradingmate.model.storage import JsonStreamReader
+
+
+def read(text, chunk_size):
+    items = []
+    members = JsonStreamReader(io.StringIO(text), chunk_size).read_object(
+        "trades", items.append
+    )
+    return members, items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+def test_read_object(chunk_size):
+    with open("test/test_data/trading_log.json", "r") as f:
+        text = f.read()
+    expected = json.loads(text)
+    members, items = read(text, chunk_size)
+    assert items == expected["trades"]
+    assert members == {k: v for k, v in expected.items() if k != "trades"}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_read_values(chunk_size):
+    text = '{"trades": [12345, -1.5e3, "a,b]", {"x": [1, 2]}], "name": "n", "n": 42}'
+    members, items = read(text, chunk_size)
+    assert items == [12345, -1.5e3, "a,b]", {"x": [1, 2]}]
+    assert members == {"name": "n", "n": 42}
+    assert read('{ "trades" : [ ] }', chunk_size) == ({}, [])
+    assert read("{}", chunk_size) == ({}, [])
+    assert read('{"trades": [1]} \n', chunk_size) == ({}, [1])
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"trades": [1, 2',
+        '{"trades": [1 2]}',
+        "[]",
+        "",
+        '{"name": "x", "trades": [1, 2]} junk',
+        "{} {}",
+    ],
+)
+def test_read_invalid(text):
+    with pytest.raises(ValueError):
+        read(text, 4)
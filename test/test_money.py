@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from tradingmate.model import UNITS_PER_POUND, Money, Trade
+from tradingmate.utils import Actions
+
+
+def make_trade(action, quantity, price=0.0, fee=0.0, sdr=0.0):
+    return Trade(datetime.now(), action, quantity, "MOCK", price, fee, sdr, "")
+
+
+def test_from_to_pounds():
+    assert Money.from_pounds(1) == UNITS_PER_POUND
+    assert Money.from_pounds(0.1) == UNITS_PER_POUND // 10
+    assert Money.to_pounds(Money.from_pounds(2465.0343736)) == 2465.0343736
+
+
+def test_sums_are_exact():
+    # Float sums accumulate rounding errors, fixed point sums do not
+    deltas = [Money.get_cash_delta(make_trade(Actions.DEPOSIT, 0.1))] * 10
+    assert sum([0.1] * 10) != 1.0
+    assert Money.to_pounds(sum(deltas)) == 1.0
+
+
+@pytest.mark.parametrize(
+    "action, quantity, expected",
+    [
+        (Actions.DEPOSIT, 10.5, 10.5),
+        (Actions.DIVIDEND, 10.5, 10.5),
+        (Actions.WITHDRAW, 10.5, -10.5),
+        (Actions.FEE, 10.5, -10.5),
+        # Cost of 10 shares at 123.456p is £12.3456 plus 0.5% of stamp duty
+        (Actions.BUY, 10, -(12.3456 + 1.5 + 0.061728)),
+        (Actions.SELL, 10, 12.3456 - 1.5),
+    ],
+)
+def test_get_cash_delta(action, quantity, expected):
+    trade = make_trade(action, quantity, 123.456, 1.5, 0.5)
+    assert Money.to_pounds(Money.get_cash_delta(trade)) == pytest.approx(expected)
+    assert Money.get_cash_delta(trade) == Money.from_pounds(expected)
+
+
+def test_get_buy_total():
+    trade = make_trade(Actions.BUY, 3, 33.333333, 0.0, 0.5)
+    # Amounts are rounded to the closest micro-penny
+    assert Money.get_cost(trade) == 99999999
+    assert Money.get_buy_total(trade) == 99999999 + 500000
@@ -1,14 +1,25 @@
 import json
 import os
+import random
 import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytest
 
-from tradingmate.model import ConfigurationManager, Portfolio, Trade
+from tradingmate.model import Checkpoint, ConfigurationManager, Money, Portfolio, Trade
+from tradingmate.model.portfolio import _EditedTradeList
+from tradingmate.model.storage import TradingLogCache
+from tradingmate.utils import (
+    Actions,
+    Messages,
+    ReplayEngines,
+    TradeNotAllowedError,
+    TradingLogConflictError,
+)
 
 # These variables are based on the content of the test trading log
-PF_CASH_AVAILABLE = 2465.0343736000013
+PF_CASH_AVAILABLE = 2465.0343736
 PF_CASH_DEPOSITED = 7700
 PF_MOCK13_QUANTITY = 1192
 PF_MOCK4_QUANTITY = 438
@@ -156,7 +167,38 @@ def test_has_unsaved_changes(portfolio):
     portfolio.add_trade(Trade.from_dict(item))
     assert portfolio.has_unsaved_changes() is True
     portfolio.save_portfolio("/tmp/TradingMate_test_portfolio.json")
+    assert portfolio.wait_for_saves()
     assert portfolio.has_unsaved_changes() is False
+    assert portfolio.pop_save_error() is None
+
+
+def test_has_unsaved_changes_until_saved(portfolio, tmp_path):
+    item = {
+        "id": "0",
+        "date": "01/01/2020 00:00",
+        "action": "DEPOSIT",
+        "quantity": 1000,
+        "symbol": "",
+        "price": 0,
+        "fee": 0,
+        "stamp_duty": 0,
+        "notes": "mock",
+    }
+    portfolio.add_trade(Trade.from_dict(item))
+    # Failing saves leave the changes unsaved and report the failure
+    portfolio.save_portfolio(Path(tmp_path, "missing", "trading_log.json"))
+    assert not portfolio.wait_for_saves()
+    assert portfolio.has_unsaved_changes()
+    assert portfolio.pop_save_error() == Messages.ERROR_SAVE_FILE.value
+    assert portfolio.pop_save_error() is None
+    # Changes made after the snapshot of a save are still unsaved
+    portfolio.save_portfolio(Path(tmp_path, "trading_log.json"))
+    portfolio.add_trade(Trade.from_dict(item))
+    assert portfolio.wait_for_saves()
+    assert portfolio.has_unsaved_changes()
+    portfolio.save_portfolio(Path(tmp_path, "trading_log.json"))
+    assert portfolio.wait_for_saves()
+    assert not portfolio.has_unsaved_changes()
 
 
 def test_get_trade_history(portfolio):
@@ -170,12 +212,34 @@ def test_save_portfolio(portfolio):
         os.remove(filepath)
     assert not filepath.exists()
     portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
     assert filepath.exists()
     config = ConfigurationManager(Path("test/test_data/config.json"))
     new_pf = Portfolio(config, filepath)
     test_get_total_value(new_pf)
 
 
+@pytest.mark.parametrize("filename", ["trading_log.json", "trading_log.db"])
+def test_save_portfolio_to_trading_log(portfolio, tmp_path, filename):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    filepath = Path(tmp_path, filename)
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    loaded = Portfolio(config, filepath)
+    loaded.add_trade(
+        Trade(datetime(2019, 2, 1), Actions.DEPOSIT, 100, "", 0, 0, 0, "", "new")
+    )
+    # Without a filepath the portfolio is saved to its own trading log
+    loaded.save_portfolio(None)
+    assert loaded.wait_for_saves()
+    assert not loaded.has_unsaved_changes()
+    loaded.stop()
+    reloaded = Portfolio(config, filepath)
+    assert reloaded.get_cash_available() == PF_CASH_AVAILABLE + 100
+    assert reloaded.get_trade_history()[-1].id == "new"
+    reloaded.stop()
+
+
 def test_add_trade(portfolio):
     # NOTE The dates in the mock items below needs to be sequencial
     # Valid buy
@@ -476,3 +540,900 @@ def test_add_trade_invalid_past_date(portfolio):
     }
     with pytest.raises(RuntimeError):
         assert not portfolio.add_trade(Trade.from_dict(item))
+
+
+def test_add_trade_latest_matches_full_reload(portfolio):
+    # Trades newer than the history are applied directly on the current state
+    items = [
+        ("01/01/2020 00:00", "BUY", 10, "MOCK", 100.0),
+        ("02/01/2020 00:00", "BUY", 5, "MOCK13", 200.0),
+        ("03/01/2020 00:00", "SELL", 4, "MOCK", 150.0),
+        ("04/01/2020 00:00", "SELL", 6, "MOCK", 150.0),
+        ("05/01/2020 00:00", "FEE", 1, "", 0.0),
+    ]
+    for date, action, quantity, symbol, price in items:
+        item = {
+            "id": "0",
+            "date": date,
+            "action": action,
+            "quantity": quantity,
+            "symbol": symbol,
+            "price": price,
+            "fee": 1.0,
+            "stamp_duty": 0.5,
+            "notes": "mock",
+        }
+        portfolio.add_trade(Trade.from_dict(item))
+    deposited, available, holdings, _, _ = portfolio._load_from_trade_list(
+        portfolio.get_trade_history()
+    )
+    assert portfolio.get_cash_deposited() == Money.to_pounds(deposited)
+    assert portfolio.get_cash_available() == Money.to_pounds(available)
+    assert portfolio.get_holding_symbols() == sorted(holdings.keys())
+    for symbol, holding in holdings.items():
+        assert portfolio.get_holding_quantity(symbol) == holding.get_quantity()
+        assert portfolio.get_holding_open_price(symbol) == holding.get_open_price()
+    assert "MOCK" not in portfolio.get_holding_symbols()
+
+
+def test_add_trade_latest_failing_keeps_history(portfolio):
+    # A fractional buy of a new symbol fails while applied on the current state
+    portfolio._checkpoint_interval = 54
+    item = {
+        "id": "fractional",
+        "date": "01/01/2020 00:00",
+        "action": "BUY",
+        "quantity": 0.5,
+        "symbol": "MOCK",
+        "price": 1.0,
+        "fee": 0.0,
+        "stamp_duty": 0.0,
+        "notes": "mock",
+    }
+    with pytest.raises(TradeNotAllowedError):
+        portfolio.add_trade(Trade.from_dict(item))
+    assert len(portfolio.get_trade_history()) == 54
+    assert portfolio._db_handler.find_trade_position("fractional") is None
+    assert portfolio._checkpoints == []
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+    # The history can still be loaded and edited
+    portfolio._load(portfolio.get_trade_history())
+    item["quantity"] = 1
+    portfolio.add_trade(Trade.from_dict(item))
+    assert portfolio.get_holding_quantity("MOCK") == 1
+
+
+def test_edit_past_trades_replay_from_checkpoint(portfolio):
+    # Use a small interval so that the test trading log has several checkpoints
+    portfolio._checkpoint_interval = 10
+    portfolio._load(portfolio.get_trade_history())
+    assert [c.position for c in portfolio._checkpoints] == [10, 20, 30, 40, 50]
+    item = {
+        "id": "past_deposit",
+        "date": "01/09/2018 00:00",
+        "action": "DEPOSIT",
+        "quantity": 1000,
+        "symbol": "",
+        "price": 0.0,
+        "fee": 0.0,
+        "stamp_duty": 0.0,
+        "notes": "mock",
+    }
+    portfolio.add_trade(Trade.from_dict(item))
+    # Checkpoints before the new trade are reused, the following ones rebuilt
+    replay = portfolio._load_from_trade_list(portfolio.get_trade_history())
+    deposited, available, holdings, _, checkpoints = replay
+    assert portfolio._checkpoints == checkpoints
+    assert portfolio.get_cash_deposited() == Money.to_pounds(deposited)
+    assert portfolio.get_cash_available() == Money.to_pounds(available)
+    assert portfolio.get_holding_symbols() == sorted(holdings.keys())
+    portfolio.delete_trade("past_deposit")
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+    assert portfolio.get_cash_deposited() == PF_CASH_DEPOSITED
+    _, _, _, _, checkpoints = portfolio._load_from_trade_list(
+        portfolio.get_trade_history()
+    )
+    assert portfolio._checkpoints == checkpoints
+    with pytest.raises(RuntimeError):
+        portfolio.delete_trade("not_existing_id")
+
+
+def test_edited_trade_list():
+    trades = generate_trade_history(5)
+    new_trade = generate_trade_history(1)[0]
+    for position in range(len(trades) + 1):
+        inserted = _EditedTradeList(trades, position, new_trade)
+        assert list(inserted) == trades[:position] + [new_trade] + trades[position:]
+    for position in range(len(trades)):
+        removed = _EditedTradeList(trades, position)
+        after = position + 1
+        assert list(removed) == trades[:position] + trades[after:]
+        assert removed[1:3] == list(removed)[1:3]
+    with pytest.raises(IndexError):
+        _EditedTradeList(trades, 0)[4]
+
+
+def test_open_price_of_partially_closed_position(portfolio):
+    # The open price is the average of the most recent BUY trades that cover
+    # the quantity currently held
+    items = [
+        ("01/01/2020 00:00", "BUY", 10, 100.0),
+        ("02/01/2020 00:00", "BUY", 10, 200.0),
+        ("03/01/2020 00:00", "SELL", 15, 300.0),
+        ("04/01/2020 00:00", "BUY", 5, 400.0),
+    ]
+    expected = [100.0, 150.0, 200.0, 266.6667]
+    for (date, action, quantity, price), open_price in zip(items, expected):
+        item = {
+            "id": "0",
+            "date": date,
+            "action": action,
+            "quantity": quantity,
+            "symbol": "MOCK",
+            "price": price,
+            "fee": 0.0,
+            "stamp_duty": 0.0,
+            "notes": "mock",
+        }
+        portfolio.add_trade(Trade.from_dict(item))
+        assert portfolio.get_holding_open_price("MOCK") == open_price
+    # The lots older than the ones covering the position have been dropped
+    assert portfolio._lots["MOCK"] == [(200.0, 10), (400.0, 5)]
+    portfolio._load(portfolio.get_trade_history())
+    assert portfolio.get_holding_open_price("MOCK") == 266.6667
+
+
+def test_edit_past_trades_validated(portfolio):
+    # Removing the initial deposit leaves the later trades without funds
+    with pytest.raises(RuntimeError):
+        portfolio.delete_trade("mock_initial_deposit")
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+    assert len(portfolio.get_trade_history()) == 54
+    # Selling before a past buy leaves the later sells without holdings
+    item = {
+        "id": "past_sell",
+        "date": "14/10/2017 00:00",
+        "action": "SELL",
+        "quantity": 119,
+        "symbol": "MOCK1",
+        "price": 1.0,
+        "fee": 0.0,
+        "stamp_duty": 0.0,
+        "notes": "mock",
+    }
+    with pytest.raises(RuntimeError):
+        portfolio.add_trade(Trade.from_dict(item))
+    assert portfolio._db_handler.find_trade_position("past_sell") is None
+    # Valid edits are applied
+    item["id"] = "past_deposit"
+    item["action"] = "DEPOSIT"
+    item["symbol"] = ""
+    portfolio.add_trade(Trade.from_dict(item))
+    item["id"] = "past_buy"
+    item["action"] = "BUY"
+    item["symbol"] = "MOCK1"
+    portfolio.add_trade(Trade.from_dict(item))
+    portfolio.delete_trade("past_deposit")
+    deposited, available, holdings, _, _ = portfolio._load_from_trade_list(
+        portfolio.get_trade_history()
+    )
+    assert portfolio.get_cash_deposited() == Money.to_pounds(deposited)
+    assert portfolio.get_cash_available() == Money.to_pounds(available)
+    for symbol, holding in holdings.items():
+        assert portfolio.get_holding_quantity(symbol) == holding.get_quantity()
+
+
+def test_edit_past_trades_before_sell_below_fees(portfolio, tmp_path):
+    dbh = portfolio._db_handler
+    filepath = Path(tmp_path, "trading_log.json")
+    # The fee of the sell exceeds its proceeds taking the cash below zero
+    date = datetime(2020, 1, 1)
+    trades = [
+        Trade(date, Actions.DEPOSIT, 2.0, "", 0, 0, 0, "", "deposit"),
+        Trade(date + timedelta(days=2), Actions.BUY, 1, "X", 100, 0, 0, "", "buy"),
+        Trade(date + timedelta(days=3), Actions.SELL, 1, "X", 10, 1.2, 0, "", "sell"),
+        Trade(date + timedelta(days=4), Actions.DEPOSIT, 10.0, "", 0, 0, 0, "", "end"),
+    ]
+    with filepath.open(mode="w") as f:
+        json.dump({"name": "mock", "trades": [t.to_dict() for t in trades]}, f)
+    dbh.read_data(filepath)
+    portfolio._load(dbh.get_trades_list())
+    # Edits accepted by a full replay of the history are accepted
+    portfolio.add_trade(
+        Trade(date + timedelta(days=1), Actions.FEE, 0.5, "", 0, 0, 0, "", "fee")
+    )
+    portfolio.add_trade(
+        Trade(date + timedelta(days=1), Actions.DIVIDEND, 0.1, "X", 0, 0, 0, "", "div")
+    )
+    portfolio.delete_trade("div")
+    # The buy is left without funds
+    with pytest.raises(RuntimeError):
+        portfolio.add_trade(
+            Trade(date + timedelta(days=1), Actions.WITHDRAW, 0.6, "", 0, 0, 0, "", "w")
+        )
+    with pytest.raises(RuntimeError):
+        portfolio.delete_trade("deposit")
+    assert [t.id for t in portfolio.get_trade_history()] == [
+        "deposit",
+        "fee",
+        "buy",
+        "sell",
+        "end",
+    ]
+    assert portfolio.get_cash_available() == pytest.approx(9.4)
+
+
+def count_replays(portfolio, monkeypatch):
+    """Record the trade lists replayed by the portfolio"""
+    replays = []
+    load = portfolio._load_from_trade_list
+
+    def counting_load(trades, checkpoint=None):
+        replays.append(trades)
+        return load(trades, checkpoint)
+
+    monkeypatch.setattr(portfolio, "_load_from_trade_list", counting_load)
+    return replays
+
+
+def test_edit_past_trades_validated_on_running_balances(portfolio, monkeypatch):
+    replays = count_replays(portfolio, monkeypatch)
+    # The running balances are built on the first edit of a past trade
+    assert not portfolio._balances_built
+    # Edits not allowed are rejected before replaying the trade history
+    with pytest.raises(TradeNotAllowedError):
+        portfolio.delete_trade("mock_initial_deposit")
+    date = datetime(2017, 10, 14)
+    with pytest.raises(TradeNotAllowedError):
+        portfolio.add_trade(
+            Trade(date, Actions.SELL, 119, "MOCK1", 1.0, 0, 0, "", "past_sell")
+        )
+    with pytest.raises(TradeNotAllowedError):
+        portfolio.add_trades(
+            [Trade(date, Actions.WITHDRAW, 3000, "", 0, 0, 0, "", "past_withdraw")]
+        )
+    assert replays == []
+    assert portfolio._balances_built
+    assert len(portfolio.get_trade_history()) == 54
+    # Valid edits are replayed and keep the running balances aligned with the
+    # trade history
+    portfolio.add_trade(
+        Trade(date, Actions.DEPOSIT, 119, "", 0, 0, 0, "", "past_deposit")
+    )
+    portfolio.add_trade(Trade(date, Actions.BUY, 1, "MOCK1", 1, 0, 0, "", "past_buy"))
+    portfolio.delete_trade("past_deposit")
+    portfolio.add_trades(
+        [Trade(date, Actions.BUY, 2, "MOCK5", 1, 0, 0, "", "past_new_symbol")]
+    )
+    portfolio.add_trade(
+        Trade(datetime(2019, 2, 1), Actions.SELL, 1, "MOCK5", 1, 0, 0, "", "latest")
+    )
+    assert len(replays) == 4
+    trades = portfolio.get_trade_history()
+    cash_balance = portfolio._cash_balance
+    quantity_balances = portfolio._quantity_balances
+    portfolio._clear_balances()
+    portfolio._ensure_balances()
+    assert len(cash_balance) == len(trades)
+    for position in range(len(trades) + 1):
+        assert cash_balance.get_balance(
+            position
+        ) == portfolio._cash_balance.get_balance(position)
+    assert quantity_balances.keys() == portfolio._quantity_balances.keys()
+    for symbol, balance in quantity_balances.items():
+        expected = portfolio._quantity_balances[symbol]
+        assert len(balance) == len(expected)
+        for position in range(len(balance) + 1):
+            assert balance.get_balance(position) == expected.get_balance(position)
+
+
+def generate_trade_history(count, symbols=10):
+    """Generate a valid trade history with the given number of trades of the
+    given number of symbols
+    """
+    rng = random.Random(7)
+    date = datetime(2010, 1, 1)
+    trades = [Trade(date, Actions.DEPOSIT, 10000.0, "", 0.0, 0.0, 0.0, "")]
+    cash = 10000.0
+    held = {}
+    while len(trades) < count:
+        date += timedelta(hours=rng.randint(0, 30))
+        symbol = "MOCK{}".format(rng.randint(0, symbols - 1))
+        price = round(rng.uniform(10, 500), 2)
+        quantity = float(rng.randint(1, 50))
+        r = rng.random()
+        if r < 0.4 and (price * quantity) / 100 + 10 < cash:
+            trade = Trade(date, Actions.BUY, quantity, symbol, price, 1.5, 0.5, "")
+            held[symbol] = held.get(symbol, 0) + int(quantity)
+        elif r < 0.7 and held.get(symbol, 0) > 0:
+            quantity = float(rng.randint(1, held[symbol]))
+            trade = Trade(date, Actions.SELL, quantity, symbol, price, 1.5, 0.0, "")
+            held[symbol] -= int(quantity)
+        elif r < 0.8:
+            trade = Trade(date, Actions.DIVIDEND, 3.7, symbol, 0.0, 0.0, 0.0, "")
+        elif r < 0.9 and cash > 10:
+            trade = Trade(date, Actions.FEE, 2.2, "", 0.0, 0.0, 0.0, "")
+        else:
+            trade = Trade(date, Actions.DEPOSIT, 500.0, "", 0.0, 0.0, 0.0, "")
+        cash += trade.total
+        trades.append(trade)
+    return trades
+
+
+def replay_with(portfolio, engine, trades, checkpoint=None):
+    portfolio._replay_engine = engine
+    deposited, available, holdings, lots, checkpoints = portfolio._load_from_trade_list(
+        trades, checkpoint
+    )
+    return (
+        deposited,
+        available,
+        [(s, h.get_quantity(), h.get_open_price()) for s, h in holdings.items()],
+        lots,
+        checkpoints,
+    )
+
+
+def test_vectorized_replay_engine(portfolio):
+    portfolio._checkpoint_interval = 100
+    trades = generate_trade_history(2000)
+    expected = replay_with(portfolio, ReplayEngines.PYTHON, trades)
+    assert len(expected[2]) > 0
+    assert len(expected[4]) == 19
+    assert replay_with(portfolio, ReplayEngines.NUMPY, trades) == expected
+    # Resume the replay from a checkpoint
+    checkpoint = expected[4][9]
+    expected = replay_with(portfolio, ReplayEngines.PYTHON, trades, checkpoint)
+    assert replay_with(portfolio, ReplayEngines.NUMPY, trades, checkpoint) == expected
+    # Same replay of the test trading log
+    trades = portfolio.get_trade_history()
+    expected = replay_with(portfolio, ReplayEngines.PYTHON, trades)
+    assert replay_with(portfolio, ReplayEngines.NUMPY, trades) == expected
+
+
+def test_vectorized_replay_engine_many_symbols(portfolio):
+    trades = generate_trade_history(20000, symbols=200)
+    expected = replay_with(portfolio, ReplayEngines.PYTHON, trades)
+    assert len(expected[2]) > 100
+    assert len(expected[4]) == 39
+    assert replay_with(portfolio, ReplayEngines.NUMPY, trades) == expected
+    # The checkpoints of all the symbols are built at once so the vectorized
+    # engine stays faster than the loop with many holdings
+    durations = {}
+    for engine in [ReplayEngines.PYTHON, ReplayEngines.NUMPY]:
+        runs = []
+        for _ in range(3):
+            start = time.perf_counter()
+            replay_with(portfolio, engine, trades)
+            runs.append(time.perf_counter() - start)
+        durations[engine] = min(runs)
+    assert durations[ReplayEngines.NUMPY] < durations[ReplayEngines.PYTHON]
+
+
+@pytest.mark.parametrize(
+    "action, quantity, symbol",
+    [
+        ("WITHDRAW", 1e6, ""),
+        ("SELL", 1e6, "MOCK3"),
+        ("SELL", 1, "MOCK42"),
+        ("BUY", 0.5, "MOCK42"),
+    ],
+)
+def test_vectorized_replay_engine_invalid(portfolio, action, quantity, symbol):
+    trades = generate_trade_history(500)
+    trades.insert(
+        250,
+        Trade(trades[250].date, Actions[action], quantity, symbol, 1.0, 0, 0, ""),
+    )
+    errors = []
+    for engine in [ReplayEngines.PYTHON, ReplayEngines.NUMPY]:
+        with pytest.raises(TradeNotAllowedError) as e:
+            replay_with(portfolio, engine, trades)
+        errors.append((str(e.value), e.value.position))
+    assert errors[0] == errors[1]
+    assert errors[0][1] == 250
+
+
+def test_add_trades(portfolio):
+    trades = generate_trade_history(300)
+    # Shift the generated trades to overlap with the test trading log
+    for trade in trades:
+        trade.date = trade.date.replace(year=trade.date.year + 8)
+    expected = portfolio._load_from_trade_list(
+        sorted(portfolio.get_trade_history() + trades, key=lambda t: t.date)
+    )
+    portfolio.add_trades(trades)
+    assert len(portfolio.get_trade_history()) == 354
+    assert portfolio.has_unsaved_changes()
+    assert portfolio.get_cash_deposited() == Money.to_pounds(expected[0])
+    assert portfolio.get_cash_available() == Money.to_pounds(expected[1])
+    assert portfolio.get_holding_symbols() == sorted(expected[2].keys())
+    for symbol, holding in expected[2].items():
+        assert portfolio.get_holding_quantity(symbol) == holding.get_quantity()
+        assert portfolio.get_holding_open_price(symbol) == holding.get_open_price()
+
+
+def test_add_trades_invalid(portfolio):
+    trades = [
+        Trade.from_dict(
+            {
+                "id": "batch_deposit",
+                "date": "01/01/2020 00:00",
+                "action": "DEPOSIT",
+                "quantity": 1000,
+                "symbol": "",
+                "price": 0.0,
+                "fee": 0.0,
+                "stamp_duty": 0.0,
+                "notes": "mock",
+            }
+        ),
+        Trade.from_dict(
+            {
+                "id": "batch_withdraw",
+                "date": "01/01/2018 00:00",
+                "action": "WITHDRAW",
+                "quantity": 3000,
+                "symbol": "",
+                "price": 0.0,
+                "fee": 0.0,
+                "stamp_duty": 0.0,
+                "notes": "mock",
+            }
+        ),
+    ]
+    with pytest.raises(TradeNotAllowedError) as e:
+        portfolio.add_trades(trades)
+    # The error reports the first trade that is not allowed
+    failing = e.value.position
+    assert trades[1].to_string() in str(e.value)
+    assert failing > 0
+    assert len(portfolio.get_trade_history()) == 54
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+
+
+def test_add_trades_invalid_holdings(portfolio, monkeypatch):
+    trades = [
+        Trade(datetime(2020, 1, 1), Actions.DEPOSIT, 1000, "", 0, 0, 0, "", "a"),
+        Trade(datetime(2017, 10, 14), Actions.SELL, 119, "MOCK1", 1, 0, 0, "", "b"),
+    ]
+    new_trade_list = sorted(
+        portfolio.get_trade_history() + trades, key=lambda t: t.date
+    )
+    with pytest.raises(TradeNotAllowedError) as expected:
+        portfolio._load_from_trade_list(new_trade_list)
+    replays = count_replays(portfolio, monkeypatch)
+    with pytest.raises(TradeNotAllowedError) as e:
+        portfolio.add_trades(trades)
+    # The error reports the first trade not allowed as a replay of the history
+    assert replays == []
+    assert e.value.position == expected.value.position
+    assert new_trade_list[e.value.position].to_string() in str(e.value)
+    assert Messages.INSUF_HOLDINGS.value in str(e.value)
+    assert len(portfolio.get_trade_history()) == 54
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+
+
+@pytest.mark.parametrize("engine", [ReplayEngines.PYTHON, ReplayEngines.NUMPY])
+def test_add_trades_invalid_quantity(portfolio, engine):
+    portfolio._replay_engine = engine
+    trade = Trade.from_dict(
+        {
+            "id": "batch_buy",
+            "date": "01/01/2020 00:00",
+            "action": "BUY",
+            "quantity": 0.5,
+            "symbol": "MOCK",
+            "price": 1.0,
+            "fee": 0.0,
+            "stamp_duty": 0.0,
+            "notes": "mock",
+        }
+    )
+    with pytest.raises(TradeNotAllowedError) as e:
+        portfolio.add_trades([trade])
+    # Errors applying the trade also report which trade failed
+    assert e.value.position == 54
+    assert trade.to_string() in str(e.value)
+    assert isinstance(e.value.__cause__, TradeNotAllowedError)
+    assert len(portfolio.get_trade_history()) == 54
+    # Adding it in the past is rejected with the same error
+    with pytest.raises(TradeNotAllowedError):
+        portfolio.add_trade(
+            Trade.from_dict({**trade.to_dict(), "date": "01/01/2019 00:00"})
+        )
+    assert len(portfolio.get_trade_history()) == 54
+
+
+def test_summary_cached_until_state_changes(portfolio):
+    wait_for_prices(portfolio)
+    state = portfolio.get_state()
+    # The summary is not recomputed while the portfolio does not change
+    assert portfolio.get_holdings_value() == PF_HOLDINGS_VALUE
+    assert portfolio.get_state() is state
+    # Adding a trade publishes a new state with a new summary
+    portfolio.add_trade(
+        Trade.from_dict(
+            {
+                "id": "summary_trade",
+                "date": "01/01/2020 00:00",
+                "action": "DEPOSIT",
+                "quantity": 1000,
+                "symbol": "",
+                "price": 0.0,
+                "fee": 0.0,
+                "stamp_duty": 0.0,
+                "notes": "mock",
+            }
+        )
+    )
+    assert portfolio.get_state() is not state
+    assert portfolio.get_total_value() == pytest.approx(PF_TOTAL_VALUE + 1000)
+    # New price data publishes a new state with the same values
+    state = portfolio.get_state()
+    portfolio._on_new_price_data()
+    assert portfolio.get_state() is not state
+    assert portfolio.get_state().summary == state.summary
+
+
+def test_state_snapshot_is_immutable(portfolio):
+    wait_for_prices(portfolio)
+    state = portfolio.get_state()
+    holding = state.holdings["MOCK13"]
+    portfolio.add_trade(
+        Trade.from_dict(
+            {
+                "id": "snapshot_trade",
+                "date": "01/01/2020 00:00",
+                "action": "SELL",
+                "quantity": 100,
+                "symbol": "MOCK13",
+                "price": 1000.0,
+                "fee": 0.0,
+                "stamp_duty": 0.0,
+                "notes": "mock",
+            }
+        )
+    )
+    # Readers holding the previous snapshot keep a consistent view
+    assert state.cash_available == PF_CASH_AVAILABLE
+    assert state.summary.holdings_value == PF_HOLDINGS_VALUE
+    assert holding.get_quantity() == PF_MOCK13_QUANTITY
+    assert holding.get_last_price() == PF_MOCK13_LAST_PRICE
+    # The new snapshot reflects the trade and keeps the last prices
+    assert portfolio.get_holding_quantity("MOCK13") == PF_MOCK13_QUANTITY - 100
+    assert portfolio.get_holding_last_price("MOCK13") == PF_MOCK13_LAST_PRICE
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE + 1000
+
+
+def test_get_state_as_of(portfolio):
+    # Nothing happened before the first trade
+    state = portfolio.get_state_as_of(datetime(2017, 1, 1))
+    assert state.cash_available == 0
+    assert state.cash_deposited == 0
+    assert state.holdings == {}
+    # After the last trade the state matches the current one
+    state = portfolio.get_state_as_of(datetime(2030, 1, 1))
+    assert state.cash_available == PF_CASH_AVAILABLE
+    assert state.cash_deposited == PF_CASH_DEPOSITED
+    assert state.get_holding_symbols() == portfolio.get_holding_symbols()
+    assert state.holdings["MOCK13"].get_open_price() == PF_MOCK13_OPEN_PRICE
+    assert state.holdings["MOCK13"].get_last_price() is None
+    # Intermediate dates match the replay of the truncated history
+    portfolio._checkpoint_interval = 100
+    portfolio.add_trades(generate_trade_history(1000))
+    history = portfolio.get_trade_history()
+    for date in [history[150].date, history[500].date, datetime(2018, 6, 30)]:
+        expected = replay_with(
+            portfolio,
+            ReplayEngines.PYTHON,
+            [t for t in history if t.date <= date],
+        )
+        state = portfolio.get_state_as_of(date)
+        assert state.cash_deposited == Money.to_pounds(expected[0])
+        assert state.cash_available == Money.to_pounds(expected[1])
+        # The holdings of the state are sorted by symbol
+        assert [
+            (s, h.get_quantity(), h.get_open_price()) for s, h in state.holdings.items()
+        ] == sorted(expected[2])
+
+
+def test_load_from_cache(portfolio, tmp_path, monkeypatch):
+    dbh = portfolio._db_handler
+    dbh._cache = TradingLogCache(tmp_path)
+    dbh.read_data()
+    portfolio._load(dbh.get_trades_list())
+    # The trading log has not changed so the state is not replayed again
+    dbh.read_data()
+    monkeypatch.setattr(portfolio, "_load_from_trade_list", None)
+    portfolio._load(dbh.get_trades_list())
+    assert portfolio.get_cash_available() == PF_CASH_AVAILABLE
+    assert portfolio.get_cash_deposited() == PF_CASH_DEPOSITED
+    assert portfolio.get_holding_quantity("MOCK13") == PF_MOCK13_QUANTITY
+    assert portfolio.get_holding_open_price("MOCK4") == PF_MOCK4_OPEN_PRICE
+    assert len(portfolio._checkpoints) == 0
+
+
+@pytest.mark.parametrize("filename", ["trading_log.db", "trading_log.manifest.json"])
+def test_load_from_opening_balance(portfolio, tmp_path, filename):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    filepath = Path(tmp_path, filename)
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    # Saving the trading log stores the opening balance of the last year
+    exported = Portfolio(config, filepath)
+    assert exported._db_handler.get_opening_balance() is None
+    exported.save_portfolio(filepath)
+    assert exported.wait_for_saves()
+    exported.stop()
+    loaded = Portfolio(config, filepath)
+    dbh = loaded._db_handler
+    opening = dbh.get_opening_balance()
+    assert opening.date == datetime(2019, 1, 1)
+    assert opening.checkpoint.position == 52
+    assert len(dbh.get_trades_list()) == 2
+    assert loaded.get_cash_available() == PF_CASH_AVAILABLE
+    assert loaded.get_cash_deposited() == PF_CASH_DEPOSITED
+    assert loaded.get_holding_quantity("MOCK13") == PF_MOCK13_QUANTITY
+    assert loaded.get_holding_open_price("MOCK4") == PF_MOCK4_OPEN_PRICE
+    # The older trades are loaded only when needed
+    state = loaded.get_state_as_of(datetime(2019, 1, 25))
+    expected = portfolio.get_state_as_of(datetime(2019, 1, 25))
+    assert state.cash_available == expected.cash_available
+    assert state.get_holding_symbols() == expected.get_holding_symbols()
+    assert dbh.get_opening_balance() is not None
+    state = loaded.get_state_as_of(datetime(2018, 6, 30))
+    expected = portfolio.get_state_as_of(datetime(2018, 6, 30))
+    assert state.cash_available == expected.cash_available
+    assert state.get_holding_symbols() == expected.get_holding_symbols()
+    assert dbh.get_opening_balance() is None
+    assert [t.to_dict() for t in loaded.get_trade_history()] == [
+        t.to_dict() for t in portfolio.get_trade_history()
+    ]
+    assert [c.position for c in loaded._checkpoints] == [52]
+    # The opening balance saved after an older edit includes it
+    deposit = Trade(datetime(2018, 6, 1), Actions.DEPOSIT, 100, "", 0, 0, 0, "", "a")
+    loaded.add_trade(deposit)
+    portfolio.add_trade(deposit)
+    assert loaded.get_cash_available() == portfolio.get_cash_available()
+    loaded.save_portfolio(filepath)
+    assert loaded.wait_for_saves()
+    loaded.stop()
+    reloaded = Portfolio(config, filepath)
+    opening = reloaded._db_handler.get_opening_balance()
+    assert opening.checkpoint.position == 53
+    assert reloaded.get_cash_available() == portfolio.get_cash_available()
+    assert reloaded.get_holding_symbols() == portfolio.get_holding_symbols()
+    reloaded.stop()
+
+
+@pytest.mark.parametrize("filename", ["trading_log.db", "trading_log.manifest.json"])
+def test_load_from_opening_balance_history_view(portfolio, tmp_path, filename):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    filepath = Path(tmp_path, filename)
+    portfolio._checkpoint_interval = 10
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    exported = Portfolio(config, filepath)
+    exported.save_portfolio(filepath)
+    assert exported.wait_for_saves()
+    exported.stop()
+    loaded = Portfolio(config, filepath)
+    loaded._checkpoint_interval = 10
+    # Newer trades are replayed from the opening balance
+    deposit = Trade(datetime(2019, 2, 1), Actions.DEPOSIT, 100, "", 0, 0, 0, "", "a")
+    loaded.add_trade(deposit)
+    portfolio.add_trade(deposit)
+    # The history view reads only the loaded trades
+    assert loaded.has_older_trades()
+    assert [t.to_dict() for t in loaded.get_trade_history()] == [
+        t.to_dict()
+        for t in portfolio.get_trade_history()
+        if t.date >= loaded._db_handler.get_opening_balance().date
+    ]
+    loaded.delete_trade("mock_last_trade")
+    portfolio.delete_trade("mock_last_trade")
+    assert loaded.get_cash_available() == portfolio.get_cash_available()
+    assert loaded.get_holding_symbols() == portfolio.get_holding_symbols()
+    # The older trades are loaded on request moving the checkpoints after them
+    loaded.load_older_trades()
+    assert not loaded.has_older_trades()
+    history = loaded.get_trade_history()
+    assert [t.to_dict() for t in history] == [
+        t.to_dict() for t in portfolio.get_trade_history()
+    ]
+    assert loaded._checkpoints[0].position == 52
+    for checkpoint in loaded._checkpoints:
+        deposited, available, holdings, lots, _ = loaded._load_from_trade_list(
+            history[: checkpoint.position]
+        )
+        assert checkpoint == Checkpoint.create(
+            checkpoint.position, deposited, available, holdings, lots
+        )
+    expected = replay_with(loaded, ReplayEngines.PYTHON, history)
+    loaded.add_trade(
+        Trade(datetime(2018, 3, 1), Actions.DEPOSIT, 10, "", 0, 0, 0, "", "b")
+    )
+    assert loaded.get_cash_available() == Money.to_pounds(expected[1]) + 10
+    loaded.stop()
+
+
+@pytest.mark.parametrize("filename", ["trading_log.db", "trading_log.manifest.json"])
+def test_load_from_opening_balance_delete_trade(portfolio, tmp_path, filename):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    filepath = Path(tmp_path, filename)
+    portfolio.add_trade(
+        Trade(datetime(2018, 6, 1), Actions.DEPOSIT, 50, "", 0, 0, 0, "", "old")
+    )
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    exported = Portfolio(config, filepath)
+    exported.save_portfolio(filepath)
+    assert exported.wait_for_saves()
+    exported.stop()
+    loaded = Portfolio(config, filepath)
+    # Deleting a loaded trade does not read the older trades
+    loaded.delete_trade("mock_last_trade")
+    portfolio.delete_trade("mock_last_trade")
+    assert loaded.has_older_trades()
+    assert loaded.get_cash_available() == portfolio.get_cash_available()
+    # The older trades are loaded to find a trade not in the loaded history
+    loaded.delete_trade("old")
+    portfolio.delete_trade("old")
+    assert not loaded.has_older_trades()
+    assert loaded.get_cash_available() == portfolio.get_cash_available()
+    loaded.save_portfolio(filepath)
+    assert loaded.wait_for_saves()
+    loaded.stop()
+    reloaded = Portfolio(config, filepath)
+    reloaded.load_older_trades()
+    assert [t.to_dict() for t in reloaded.get_trade_history()] == [
+        t.to_dict() for t in portfolio.get_trade_history()
+    ]
+    reloaded.stop()
+
+
+@pytest.mark.parametrize("filename", ["trading_log.db", "trading_log.manifest.json"])
+def test_load_from_opening_balance_running_balances(portfolio, tmp_path, filename):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    filepath = Path(tmp_path, filename)
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    exported = Portfolio(config, filepath)
+    exported.save_portfolio(filepath)
+    assert exported.wait_for_saves()
+    exported.stop()
+    loaded = Portfolio(config, filepath)
+    # The running balances start from the opening balance, the edits after it
+    # are validated as a replay of the whole trade history
+    date = datetime(2019, 1, 10)
+    edits = [
+        Trade(date, Actions.WITHDRAW, 100000, "", 0, 0, 0, "", "a"),
+        Trade(date, Actions.WITHDRAW, 1, "", 0, 0, 0, "", "b"),
+        Trade(date, Actions.SELL, 100000, "MOCK1", 1, 0, 0, "", "c"),
+        Trade(date, Actions.SELL, 1, "MOCK13", 1, 0, 0, "", "d"),
+    ]
+    for trade in edits:
+        try:
+            portfolio.add_trade(trade)
+        except TradeNotAllowedError as e:
+            with pytest.raises(TradeNotAllowedError) as loaded_error:
+                loaded.add_trade(trade)
+            assert str(loaded_error.value) == str(e)
+        else:
+            loaded.add_trade(trade)
+    assert [t.id for t in loaded.get_trade_history() if t.date == date] == ["b", "d"]
+    assert loaded.has_older_trades()
+    assert loaded.get_cash_available() == portfolio.get_cash_available()
+    assert loaded.get_holding_symbols() == portfolio.get_holding_symbols()
+    loaded.stop()
+
+
+def test_apply_external_changes(portfolio, tmp_path):
+    dbh = portfolio._db_handler
+    filepath = Path(tmp_path, "trading_log.json")
+    assert dbh.write_data(filepath)
+    dbh.read_data(filepath)
+    portfolio._load(dbh.get_trades_list())
+    assert not dbh.has_external_changes()
+    # Another process removes the last trade and appends a deposit
+    with filepath.open() as f:
+        data = json.load(f)
+    data["trades"] = [t for t in data["trades"] if t["id"] != "mock_last_trade"]
+    data["trades"].append(
+        Trade(
+            datetime(2019, 2, 1), Actions.DEPOSIT, 100, "", 0, 0, 0, "", "new"
+        ).to_dict()
+    )
+    with filepath.open(mode="w") as f:
+        json.dump(data, f)
+    assert dbh.has_external_changes()
+    portfolio._on_trading_log_changed()
+    assert not dbh.has_external_changes()
+    assert not portfolio.has_unsaved_changes()
+    assert len(portfolio.get_trade_history()) == 54
+    assert portfolio.get_trade_history()[-1].id == "new"
+    # The state is the same as the one of the trading log loaded from scratch
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    expected = Portfolio(config, filepath)
+    assert portfolio.get_cash_deposited() == expected.get_cash_deposited()
+    assert portfolio.get_cash_available() == expected.get_cash_available()
+    assert portfolio.get_holding_symbols() == expected.get_holding_symbols()
+    expected.stop()
+    # Saves of the portfolio are not detected as external changes
+    portfolio.save_portfolio(filepath)
+    assert portfolio.wait_for_saves()
+    assert not dbh.has_external_changes()
+
+
+def test_apply_external_changes_failing(portfolio, tmp_path):
+    dbh = portfolio._db_handler
+    filepath = Path(tmp_path, "trading_log.json")
+    assert dbh.write_data(filepath)
+    dbh.read_data(filepath)
+    portfolio._load(dbh.get_trades_list())
+    # Another process appends a withdraw not allowed and a valid deposit
+    with filepath.open() as f:
+        data = json.load(f)
+    for action, trade_id in [(Actions.WITHDRAW, "invalid"), (Actions.DEPOSIT, "new")]:
+        data["trades"].append(
+            Trade(
+                datetime(2019, 2, 1), action, 1e6, "", 0, 0, 0, "", trade_id
+            ).to_dict()
+        )
+    with filepath.open(mode="w") as f:
+        json.dump(data, f)
+    with pytest.raises(RuntimeError):
+        portfolio._on_trading_log_changed()
+    assert len(portfolio.get_trade_history()) == 54
+    # The changes are not reported again but the file is not overwritten
+    assert not dbh.has_external_changes()
+    assert dbh.has_conflicts()
+    portfolio.add_trade(
+        Trade(datetime(2019, 3, 1), Actions.DEPOSIT, 1, "", 0, 0, 0, "", "local")
+    )
+    with pytest.raises(TradingLogConflictError):
+        portfolio.save_portfolio(filepath)
+    assert portfolio.has_unsaved_changes()
+    assert not dbh.write_data()
+    with filepath.open() as f:
+        assert len(json.load(f)["trades"]) == 56
+    # Changing the file again reports the changes again
+    data["trades"] = data["trades"][:-2] + data["trades"][-1:]
+    with filepath.open(mode="w") as f:
+        json.dump(data, f)
+    assert dbh.has_external_changes()
+    portfolio._on_trading_log_changed()
+    assert not dbh.has_conflicts()
+    assert [t.id for t in portfolio.get_trade_history()[-2:]] == ["new", "local"]
+    assert dbh.write_data()
+
+
+def test_overwrite_external_changes_failing(portfolio, tmp_path):
+    dbh = portfolio._db_handler
+    filepath = Path(tmp_path, "trading_log.json")
+    assert dbh.write_data(filepath)
+    dbh.read_data(filepath)
+    portfolio._load(dbh.get_trades_list())
+    # Another process appends a withdraw not allowed
+    with filepath.open() as f:
+        data = json.load(f)
+    data["trades"].append(
+        Trade(
+            datetime(2019, 2, 1), Actions.WITHDRAW, 1e6, "", 0, 0, 0, "", "invalid"
+        ).to_dict()
+    )
+    with filepath.open(mode="w") as f:
+        json.dump(data, f)
+    with pytest.raises(RuntimeError):
+        portfolio._on_trading_log_changed()
+    # Overwriting discards the changes of the other process
+    portfolio.save_portfolio(filepath, overwrite=True)
+    assert portfolio.wait_for_saves()
+    assert not portfolio.has_unsaved_changes()
+    assert not dbh.has_conflicts()
+    assert not dbh.has_external_changes()
+    with filepath.open() as f:
+        assert [t["id"] for t in json.load(f)["trades"]] == [
+            t.id for t in portfolio.get_trade_history()
+        ]
@@ -0,0 +1,77 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from tradingmate.model import RunningBalance
+
+
+def negative_slack(items, position, initial=0):
+    total = initial
+    for index, (_, value, required) in enumerate(items):
+        if index >= position and required is not None and total < required:
+            return index
+        total += value
+    return None
+
+
+def check(balance, items, initial=0):
+    values = [v for _, v, _ in items]
+    assert len(balance) == len(items)
+    for position in range(len(items) + 1):
+        assert balance.get_balance(position) == initial + sum(values[:position])
+        assert balance.find_negative_slack(position) == negative_slack(
+            items, position, initial
+        )
+
+
+def test_init():
+    balance = RunningBalance()
+    assert len(balance) == 0
+    assert balance.get_balance(0) == 0
+    assert balance.find_negative_slack(0) is None
+
+    now = datetime.now()
+    values = [(5, None), (-2, 2), (3, None), (-6, None), (4, None), (-5, 5)]
+    items = [(now + timedelta(days=i), v, r) for i, (v, r) in enumerate(values)]
+    check(RunningBalance(items), items)
+    # Elements without a requirement can take the balance below zero
+    assert RunningBalance(items).find_negative_slack(0) == 5
+    # The initial balance is added to the running balance of every element
+    check(RunningBalance(items, 2), items, 2)
+    assert RunningBalance(items, 2).find_negative_slack(0) is None
+
+
+def test_insert_remove():
+    rng = random.Random(42)
+    now = datetime(2020, 1, 1)
+    items = []
+    balance = RunningBalance(initial=20)
+    for _ in range(300):
+        if items and rng.random() < 0.3:
+            position = rng.randrange(len(items))
+            assert balance.remove(position) == items.pop(position)[1]
+        else:
+            position = rng.randint(0, len(items))
+            value = rng.randint(-50, 50)
+            required = -value if value < 0 and rng.random() < 0.7 else None
+            item = (now, value, required)
+            balance.insert(position, *item)
+            items.insert(position, item)
+        check(balance, items, 20)
+    with pytest.raises(IndexError):
+        balance.remove(len(items))
+
+
+def test_count():
+    now = datetime(2020, 1, 1)
+    dates = [now, now + timedelta(days=1), now + timedelta(days=1), now + timedelta(2)]
+    balance = RunningBalance((d, 1, None) for d in dates)
+    assert balance.count_before(now) == 0
+    assert balance.count_until(now) == 1
+    assert balance.count_before(dates[1]) == 1
+    assert balance.count_until(dates[1]) == 3
+    assert balance.count_until(dates[3] + timedelta(days=1)) == 4
+    assert [balance.get_key(i) for i in range(len(dates))] == dates
+    with pytest.raises(IndexError):
+        balance.get_key(len(dates))
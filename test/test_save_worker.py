@@ -0,0 +1,65 @@
+import threading
+from pathlib import Path
+
+from tradingmate.model.storage import SaveWorker
+
+
+class MockStorage:
+    """Storage recording the written trade lists, blocking until released"""
+
+    def __init__(self):
+        self.filepath = Path("/tmp/mock.json")
+        self.written = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def save(self, name, trades):
+        def write():
+            self.started.set()
+            self.release.wait()
+            self.written.append(trades)
+            return name != "fail"
+
+        return write
+
+
+def test_coalesce_saves():
+    storage = MockStorage()
+    worker = SaveWorker()
+    worker.submit(storage.filepath, storage.save("mock", [1]))
+    assert storage.started.wait(5)
+    # Requests submitted while the first write is in progress are coalesced
+    worker.submit(storage.filepath, storage.save("mock", [1, 2]))
+    worker.submit(storage.filepath, storage.save("mock", [1, 2, 3]))
+    storage.release.set()
+    assert worker.flush()
+    assert storage.written == [[1], [1, 2, 3]]
+    assert worker.stop()
+
+
+def test_save_callbacks():
+    storage = MockStorage()
+    worker = SaveWorker()
+    results = []
+    worker.submit(storage.filepath, storage.save("mock", [1]), results.append)
+    assert storage.started.wait(5)
+    # The callbacks of coalesced requests get the result of the write replacing them
+    worker.submit(storage.filepath, storage.save("fail", [1, 2]), results.append)
+    worker.submit(storage.filepath, storage.save("fail", [1, 2, 3]), results.append)
+    storage.release.set()
+    assert not worker.flush()
+    assert results == [True, False, False]
+    assert worker.stop()
+
+
+def test_failed_save():
+    storage = MockStorage()
+    storage.release.set()
+    worker = SaveWorker()
+    worker.submit(storage.filepath, storage.save("fail", []))
+    assert not worker.flush()
+    # The result is reset by each flush
+    assert worker.flush()
+    worker.submit(storage.filepath, storage.save("mock", []))
+    assert worker.stop()
+    assert len(storage.written) == 2
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from tradingmate.model import (
+    Checkpoint,
+    ConfigurationManager,
+    DatabaseHandler,
+    OpeningBalance,
+    Trade,
+)
+from tradingmate.model.storage import JsonStorage, ShardedStorage
+from tradingmate.utils import Actions
+
+
+@pytest.fixture
+def configuration():
+    return ConfigurationManager(Path("test/test_data/config.json"))
+
+
+@pytest.fixture
+def filepath(configuration, tmp_path):
+    # Split the json test trading log in one shard per year
+    dbh = DatabaseHandler(configuration, Path("test/test_data/trading_log.json"))
+    path = Path(tmp_path, "trading_log.manifest.json")
+    assert dbh.write_data(path)
+    return path
+
+
+def test_manifest(filepath):
+    with filepath.open() as f:
+        manifest = json.load(f)
+    assert list(manifest["shards"]) == ["2017", "2018", "2019"]
+    for year, shard in manifest["shards"].items():
+        _, trades = JsonStorage(Path(filepath.parent, shard)).read()
+        assert len(trades) > 0
+        assert all(t.date.year == int(year) for t in trades)
+
+
+def test_read_write(configuration, filepath):
+    name, expected = JsonStorage(Path("test/test_data/trading_log.json")).read()
+    dbh = DatabaseHandler(configuration, filepath)
+    assert isinstance(dbh._storage, ShardedStorage)
+    assert dbh.get_trading_log_name() == name
+    assert [t.to_dict() for t in dbh.get_trades_list()] == [
+        t.to_dict() for t in sorted(expected, key=lambda t: t.date)
+    ]
+    # Changes are stored when the trading log is saved
+    dbh.delete_trade("mock_last_trade")
+    assert dbh.write_data()
+    reloaded = DatabaseHandler(configuration, filepath)
+    assert [t.to_dict() for t in reloaded.get_trades_list()] == [
+        t.to_dict() for t in dbh.get_trades_list()
+    ]
+
+
+def test_write_only_changed_shards(configuration, filepath):
+    shards = {
+        year: Path(filepath.parent, "trading_log.{}.json".format(year))
+        for year in [2017, 2018, 2019]
+    }
+    mtimes = {year: path.stat().st_mtime_ns for year, path in shards.items()}
+    dbh = DatabaseHandler(configuration, filepath)
+    # The last trade is in the 2019 shard
+    dbh.delete_trade("mock_last_trade")
+    assert dbh.write_data()
+    assert shards[2017].stat().st_mtime_ns == mtimes[2017]
+    assert shards[2018].stat().st_mtime_ns == mtimes[2018]
+    _, trades = JsonStorage(shards[2019]).read()
+    assert [t.id for t in trades] == ["mock"]
+
+
+def test_read_recent_shards(configuration, filepath):
+    shards = {
+        year: Path(filepath.parent, "trading_log.{}.json".format(year))
+        for year in [2017, 2018, 2019]
+    }
+    storage = ShardedStorage(filepath)
+    name, trades = storage.read()
+    assert storage.read_recent() is None
+    date = datetime(2019, 1, 1)
+    position = len([t for t in trades if t.date < date])
+    opening = OpeningBalance(date, Checkpoint(position, 100, 50, ()))
+    assert storage.write_opening_balance(opening, 0)
+    # Only the shards since the opening balance are read
+    dbh = DatabaseHandler(configuration, filepath)
+    assert dbh.get_opening_balance() == opening
+    assert [t.to_dict() for t in dbh.get_trades_list()] == [
+        t.to_dict() for t in trades if t.date >= date
+    ]
+    # Saving writes only the shard of the changed year
+    mtimes = {year: path.stat().st_mtime_ns for year, path in shards.items()}
+    dbh.add_trade(
+        Trade(datetime(2019, 2, 1), Actions.DEPOSIT, 10, "", 0, 0, 0, "", "a")
+    )
+    assert dbh.write_data()
+    assert shards[2017].stat().st_mtime_ns == mtimes[2017]
+    assert shards[2018].stat().st_mtime_ns == mtimes[2018]
+    assert shards[2019].stat().st_mtime_ns != mtimes[2019]
+    with filepath.open() as f:
+        assert OpeningBalance.from_dict(json.load(f)["opening"]) == opening
+    # The older shards are read when needed
+    assert dbh.load_older_trades() == position
+    assert len(dbh.get_trades_list()) == len(trades) + 1
+    assert dbh.write_data()
+    assert shards[2017].stat().st_mtime_ns == mtimes[2017]
+    assert shards[2018].stat().st_mtime_ns == mtimes[2018]
+
+
+def test_older_changes_remove_opening_balance(configuration, filepath):
+    storage = ShardedStorage(filepath)
+    storage.read()
+    opening = OpeningBalance(datetime(2019, 1, 1), Checkpoint(52, 100, 50, ()))
+    assert storage.write_opening_balance(opening, 0)
+    dbh = DatabaseHandler(configuration, filepath)
+    dbh.add_trade(
+        Trade(datetime(2018, 2, 1), Actions.DEPOSIT, 10, "", 0, 0, 0, "", "a")
+    )
+    assert dbh.get_opening_balance() is None
+    assert dbh.write_data()
+    with filepath.open() as f:
+        assert "opening" not in json.load(f)
+    reloaded = DatabaseHandler(configuration, filepath)
+    assert reloaded.get_opening_balance() is None
+    assert len(reloaded.get_trades_list()) == 55
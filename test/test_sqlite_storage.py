@@ -0,0 +1,160 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from tradingmate.model import (
+    Checkpoint,
+    ConfigurationManager,
+    DatabaseHandler,
+    OpeningBalance,
+    Trade,
+)
+from tradingmate.model.storage import JsonStorage, SqliteStorage
+
+
+@pytest.fixture
+def configuration():
+    return ConfigurationManager(Path("test/test_data/config.json"))
+
+
+@pytest.fixture
+def filepath(configuration, tmp_path):
+    # Import the json test trading log into a SQLite database
+    dbh = DatabaseHandler(configuration, Path("test/test_data/trading_log.json"))
+    path = Path(tmp_path, "trading_log.db")
+    assert dbh.write_data(path)
+    return path
+
+
+def test_import_export(configuration, filepath, tmp_path):
+    name, expected = JsonStorage(Path("test/test_data/trading_log.json")).read()
+    dbh = DatabaseHandler(configuration, filepath)
+    assert dbh.get_trading_log_name() == name
+    assert [t.to_dict() for t in dbh.get_trades_list()] == [
+        t.to_dict() for t in sorted(expected, key=lambda t: t.date)
+    ]
+    # Export back to a json trading log
+    json_path = Path(tmp_path, "export.json")
+    assert dbh.write_data(json_path)
+    _, exported = JsonStorage(json_path).read()
+    assert [t.to_dict() for t in exported] == [
+        t.to_dict() for t in dbh.get_trades_list()
+    ]
+
+
+def test_changes_are_stored(configuration, filepath):
+    dbh = DatabaseHandler(configuration, filepath)
+    trade = Trade.from_dict(
+        {
+            "id": "sqlite_trade",
+            "date": "01/01/2018 00:00",
+            "action": "DEPOSIT",
+            "quantity": 100,
+            "symbol": "",
+            "price": 0.0,
+            "fee": 0.0,
+            "stamp_duty": 0.0,
+            "notes": "mock",
+        }
+    )
+    dbh.add_trade(trade)
+    dbh.add_trades(
+        [Trade.from_dict({**trade.to_dict(), "id": f"sqlite_{i}"}) for i in range(3)]
+    )
+    dbh.delete_trade("mock")
+    dbh.delete_trade("mock_last_trade")
+    # Changes are stored without saving
+    reloaded = DatabaseHandler(configuration, filepath)
+    assert [t.to_dict() for t in reloaded.get_trades_list()] == [
+        t.to_dict() for t in dbh.get_trades_list()
+    ]
+    assert dbh.write_data()
+
+
+def test_queries(filepath):
+    storage = SqliteStorage(filepath)
+    _, trades = storage.read()
+    start = datetime(2018, 1, 1)
+    end = datetime(2019, 1, 1)
+    assert [t.to_dict() for t in storage.get_trades_between(start, end)] == [
+        t.to_dict() for t in trades if start <= t.date < end
+    ]
+    assert [t.to_dict() for t in storage.get_trades_between(None, start)] == [
+        t.to_dict() for t in trades if t.date < start
+    ]
+    assert [t.to_dict() for t in storage.get_symbol_trades("MOCK13")] == [
+        t.to_dict() for t in trades if t.symbol == "MOCK13"
+    ]
+    assert [t.to_dict() for t in storage.get_symbol_trades("MOCK1", start, end)] == [
+        t.to_dict() for t in trades if t.symbol == "MOCK1" and start <= t.date < end
+    ]
+    storage.close()
+
+
+def test_load_older_trades(configuration, filepath):
+    storage = SqliteStorage(filepath)
+    name, trades = storage.read()
+    assert storage.read_recent() is None
+    date = datetime(2019, 1, 1)
+    position = len([t for t in trades if t.date < date])
+    opening = OpeningBalance(date, Checkpoint(position, 100, 50, ()))
+    assert storage.write_opening_balance(opening, storage.get_version())
+    storage.close()
+    # Only the trades since the opening balance are loaded
+    dbh = DatabaseHandler(configuration, filepath)
+    assert dbh.get_opening_balance() == opening
+    assert [t.to_dict() for t in dbh.get_trades_list()] == [
+        t.to_dict() for t in trades if t.date >= date
+    ]
+    # The older trades of a symbol are queried without loading them
+    assert [t.to_dict() for t in dbh.get_symbol_trades("MOCK1")] == [
+        t.to_dict() for t in trades if t.symbol == "MOCK1"
+    ]
+    assert dbh.get_opening_balance() == opening
+    assert dbh.load_older_trades() == position
+    assert dbh.get_opening_balance() is None
+    assert [t.to_dict() for t in dbh.get_trades_list()] == [t.to_dict() for t in trades]
+    dbh.close()
+
+
+def test_older_changes_remove_opening_balance(configuration, filepath):
+    storage = SqliteStorage(filepath)
+    _, trades = storage.read()
+    date = datetime(2019, 1, 1)
+    opening = OpeningBalance(date, Checkpoint(52, 100, 50, ()))
+    version = storage.get_version()
+    deposit = Trade.from_dict(
+        {
+            "id": "sqlite_trade",
+            "date": "01/06/2018 00:00",
+            "action": "DEPOSIT",
+            "quantity": 100,
+            "symbol": "",
+            "price": 0.0,
+            "fee": 0.0,
+            "stamp_duty": 0.0,
+            "notes": "mock",
+        }
+    )
+    # An opening balance computed before an older change is not stored
+    storage.on_trade_added(deposit, "mock", trades)
+    assert not storage.write_opening_balance(opening, version)
+    assert storage.read_recent() is None
+    assert storage.write_opening_balance(opening, storage.get_version())
+    storage.close()
+    # Older changes remove the stored opening balance
+    dbh = DatabaseHandler(configuration, filepath)
+    assert dbh.get_opening_balance() == opening
+    dbh.delete_trade("sqlite_trade")
+    assert dbh.get_opening_balance() is None
+    assert len(dbh.get_trades_list()) == len(trades)
+    dbh.close()
+    storage = SqliteStorage(filepath)
+    assert storage.read_recent() is None
+    storage.close()
+
+
+def test_read_missing_file(tmp_path):
+    with pytest.raises(RuntimeError):
+        SqliteStorage(Path(tmp_path, "missing.db")).read()
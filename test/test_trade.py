@@ -3,7 +3,7 @@ from datetime import datetime
 import pytest
 
 from tradingmate.model import DATETIME_FORMAT, Trade
-from tradingmate.utils import Actions
+from tradingmate.utils import Actions, IdGenerator
 
 
 def compute_total(quantity, price, fee, sdr):
@@ -140,3 +140,23 @@ def test_from_dict(test_input, expected):
     assert t.fee == 12.34
     assert t.sdr == 0.5
     assert t.notes == "notes"
+
+
+def test_slots():
+    t = Trade(datetime.now(), Actions.BUY, 10.0, "".join(["mo", "ck"]), 1, 1, 0, "")
+    assert not hasattr(t, "__dict__")
+    with pytest.raises(AttributeError):
+        t.unknown = 1
+    # Symbols are interned so the trades of a symbol share the same string
+    assert t.symbol is Trade.from_dict(dict(t.to_dict(), id="other")).symbol
+
+
+def test_create_id():
+    now = datetime.now()
+    ids = [Trade(now, Actions.FEE, 1, "", 0, 0, 0, "").id for _ in range(10000)]
+    # Ids created in a tight loop are unique and increasing
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    # Ids have the same format of the SHA-1 ids of the older trading logs
+    assert all(len(i) == 40 and int(i, 16) >= 0 for i in ids)
+    assert IdGenerator().next_id()[:12] >= ids[0][:12]
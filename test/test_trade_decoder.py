@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from tradingmate.model import Trade, TradeDecoder
+
+
+def fields(trade):
+    return (trade.to_dict(), trade.date, trade.action, trade.total)
+
+
+@pytest.fixture
+def items():
+    with open("test/test_data/trading_log.json") as f:
+        return json.load(f)["trades"]
+
+
+def test_decode(items):
+    decoder = TradeDecoder()
+    for item in items:
+        assert fields(decoder.decode(item)) == fields(Trade.from_dict(item))
+
+
+@pytest.mark.parametrize(
+    "date", ["04/10/2017 00:00", "4/10/2017 0:00", "29/02/2020 23:59"]
+)
+def test_decode_date(items, date):
+    item = dict(items[0], date=date)
+    assert TradeDecoder().decode(item).date == Trade.from_dict(item).date
+
+
+@pytest.mark.parametrize(
+    "date", ["31/02/2017 00:00", "04/10/2017", "04-10-2017 00:00", "+4/10/2017 00:00"]
+)
+def test_decode_invalid_date(items, date):
+    with pytest.raises(ValueError):
+        TradeDecoder().decode(dict(items[0], date=date))
+
+
+def test_decode_invalid_item(items):
+    item = dict(items[0])
+    del item["stamp_duty"]
+    with pytest.raises(ValueError):
+        TradeDecoder().decode(item)
+    with pytest.raises(ValueError):
+        TradeDecoder().decode(dict(items[0], action="WRONG"))
@@ -0,0 +1,73 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tradingmate.model import ConfigurationManager, DatabaseHandler
+from tradingmate.model.storage import CacheEntry, JsonStorage, TradingLogCache
+
+
+@pytest.fixture
+def filepath(tmp_path):
+    path = Path(tmp_path, "trading_log.json")
+    shutil.copy("test/test_data/trading_log.json", path)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TradingLogCache(Path(tmp_path, "cache"))
+
+
+def make_dbh(filepath, cache):
+    config = ConfigurationManager(Path("test/test_data/config.json"))
+    dbh = DatabaseHandler(config, filepath)
+    dbh._cache = cache
+    dbh.read_data()
+    return dbh
+
+
+def test_load_store(filepath, cache):
+    assert cache.load([filepath]) is None
+    name, trades = JsonStorage(filepath).read()
+    cache.store([filepath], CacheEntry(name, trades, {"key": 42}))
+    entry = cache.load([filepath])
+    assert entry.name == name
+    assert [t.to_dict() for t in entry.trades] == [t.to_dict() for t in trades]
+    assert entry.data == {"key": 42}
+    # Any change of the file invalidates the entry
+    with filepath.open(mode="a") as f:
+        f.write(" ")
+    assert cache.load([filepath]) is None
+
+
+def test_database_handler_cache(filepath, cache):
+    dbh = make_dbh(filepath, cache)
+    assert dbh.get_cached_data("key") is None
+    dbh.set_cached_data("key", [1, 2, 3])
+    # The trading log is loaded from the cache with the data computed from it
+    cached = make_dbh(filepath, cache)
+    assert cached.get_trading_log_name() == dbh.get_trading_log_name()
+    assert [t.to_dict() for t in cached.get_trades_list()] == [
+        t.to_dict() for t in dbh.get_trades_list()
+    ]
+    assert cached.find_trade_position("mock_last_trade") == len(dbh.trading_history) - 1
+    assert cached.get_cached_data("key") == [1, 2, 3]
+    assert cached.get_cached_data("key") is None
+    # Data computed from a changed trade history is not cached
+    cached.delete_trade("mock_last_trade")
+    cached.set_cached_data("key", [4])
+    assert make_dbh(filepath, cache).get_cached_data("key") == [1, 2, 3]
+    # Saving the changes invalidates the cache
+    assert cached.write_data()
+    assert make_dbh(filepath, cache).get_cached_data("key") is None
+
+
+def test_database_handler_cache_file_changed_after_read(filepath, cache):
+    dbh = make_dbh(filepath, cache)
+    # The file changes after the trade history is read but before it is cached
+    with filepath.open(mode="a") as f:
+        f.write(" ")
+    dbh.set_cached_data("key", [1, 2, 3])
+    # The trade history read before the change is not returned for the new file
+    assert make_dbh(filepath, cache).get_cached_data("key") is None
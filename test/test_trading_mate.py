@@ -98,6 +98,27 @@ def test_new_trade_event(trading_mate):
             trading_mate.new_trade_event(trade, pf.get_id())
 
 
+def test_new_trades_event(trading_mate):
+    trade_dict = {
+        "id": "new_trade",
+        "date": "01/01/2020 00:00",
+        "action": "DEPOSIT",
+        "quantity": 1000,
+        "symbol": "",
+        "price": 0,
+        "fee": 0,
+        "stamp_duty": 0,
+        "notes": "some notes",
+    }
+    for pf in trading_mate.get_portfolios():
+        trades = [Trade.from_dict(trade_dict), Trade.from_dict(trade_dict)]
+        trading_mate.new_trades_event(trades, pf.get_id())
+    # Verify the trades have been added
+    for pf in trading_mate.get_portfolios():
+        assert len(pf.get_trade_history()) == 56
+        assert pf.get_trade_history()[-1].id == "new_trade"
+
+
 def test_delete_trade_event(trading_mate):
     for pf in trading_mate.get_portfolios():
         # Disable auto refresh so we do not need to mock requests for MOCK1
@@ -123,6 +144,7 @@ def test_save_portfolio_event(trading_mate):
         temp_file = Path(f"/tmp/new_trading_log{pf.get_id()}.json")
         assert not temp_file.exists()
         trading_mate.save_portfolio_event(pf.get_id(), temp_file)
+        assert pf.wait_for_saves()
         assert temp_file.exists()
 
 
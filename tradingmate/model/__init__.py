@@ -5,11 +5,21 @@ from .trade import (  # NOQA # isort:skip
     DATETIME_FORMAT,
     TradeDict,
 )
+from .trade_decoder import TradeDecoder  # NOQA # isort:skip
 from .configuration import (  # NOQA # isort:skip
     ConfigurationManager,
     ConfigDict,
 )
-from .database_handler import DatabaseHandler  # NOQA # isort:skip
+from .money import Money, UNITS_PER_PENNY, UNITS_PER_POUND  # NOQA # isort:skip
 from .holding import Holding  # NOQA # isort:skip
+from .checkpoint import Checkpoint, OpenLots, OpeningBalance  # NOQA # isort:skip
+from .database_handler import DatabaseHandler  # NOQA # isort:skip
+from .portfolio_summary import PortfolioSummary  # NOQA # isort:skip
+from .holdings_table import HoldingsTable  # NOQA # isort:skip
+from .portfolio_state import PortfolioState  # NOQA # isort:skip
+from .running_balance import RunningBalance  # NOQA # isort:skip
+from .trade_columns import TradeColumns  # NOQA # isort:skip
+from .vectorized_replay import VectorizedReplay  # NOQA # isort:skip
 from .stock_price_getter import StockPriceGetter  # NOQA # isort:skip
+from .trading_log_watcher import TradingLogWatcher  # NOQA # isort:skip
 from .portfolio import Portfolio  # NOQA # isort:skip
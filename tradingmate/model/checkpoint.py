@@ -0,0 +1,89 @@
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from . import DATETIME_FORMAT, Holding
+
+# List of (price, quantity) of the BUY trades that opened a position
+OpenLots = List[Tuple[float, int]]
+
+
+class Checkpoint(NamedTuple):
+    """Immutable snapshot of the portfolio state built replaying the trade history
+    up to, but excluding, the trade at ``position``
+    """
+
+    position: int
+    # Cash as fixed point Money
+    cash_deposited: int
+    cash_available: int
+    holdings: Tuple[Tuple[str, int, Tuple[Tuple[float, int], ...]], ...]
+
+    @staticmethod
+    def create(
+        position: int,
+        cash_deposited: int,
+        cash_available: int,
+        holdings: Dict[str, Holding],
+        lots: Dict[str, OpenLots],
+    ) -> "Checkpoint":
+        """Create a checkpoint from the given portfolio state"""
+        return Checkpoint(
+            position,
+            cash_deposited,
+            cash_available,
+            tuple((s, h.get_quantity(), tuple(lots[s])) for s, h in holdings.items()),
+        )
+
+    def get_holdings(self) -> Dict[str, Holding]:
+        """Return a new dictionary of Holding built from the checkpoint"""
+        return {s: Holding(s, quantity) for s, quantity, _ in self.holdings}
+
+    def get_lots(self) -> Dict[str, OpenLots]:
+        """Return a new dictionary of the open lots of each holding"""
+        return {s: list(lots) for s, _, lots in self.holdings}
+
+
+class OpeningBalance(NamedTuple):
+    """Checkpoint of the portfolio state before the trades of the trading log
+    that are not older than ``date``. It is stored with the trading logs that can
+    be loaded from it without the older trades, whose number is the position of
+    the checkpoint
+    """
+
+    date: datetime
+    checkpoint: Checkpoint
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "date": self.date.strftime(DATETIME_FORMAT),
+            "position": self.checkpoint.position,
+            "cash_deposited": self.checkpoint.cash_deposited,
+            "cash_available": self.checkpoint.cash_available,
+            "holdings": [
+                [symbol, quantity, [list(lot) for lot in lots]]
+                for symbol, quantity, lots in self.checkpoint.holdings
+            ],
+        }
+
+    @staticmethod
+    def from_dict(item: Dict[str, Any]) -> "OpeningBalance":
+        try:
+            return OpeningBalance(
+                datetime.strptime(str(item["date"]), DATETIME_FORMAT),
+                Checkpoint(
+                    int(item["position"]),
+                    int(item["cash_deposited"]),
+                    int(item["cash_available"]),
+                    tuple(
+                        (
+                            sys.intern(str(symbol)),
+                            int(quantity),
+                            tuple((float(p), int(q)) for p, q in lots),
+                        )
+                        for symbol, quantity, lots in item["holdings"]
+                    ),
+                ),
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("item not well formatted")
@@ -4,7 +4,7 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List
 
-from ..utils import Utils
+from ..utils import ReplayEngines, Utils
 
 # FIXME Property should be of type JSON byt it requires typing to accepts recursive types
 Property = Any
@@ -113,6 +113,37 @@ class ConfigurationManager:
         """
         return self.config["general"]["stocks_interface"]["active"]
 
+    def get_replay_engine(self) -> str:
+        """
+        Get the engine used to replay the trading logs
+        """
+        return self.config["general"].get("replay_engine", ReplayEngines.PYTHON.value)
+
+    def get_trading_log_journal(self) -> bool:
+        """
+        Get the flag to store the changes of the trading logs in a journal
+        """
+        return bool(self.config["general"].get("trading_log_journal", False))
+
+    def get_trading_log_cache(self) -> bool:
+        """
+        Get the flag to cache the parsed trading logs
+        """
+        return bool(self.config["general"].get("trading_log_cache", False))
+
+    def get_trading_log_compact(self) -> bool:
+        """
+        Get the flag to write the compressed trading logs without indentation
+        """
+        return bool(self.config["general"].get("trading_log_compact", False))
+
+    def get_trading_log_watch_period(self) -> float:
+        """
+        Get the seconds between two checks of the trading logs for changes made
+        by other processes, 0 disables the checks
+        """
+        return float(self.config["general"].get("trading_log_watch_period_sec", 0))
+
     def get_alpha_vantage_api_key(self) -> str:
         """
         Get the alphavantage api key
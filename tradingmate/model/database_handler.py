@@ -1,9 +1,24 @@
+import heapq
 import logging
+import threading
+from datetime import datetime
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Counter, Dict, List, Optional, Tuple
 
-from ..utils import Utils
-from . import ConfigurationManager, Trade
+from ..utils import Messages, TradingLogConflictError
+from . import ConfigurationManager, OpeningBalance, Trade
+from .storage import (
+    CacheEntry,
+    CacheKey,
+    SaveCallback,
+    SaveWorker,
+    StorageFactory,
+    StorageImpl,
+    TradingLogCache,
+)
+
+# Size and modification time of a file
+FileSignature = Tuple[int, int]
 
 
 class DatabaseHandler:
@@ -14,6 +29,21 @@ class DatabaseHandler:
     db_filepath: Path
     db_name: str = "unknown"
     trading_history: List[Trade]
+    _opening: Optional[OpeningBalance]
+    _storage_factory: StorageFactory
+    _storage: StorageImpl
+    _save_worker: SaveWorker
+    _symbol_index: Dict[str, List[Trade]]
+    _id_index: Dict[str, List[Trade]]
+    _cache: Optional[TradingLogCache]
+    _cache_key: Optional[CacheKey]
+    _cached_data: Dict[str, Any]
+    _history_changed: bool
+    _file_lock: threading.Lock
+    _file_signature: Optional[FileSignature]
+    _file_ids: Counter[str]
+    _external_file: Optional[Tuple[Optional[FileSignature], Counter[str]]]
+    _rejected_file: Optional[Tuple[Optional[FileSignature], Counter[str]]]
 
     def __init__(self, config: ConfigurationManager, trading_log_path: Path) -> None:
         """
@@ -22,6 +52,27 @@ class DatabaseHandler:
         self.db_filepath = trading_log_path
         self.db_name = "unknown"
         self.trading_history = []
+        # Opening balance the trade history starts from if the older trades are
+        # not loaded
+        self._opening = None
+        self._storage_factory = StorageFactory(config)
+        self._save_worker = SaveWorker()
+        # Date sorted trades of each symbol and of each id
+        self._symbol_index = {}
+        self._id_index = {}
+        # Cache of the parsed trading logs
+        self._cache = TradingLogCache() if config.get_trading_log_cache() else None
+        self._cache_key = None
+        self._cached_data = {}
+        self._history_changed = False
+        # Signature and trade ids of the file as last read or written
+        self._file_lock = threading.Lock()
+        self._file_signature = None
+        self._file_ids = Counter()
+        # Signature and trade ids of the external changes read but not yet
+        # applied, and of the ones that could not be applied
+        self._external_file = None
+        self._rejected_file = None
         self.read_data(self.db_filepath)
 
     def read_data(self, filepath: Path = None):
@@ -30,35 +81,206 @@ class DatabaseHandler:
 
             - **filepath**: optional, if not set the configured path will be used
         """
-        path = filepath if filepath is not None else self.db_filepath
+        path = Path(filepath) if filepath is not None else self.db_filepath
         logging.info("DatabaseHandler - reading data from {}".format(path))
         self.db_filepath = path
-        json_obj = Utils.load_json_file(path)
-        # Store the database name
-        self.db_name = json_obj["name"]
-        # Create a list of all the trades in the json file
-        self.trading_history.clear()
-        if json_obj is not None:
-            for item in json_obj["trades"]:
-                trade = Trade.from_dict(item)
-                self.trading_history.append(trade)
-        self.trading_history = sorted(self.trading_history, key=lambda t: t.date)
+        self._save_worker.flush()
+        if hasattr(self, "_storage"):
+            self._storage.close()
+        self._storage = self._storage_factory.make_from_configuration(path)
+        self._history_changed = False
+        self._opening = None
+        entry = self._load_cache()
+        recent = self._storage.read_recent() if entry is None else None
+        if entry is not None:
+            self.db_name, self.trading_history, self._cached_data = entry
+        elif recent is not None:
+            self.db_name, self.trading_history, self._opening = recent
+            self._cached_data = {}
+        else:
+            # Store the database name and the list of all the trades
+            self.db_name, trades = self._storage.read()
+            # Sort in place to avoid a copy of the whole trade history
+            trades.sort(key=lambda t: t.date)
+            self.trading_history = trades
+            self._cached_data = {}
+        self._build_indexes()
+        with self._file_lock:
+            self._set_file_state(
+                self._get_file_signature(), Counter(t.id for t in self.trading_history)
+            )
 
     def write_data(self, filepath: Path = None) -> bool:
         """
         Write the trade history to the database
         """
-        path = filepath if filepath is not None else self.db_filepath
+        path = Path(filepath) if filepath is not None else self.db_filepath
         logging.info("DatabaseHandler - writing data to {}".format(path))
-        # Create a json object and store the trade history into it
-        json_obj: Any = {
-            "name": self.db_name,
-            "trades": [],
-        }
-        for t in self.trading_history:
-            json_obj["trades"].append(t.to_dict())
-        # Write to file
-        return Utils.write_json_file(path, json_obj)
+        # Complete the background saves first so they can not overwrite this one
+        self._save_worker.flush()
+        return self._write(self._get_storage(path), self.db_name, self.trading_history)
+
+    def save_data(
+        self,
+        filepath: Optional[Path] = None,
+        on_saved: Optional[SaveCallback] = None,
+        opening: Optional[OpeningBalance] = None,
+    ) -> None:
+        """
+        Write a snapshot of the trade history to the database in background.
+        Saves requested while a previous one is waiting are coalesced. It must not
+        be called while the trade history is edited by another thread
+
+            - **filepath**: optional, if not set the configured path will be used
+            - **on_saved**: optional, called from the background thread with
+              True if the snapshot has been written, False otherwise
+            - **opening**: optional, opening balance at the date returned by
+              get_opening_date computed from the trade history, stored with it
+
+        Throws TradingLogConflictError if the trading log has changes made by
+        another process that could not be applied
+        """
+        path = Path(filepath) if filepath is not None else self.db_filepath
+        logging.info("DatabaseHandler - saving data to {}".format(path))
+        storage = self._get_storage(path)
+        if storage is self._storage and self.has_conflicts():
+            logging.error(
+                "DatabaseHandler - {} has changes that could not be applied".format(
+                    path
+                )
+            )
+            raise TradingLogConflictError(Messages.SAVE_CONFLICTS.value)
+        name = self.db_name
+        # The trades are not modified once created so a shallow copy is enough.
+        # The storage version tells which notified changes the snapshot includes
+        trades = list(self.trading_history)
+        version = storage.get_version()
+        if storage is not self._storage:
+            opening = None
+        self._save_worker.submit(
+            path,
+            lambda: self._write(storage, name, trades, version, opening),
+            on_saved,
+        )
+
+    def wait_for_saves(self) -> bool:
+        """
+        Wait for the background saves to complete. Return True if they all
+        succeeded, False otherwise
+        """
+        return self._save_worker.flush()
+
+    def has_external_changes(self) -> bool:
+        """
+        Return True if the trading log file has been modified by another process
+        since it was last read, written or its changes applied. Changes that
+        could not be applied are not reported again until the file changes.
+        Only the storages that modify the file when saved can be watched
+        """
+        if not self._storage.watchable:
+            return False
+        with self._file_lock:
+            signature = self._get_file_signature()
+            if self._rejected_file is not None and signature == self._rejected_file[0]:
+                return False
+            return signature != self._file_signature
+
+    def has_conflicts(self) -> bool:
+        """
+        Return True if the trading log file holds changes made by another process
+        that could not be applied. The trading log is not overwritten until they
+        are discarded with discard_external_changes or the file changes again
+        """
+        with self._file_lock:
+            return self._has_conflicts()
+
+    def read_external_changes(self) -> Tuple[List[Trade], List[str]]:
+        """
+        Read the trading log file modified by another process and return the
+        trades added to it and the ids of the trades removed from it since it was
+        last read or written. The trade history is not modified. The changes are
+        reported again until accepted with accept_external_changes, or ignored
+        until the file changes with reject_external_changes
+        """
+        with self._file_lock:
+            signature = self._get_file_signature()
+            _, trades = self._storage_factory.make(self.db_filepath).read()
+            ids = Counter(t.id for t in trades)
+            removed = list((self._file_ids - ids).elements())
+            # Ids are not unique so only the occurrences exceeding the known
+            # ones are new trades
+            known = Counter(self._file_ids)
+            added = []
+            for trade in trades:
+                if known[trade.id] > 0:
+                    known[trade.id] -= 1
+                else:
+                    added.append(trade)
+            self._external_file = (signature, ids)
+        return added, removed
+
+    def accept_external_changes(self) -> None:
+        """
+        Record that the changes returned by read_external_changes have been
+        applied to the trade history
+        """
+        with self._file_lock:
+            if self._external_file is not None:
+                self._set_file_state(*self._external_file)
+
+    def reject_external_changes(self) -> None:
+        """
+        Record that the changes returned by read_external_changes could not be
+        applied. The trading log is not written until the conflict is solved
+        """
+        with self._file_lock:
+            if self._external_file is not None:
+                self._rejected_file = self._external_file
+                self._external_file = None
+
+    def discard_external_changes(self) -> None:
+        """
+        Discard the changes of the trading log file that could not be applied so
+        that the next write overwrites them with the trade history
+        """
+        with self._file_lock:
+            if self._rejected_file is not None:
+                logging.warning(
+                    "DatabaseHandler - discarding the changes of {}".format(
+                        self.db_filepath
+                    )
+                )
+                self._set_file_state(*self._rejected_file)
+
+    def get_cached_data(self, key: str) -> Optional[Any]:
+        """
+        Return the data computed from the trade history stored in the cache with
+        the trading log, or None if not available. The data is returned only once
+        """
+        return self._cached_data.pop(key, None)
+
+    def set_cached_data(self, key: str, data: Any) -> None:
+        """
+        Store in the cache the trading log and the data computed from its trade
+        history if the trade history has not changed since it was read
+        """
+        if self._cache is None or self._cache_key is None:
+            return
+        if self._history_changed:
+            return
+        # Stored under the key of the file content the trade history was read from
+        self._cache.store(
+            [self.db_filepath],
+            CacheEntry(self.db_name, self.trading_history, {key: data}),
+            self._cache_key,
+        )
+
+    def close(self) -> None:
+        """
+        Complete any pending operation on the database
+        """
+        self._save_worker.stop()
+        self._storage.close()
 
     def get_db_filepath(self) -> Path:
         """
@@ -78,24 +300,319 @@ class DatabaseHandler:
         """
         return self.trading_history
 
+    def get_symbol_trades(self, symbol: str) -> List[Trade]:
+        """
+        Return the date sorted list of trades of the given symbol. The ones older
+        than the loaded trade history are read from the storage without loading it
+        """
+        trades = list(self._symbol_index.get(symbol, []))
+        if self._opening is None:
+            return trades
+        return self._storage.read_older(self._opening.date, symbol) + trades
+
+    def get_opening_balance(self) -> Optional[OpeningBalance]:
+        """
+        Return the opening balance the trade history starts from if the older
+        trades have not been loaded, None if the whole trade history is loaded
+        """
+        return self._opening
+
+    def load_older_trades(self) -> int:
+        """
+        Load the trades older than the opening balance the trade history starts
+        from, if any. Return the number of trades loaded
+        """
+        if self._opening is None:
+            return 0
+        logging.info(
+            "DatabaseHandler - reading trades older than {}".format(self._opening.date)
+        )
+        older = self._storage.read_older(self._opening.date)
+        older.sort(key=lambda t: t.date)
+        self.trading_history = list(
+            heapq.merge(older, self.trading_history, key=lambda t: t.date)
+        )
+        self._opening = None
+        self._build_indexes()
+        with self._file_lock:
+            self._file_ids.update(t.id for t in older)
+        return len(older)
+
+    def get_opening_date(self) -> Optional[datetime]:
+        """
+        Return the date of the opening balance to store with the trade history,
+        the start of the year of the most recent trade, or None if the storage
+        does not store it or the loaded trade history starts after that date
+        """
+        if not self._storage.stores_opening_balance or not self.trading_history:
+            return None
+        date = datetime(self.trading_history[-1].date.year, 1, 1)
+        if self._opening is not None and date < self._opening.date:
+            return None
+        return date
+
+    def find_opening_position(self, date: datetime) -> int:
+        """
+        Return the position in the trade history of the first trade that is not
+        older than the given date
+        """
+        return _find_date_position(self.trading_history, date, False)
+
+    def find_date_position(self, date: datetime) -> int:
+        """
+        Return the position where a trade of the given date is inserted in the
+        trade history, after any existing trade with the same date
+        """
+        return _find_date_position(self.trading_history, date)
+
+    def find_trade_position(self, trade_id: str) -> Optional[int]:
+        """
+        Return the position in the trade history of the first trade with the
+        given id or None if there is no such trade
+        """
+        trades = self._id_index.get(trade_id)
+        if not trades:
+            return None
+        return _find_position(self.trading_history, trades[0])
+
     def add_trade(self, trade: Trade) -> None:
         """
         Add a trade to the database
         """
         try:
-            self.trading_history.append(trade)
-            self.trading_history = sorted(self.trading_history, key=lambda t: t.date)
+            self._load_trades_older_than(trade.date)
+            # Insert in place after any trade with the same date keeping the
+            # history sorted as a stable sort would do
+            _insert_trade(self.trading_history, trade)
+            self._index_trade(trade)
+            try:
+                self._storage.on_trade_added(trade, self.db_name, self.trading_history)
+            except Exception:
+                # The trade history must match what the storage holds
+                del self.trading_history[_find_position(self.trading_history, trade)]
+                self._unindex_trade(trade)
+                raise
+            self._history_changed = True
         except Exception as e:
             logging.error(e)
             raise RuntimeError("Unable to add trade to the database")
 
+    def add_trades(self, trades: List[Trade]) -> None:
+        """
+        Add a list of trades to the database merging them in the trade history
+        """
+        try:
+            batch = sorted(trades, key=lambda t: t.date)
+            if len(batch) > 0:
+                self._load_trades_older_than(batch[0].date)
+        except Exception as e:
+            logging.error(e)
+            raise RuntimeError("Unable to add trades to the database")
+        previous = self.trading_history
+        try:
+            self.trading_history = list(
+                heapq.merge(self.trading_history, batch, key=lambda t: t.date)
+            )
+            self._build_indexes()
+            self._storage.on_trades_added(batch, self.db_name, self.trading_history)
+            self._history_changed = True
+        except Exception as e:
+            logging.error(e)
+            # The trade history must match what the storage holds
+            self.trading_history = previous
+            self._build_indexes()
+            raise RuntimeError("Unable to add trades to the database")
+
     def delete_trade(self, trade_id: str) -> None:
         """
         Remove the trade from the trade history
         """
         try:
-            item = next((t for t in self.trading_history if t.id == trade_id))
-            self.trading_history.remove(item)
+            position = self.find_trade_position(trade_id)
+            if position is None:
+                # The trade can be older than the opening balance
+                self.load_older_trades()
+                position = self.find_trade_position(trade_id)
+            if position is None:
+                raise ValueError(f"Trade {trade_id} not found")
+            trade = self.trading_history.pop(position)
+            self._unindex_trade(trade)
+            try:
+                self._storage.on_trade_deleted(
+                    trade, self.db_name, self.trading_history
+                )
+            except Exception:
+                # The trade history must match what the storage holds. The
+                # indexes are rebuilt to keep the order of trades with same date
+                self.trading_history.insert(position, trade)
+                self._build_indexes()
+                raise
+            self._history_changed = True
         except Exception as e:
             logging.error(e)
             raise RuntimeError("Unable to delete trade")
+
+    def _write(
+        self,
+        storage: StorageImpl,
+        name: str,
+        trades: List[Trade],
+        version: Optional[int] = None,
+        opening: Optional[OpeningBalance] = None,
+    ) -> bool:
+        """
+        Write the trades, or their snapshot taken at the given storage version
+        and its opening balance, to the storage recording the signature of the
+        trading log file so that the write is not detected as an external change.
+        The storages of the exports are closed once written
+        """
+        try:
+            return self._write_storage(storage, name, trades, version, opening)
+        finally:
+            if storage is not self._storage:
+                storage.close()
+
+    def _write_storage(
+        self,
+        storage: StorageImpl,
+        name: str,
+        trades: List[Trade],
+        version: Optional[int],
+        opening: Optional[OpeningBalance],
+    ) -> bool:
+        """Write the trades and the opening balance to the storage"""
+        with self._file_lock:
+            if storage is self._storage and self._has_conflicts():
+                logging.error(
+                    "DatabaseHandler - {} has changes that could not be applied, "
+                    "discard them before saving".format(self.db_filepath)
+                )
+                return False
+            if version is None:
+                written = storage.write(name, trades)
+            else:
+                written = storage.write_snapshot(name, trades, version)
+            if not written:
+                return False
+            if opening is not None and version is not None:
+                storage.write_opening_balance(opening, version)
+            if storage is self._storage:
+                self._set_file_state(
+                    self._get_file_signature(), Counter(t.id for t in trades)
+                )
+            return True
+
+    def _set_file_state(
+        self, signature: Optional[FileSignature], ids: Counter[str]
+    ) -> None:
+        """Record the signature and trade ids of the file as in the trade history"""
+        self._file_signature = signature
+        self._file_ids = ids
+        self._external_file = None
+        self._rejected_file = None
+
+    def _has_conflicts(self) -> bool:
+        """Return True if the file still holds the rejected external changes"""
+        if self._rejected_file is None:
+            return False
+        return self._get_file_signature() != self._file_signature
+
+    def _get_file_signature(self) -> Optional[FileSignature]:
+        """Return the signature of the trading log file or None if missing"""
+        try:
+            stat = self.db_filepath.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _get_storage(self, path: Path) -> StorageImpl:
+        """Return the storage of the trading log at the given path"""
+        if path == self.db_filepath:
+            return self._storage
+        # Other paths are exports of the whole trade history to a new trading log
+        self.load_older_trades()
+        return self._storage_factory.make(path)
+
+    def _load_cache(self) -> Optional[CacheEntry]:
+        """
+        Return the cached trading log if it has not changed since it was cached.
+        The key of the trading log is taken before reading it so the trades read
+        from a file changed meanwhile are never cached under its new key
+        """
+        self._cache_key = None
+        if self._cache is None or not self._storage.cacheable:
+            return None
+        self._cache_key = self._cache.get_key([self.db_filepath])
+        return self._cache.load([self.db_filepath], self._cache_key)
+
+    def _load_trades_older_than(self, date: datetime) -> None:
+        """
+        Load the trades older than the opening balance if the given date is older
+        """
+        if self._opening is not None and date < self._opening.date:
+            self.load_older_trades()
+
+    def _build_indexes(self) -> None:
+        """
+        Build the symbol and id indexes of the trade history
+        """
+        self._symbol_index = {}
+        self._id_index = {}
+        for trade in self.trading_history:
+            if trade.symbol:
+                self._symbol_index.setdefault(trade.symbol, []).append(trade)
+            self._id_index.setdefault(trade.id, []).append(trade)
+
+    def _index_trade(self, trade: Trade) -> None:
+        """
+        Add the trade to the symbol and id indexes
+        """
+        if trade.symbol:
+            _insert_trade(self._symbol_index.setdefault(trade.symbol, []), trade)
+        _insert_trade(self._id_index.setdefault(trade.id, []), trade)
+
+    def _unindex_trade(self, trade: Trade) -> None:
+        """
+        Remove the trade from the symbol and id indexes
+        """
+        for index, key in [
+            (self._symbol_index, trade.symbol),
+            (self._id_index, trade.id),
+        ]:
+            if key in index:
+                trades = index[key]
+                del trades[_find_position(trades, trade)]
+                if len(trades) == 0:
+                    del index[key]
+
+
+def _find_date_position(trades: List[Trade], date: datetime, after: bool = True) -> int:
+    """
+    Return the position of the first trade newer than the given date in the
+    date sorted list of trades, or of the first one not older if after is False
+    """
+    low, high = 0, len(trades)
+    while low < high:
+        middle = (low + high) // 2
+        if date < trades[middle].date or (not after and date == trades[middle].date):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _find_position(trades: List[Trade], trade: Trade) -> int:
+    """
+    Return the position of the trade in the date sorted list of trades
+    """
+    position = _find_date_position(trades, trade.date) - 1
+    while trades[position] is not trade:
+        position -= 1
+    return position
+
+
+def _insert_trade(trades: List[Trade], trade: Trade) -> None:
+    """
+    Insert the trade in the date sorted list after any trade with the same date
+    """
+    trades.insert(_find_date_position(trades, trade.date), trade)
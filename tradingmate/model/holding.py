@@ -1,15 +1,24 @@
 import logging
+import sys
 from typing import Optional
 
 
 class Holding:
     """Represent a current open position for a Market"""
 
+    __slots__ = (
+        "_symbol",
+        "_quantity",
+        "_open_price",
+        "_last_price",
+        "_last_price_valid",
+    )
+
     _symbol: str
     _quantity: int
-    _open_price: Optional[float] = None
-    _last_price: Optional[float] = None
-    _last_price_valid: bool = False
+    _open_price: Optional[float]
+    _last_price: Optional[float]
+    _last_price_valid: bool
 
     def __init__(
         self, symbol: str, quantity: int, open_price: Optional[float] = None
@@ -20,7 +29,7 @@ class Holding:
         if open_price is not None and open_price < 0:
             logging.error("Holding - init: Invalid open_price")
             raise ValueError("Invalid open_price")
-        self._symbol = symbol
+        self._symbol = sys.intern(symbol)
         self._quantity = quantity
         self._open_price = open_price
         self._last_price = None
@@ -0,0 +1,152 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from . import Holding, PortfolioSummary
+
+
+class HoldingsTable:
+    """Holdings stored as one NumPy array per field with a row per symbol, sorted
+    alphabetically. Unknown open and last prices are NaN and flagged in the
+    validity masks. The arrays are read only so a table can be shared between
+    threads, updating the last prices creates a new table
+    """
+
+    symbols: List[str]
+    quantity: np.ndarray
+    open_price: np.ndarray
+    last_price: np.ndarray
+    open_price_valid: np.ndarray
+    last_price_valid: np.ndarray
+    _index: Dict[str, int]
+
+    def __init__(
+        self,
+        symbols: List[str],
+        quantity: np.ndarray,
+        open_price: np.ndarray,
+        last_price: np.ndarray,
+        index: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.symbols = symbols
+        self.quantity = _read_only(quantity)
+        self.open_price = _read_only(open_price)
+        self.last_price = _read_only(last_price)
+        self.open_price_valid = _read_only(~np.isnan(open_price))
+        self.last_price_valid = _read_only(~np.isnan(last_price))
+        self._index = (
+            index if index is not None else {s: i for i, s in enumerate(symbols)}
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self._index
+
+    @staticmethod
+    def create(
+        holdings: Iterable[Holding], last_prices: Dict[str, float]
+    ) -> "HoldingsTable":
+        """Build the table of the given holdings setting their last price"""
+        rows = sorted(holdings, key=lambda h: h.get_symbol())
+        table = HoldingsTable(
+            [h.get_symbol() for h in rows],
+            np.array([h.get_quantity() for h in rows], dtype=np.int64),
+            np.array([_to_nan(h.get_open_price()) for h in rows], dtype=np.float64),
+            np.full(len(rows), np.nan),
+        )
+        return table.with_last_prices(last_prices)
+
+    def with_last_prices(self, last_prices: Dict[str, float]) -> "HoldingsTable":
+        """Return a new table with the last price of the given symbols updated"""
+        last_price = self.last_price.copy()
+        for symbol, price in last_prices.items():
+            index = self._index.get(symbol)
+            if index is None:
+                continue
+            if price is None or price < 0:
+                raise ValueError("Invalid price")
+            last_price[index] = price
+        # Symbols, quantities and open prices never change so they are shared
+        return HoldingsTable(
+            self.symbols, self.quantity, self.open_price, last_price, self._index
+        )
+
+    def get_holding(self, symbol: str) -> Holding:
+        """Return a new Holding with the values of the row of the given symbol"""
+        index = self._index[symbol]
+        holding = Holding(
+            symbol,
+            int(self.quantity[index]),
+            _from_nan(self.open_price[index]),
+        )
+        last_price = _from_nan(self.last_price[index])
+        if last_price is not None:
+            holding.set_last_price(last_price)
+        return holding
+
+    def get_quantity(self, symbol: str) -> int:
+        """Return the quantity held for the given symbol, 0 if not held"""
+        index = self._index.get(symbol)
+        return int(self.quantity[index]) if index is not None else 0
+
+    def get_open_price(self, symbol: str) -> Optional[float]:
+        """Return the open price of the given symbol or None if unknown"""
+        return _from_nan(self.open_price[self._index[symbol]])
+
+    def get_last_price(self, symbol: str) -> Optional[float]:
+        """Return the last price of the given symbol or None if unknown"""
+        return _from_nan(self.last_price[self._index[symbol]])
+
+    def get_costs(self) -> np.ndarray:
+        """Return the cost in £ of each row, NaN if the open price is unknown"""
+        return self.quantity * (self.open_price / 100)
+
+    def get_values(self) -> np.ndarray:
+        """Return the value in £ of each row, NaN if the last price is unknown"""
+        return self.quantity * (self.last_price / 100)
+
+    def get_profit_loss(self) -> np.ndarray:
+        """Return the profit/loss in £ of each row, NaN if it can't be computed"""
+        return self.get_values() - self.get_costs()
+
+    def get_profit_loss_perc(self) -> np.ndarray:
+        """Return the profit/loss in % of each row, NaN if it can't be computed"""
+        costs = self.get_costs()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            perc = (self.get_profit_loss() / costs) * 100
+        # Positions opened at no cost have no percentage
+        perc[costs == 0] = np.nan
+        return perc
+
+    def get_summary(self) -> PortfolioSummary:
+        """Compute the summary of the holdings in one vectorized pass"""
+        values = self.get_values()
+        costs = self.get_costs()
+        value_sum: Optional[float] = None
+        cost_sum: Optional[float] = None
+        pl_sum: Optional[float] = None
+        if self.last_price_valid.all():
+            value_sum = float(values.sum())
+        if self.open_price_valid.all():
+            cost_sum = float(costs.sum())
+        if value_sum is not None and cost_sum is not None:
+            pl_sum = float((values - costs).sum())
+        pl_perc: Optional[float] = None
+        if value_sum is not None and cost_sum is not None and cost_sum >= 1:
+            pl_perc = ((value_sum - cost_sum) / cost_sum) * 100
+        return PortfolioSummary(value_sum, pl_sum, pl_perc)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def _to_nan(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def _from_nan(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
@@ -0,0 +1,48 @@
+from ..utils import Actions
+from . import Trade
+
+# Money is stored as an integer number of micro-pence
+UNITS_PER_PENNY: int = 1000000
+UNITS_PER_POUND: int = 100 * UNITS_PER_PENNY
+
+
+class Money:
+    """Conversions between the float amounts of the trades, prices in pence and
+    cash in pounds, and the integer fixed point amounts of micro-pence used to
+    replay the trade history. Each trade amount is rounded once to the closest
+    micro-penny so any sum of amounts is exact
+    """
+
+    @staticmethod
+    def from_pounds(amount: float) -> int:
+        """Return the fixed point amount of the given pounds"""
+        return round(amount * UNITS_PER_POUND)
+
+    @staticmethod
+    def to_pounds(amount: int) -> float:
+        """Return the pounds of the given fixed point amount"""
+        return amount / UNITS_PER_POUND
+
+    @staticmethod
+    def get_cost(trade: Trade) -> int:
+        """Return the fixed point cost of the shares of a BUY or SELL trade"""
+        return round(round(trade.price * UNITS_PER_PENNY) * trade.quantity)
+
+    @staticmethod
+    def get_buy_total(trade: Trade) -> int:
+        """Return the fixed point amount of cash required by a BUY trade"""
+        cost = Money.get_cost(trade)
+        return cost + Money.from_pounds(trade.fee) + round(cost * trade.sdr / 100)
+
+    @staticmethod
+    def get_cash_delta(trade: Trade) -> int:
+        """Return the fixed point change of the cash available caused by the trade"""
+        if trade.action == Actions.DEPOSIT or trade.action == Actions.DIVIDEND:
+            return Money.from_pounds(trade.quantity)
+        elif trade.action == Actions.WITHDRAW or trade.action == Actions.FEE:
+            return -Money.from_pounds(trade.quantity)
+        elif trade.action == Actions.BUY:
+            return -Money.get_buy_total(trade)
+        elif trade.action == Actions.SELL:
+            return Money.get_cost(trade) - Money.from_pounds(trade.fee)
+        return 0
@@ -1,11 +1,36 @@
-import hashlib
+import heapq
 import logging
-import time
+import threading
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Counter, Dict, List, Optional, Sequence, Tuple, Union, overload
 
-from ..utils import Actions, Messages
-from . import ConfigurationManager, DatabaseHandler, Holding, StockPriceGetter, Trade
+from ..utils import (
+    SESSION_ID_GENERATOR,
+    Actions,
+    Messages,
+    ReplayEngines,
+    TradeNotAllowedError,
+)
+from . import (
+    Checkpoint,
+    ConfigurationManager,
+    DatabaseHandler,
+    Holding,
+    Money,
+    OpeningBalance,
+    OpenLots,
+    PortfolioState,
+    RunningBalance,
+    StockPriceGetter,
+    Trade,
+    TradeColumns,
+    TradingLogWatcher,
+    VectorizedReplay,
+)
+
+# Number of trades between two consecutive checkpoints of the portfolio state
+CHECKPOINT_INTERVAL: int = 500
 
 
 class Portfolio:
@@ -16,32 +41,73 @@ class Portfolio:
     _db_handler: DatabaseHandler
     _id: str
     _name: str
-    _cash_available: float = 0.0
-    _cash_deposited: float = 0.0
-    _holdings: Dict[str, Holding] = {}
-    _unsaved_changes: bool = False
+    _cash_available: int = 0
+    _cash_deposited: int = 0
+    _holdings: Dict[str, Holding]
+    _lots: Dict[str, OpenLots]
+    _changes: int = 0
+    _saved_changes: int = 0
+    _save_error: Optional[str] = None
     _price_getter: StockPriceGetter
+    _checkpoints: List[Checkpoint]
+    _checkpoint_interval: int = CHECKPOINT_INTERVAL
+    _replay_engine: ReplayEngines
+    _state: PortfolioState
+    _state_lock: threading.Lock
+    _write_lock: threading.RLock
+    _watcher: Optional[TradingLogWatcher]
+    _cash_balance: RunningBalance
+    _quantity_balances: Dict[str, RunningBalance]
+    _balances_built: bool
 
     def __init__(self, config: ConfigurationManager, trading_log_path: Path):
         # Database handler
         self._db_handler = DatabaseHandler(config, trading_log_path)
         # Create an unique id for this portfolio
-        self._id = self._create_id(str(trading_log_path))
+        self._id = self._create_id()
         # Portfolio name
         self._name = self._db_handler.get_trading_log_name()
-        # Amount of free cash available
+        # Amount of free cash available as fixed point Money
         self._cash_available = 0
-        # Overall amount of cash deposited - withdrawed
+        # Overall amount of cash deposited - withdrawed as fixed point Money
         self._cash_deposited = 0
         # Data structure to store stock holdings: {"symbol": Holding}
         self._holdings = {}
-        # Track unsaved changes
-        self._unsaved_changes = False
+        # Open BUY lots of each holding used to compute its open price
+        self._lots = {}
+        # Track unsaved changes as the number of edits made and saved
+        self._changes = 0
+        self._saved_changes = 0
+        # Error of the last background save that failed, until read
+        self._save_error = None
+        # Snapshots of the state taken while replaying the trade history
+        self._checkpoints = []
+        self._checkpoint_interval = CHECKPOINT_INTERVAL
+        # Snapshot of the state published to the readers and lock held to replace it
+        self._state = PortfolioState.create(0, 0, {}, {})
+        self._state_lock = threading.Lock()
+        # Lock held by the edits of the trade history
+        self._write_lock = threading.RLock()
+        # Running balances of cash and holdings used to validate the edits of
+        # past trades, built on the first one
+        self._cash_balance = RunningBalance()
+        self._quantity_balances = {}
+        self._balances_built = False
+        # Engine used to replay the trade history
+        self._replay_engine = ReplayEngines(config.get_replay_engine())
         # Work thread that fetches stocks live prices
         self._price_getter = StockPriceGetter(config, self._on_new_price_data)
         self._price_getter.start()
         # Load the portfolio
         self._load(self._db_handler.get_trades_list())
+        # Work thread that applies the changes of the trading log made by others
+        self._watcher = None
+        watch_period = config.get_trading_log_watch_period()
+        if watch_period > 0:
+            self._watcher = TradingLogWatcher(
+                self._db_handler, watch_period, self._on_trading_log_changed
+            )
+            self._watcher.start_delayed(watch_period)
         logging.info("Portfolio {} initialised".format(self._name))
 
     # PUBLIC API
@@ -49,6 +115,10 @@ class Portfolio:
     def stop(self) -> None:
         self._price_getter.shutdown()
         self._price_getter.join()
+        if self._watcher is not None:
+            self._watcher.shutdown()
+            self._watcher.join()
+        self._db_handler.close()
         logging.info("Portfolio {} closed".format(self._name))
 
     def get_id(self) -> str:
@@ -65,155 +135,367 @@ class Portfolio:
 
     def get_cash_available(self) -> float:
         """Return the available cash quantity in the portfolio [int]"""
-        return self._cash_available
+        return self._state.cash_available
 
     def get_cash_deposited(self) -> float:
         """Return the amount of cash deposited in the portfolio [int]"""
-        return self._cash_deposited
+        return self._state.cash_deposited
 
     def get_holding_list(self) -> List[Holding]:
         """Return a list of Holding instances held in the portfolio sorted alphabetically"""
-        return [self._holdings[k] for k in sorted(self._holdings)]
+        return self._state.get_holding_list()
 
     def get_holding_symbols(self) -> List[str]:
         """Return a list containing the holding symbols as [string] sorted alphabetically"""
-        return list(sorted(self._holdings.keys()))
+        return self._state.get_holding_symbols()
 
     def get_holding_quantity(self, symbol: str) -> int:
         """Return the quantity held for the given symbol"""
-        if symbol in self._holdings:
-            return self._holdings[symbol].get_quantity()
-        else:
-            return 0
+        return self._state.table.get_quantity(symbol)
 
     def get_holding_last_price(self, symbol: str) -> Optional[float]:
         """Return the last price for the given symbol"""
-        if symbol not in self._holdings:
+        table = self._state.table
+        if symbol not in table:
             raise ValueError("Invalid symbol")
-        return self._holdings[symbol].get_last_price()
+        return table.get_last_price(symbol)
 
     def get_holding_open_price(self, symbol: str) -> Optional[float]:
         """Return the last price for the given symbol"""
-        if symbol not in self._holdings:
+        table = self._state.table
+        if symbol not in table:
             raise ValueError("Invalid symbol")
-        return self._holdings[symbol].get_open_price()
+        return table.get_open_price(symbol)
 
     def get_total_value(self) -> Optional[float]:
         """Return the value of the whole portfolio as cash + holdings"""
-        value = self.get_holdings_value()
-        if value is not None:
-            return self._cash_available + value
-        else:
-            return None
+        return self._state.get_total_value()
 
     def get_holdings_value(self) -> Optional[float]:
         """Return the value of the holdings held in the portfolio"""
-        holdingsValue = 0.0
-        for holding in self._holdings.values():
-            value = holding.get_value()
-            if value is not None:
-                holdingsValue += value
-            else:
-                return None
-        return holdingsValue
+        return self._state.summary.holdings_value
 
     def get_portfolio_pl(self) -> Optional[float]:
         """
         Return the profit/loss in £ of the portfolio over the deposited cash
         """
-        value = self.get_total_value()
-        invested = self.get_cash_deposited()
-        if value is None or invested is None:
-            return None
-        return value - invested
+        return self._state.get_portfolio_pl()
 
     def get_portfolio_pl_perc(self) -> Optional[float]:
         """
         Return the profit/loss in % of the portfolio over deposited cash
         """
-        pl = self.get_portfolio_pl()
-        invested = self.get_cash_deposited()
-        if pl is None or invested is None or invested < 1:
-            return None
-        return (pl / invested) * 100
+        return self._state.get_portfolio_pl_perc()
 
     def get_open_positions_pl(self) -> Optional[float]:
         """
         Return the sum profit/loss in £ of the current open positions
         """
-        try:
-            total_pl = 0.0
-            for holding in self._holdings.values():
-                pl = holding.get_profit_loss()
-                if pl is None:
-                    return None
-                total_pl += pl
-            return total_pl
-        except Exception as e:
-            logging.error(e)
-            raise RuntimeError("Unable to compute holgings profit/loss")
+        return self._state.summary.open_positions_pl
 
     def get_open_positions_pl_perc(self) -> Optional[float]:
         """
         Return the sum profit/loss in % of the current open positions
         """
-        try:
-            costSum = 0.0
-            valueSum = 0.0
-            for holding in self._holdings.values():
-                cost = holding.get_cost()
-                value = holding.get_value()
-                if cost is None or value is None:
-                    return None
-                costSum += cost
-                valueSum += value
-            if costSum < 1:
-                return None
-            return ((valueSum - costSum) / costSum) * 100
-        except Exception as e:
-            logging.error(e)
-            raise RuntimeError("Unable to compute holdings profit/loss percentage")
+        return self._state.summary.open_positions_pl_perc
+
+    def get_state(self) -> PortfolioState:
+        """
+        Return the current state of the portfolio as an immutable snapshot.
+        Read all the values from the same snapshot to get a consistent view
+        """
+        return self._state
 
     def has_unsaved_changes(self) -> bool:
-        """Return True if the portfolio has unsaved changes, False othersise"""
-        return self._unsaved_changes
+        """Return True if the portfolio has unsaved changes, False othersise.
+        Changes are saved once the background save including them succeeds
+        """
+        return self._saved_changes != self._changes
+
+    def pop_save_error(self) -> Optional[str]:
+        """Return the error of the last background save that failed since the
+        last call, or None if there is none
+        """
+        error = self._save_error
+        self._save_error = None
+        return error
 
     def get_trade_history(self) -> List[Trade]:
-        """Return the trade history as a list"""
+        """
+        Return the loaded trade history as a list. The trades older than the
+        opening balance are included only once loaded by load_older_trades
+        """
         return self._db_handler.get_trades_list()
 
+    def has_older_trades(self) -> bool:
+        """Return True if the trades older than the opening balance are not loaded"""
+        return self._db_handler.get_opening_balance() is not None
+
+    def load_older_trades(self) -> None:
+        """
+        Load the trades older than the opening balance into the trade history.
+        It waits for the edits in progress so it should not run in the UI thread
+        """
+        with self._write_lock:
+            self._load_older_trades()
+
     def add_trade(self, new_trade: Trade) -> None:
         """Add a new trade into the Portfolio"""
-        current_list = self._db_handler.get_trades_list()
-        # Build the list of trades happened before and after the new trade to validate
-        # If trade date match with existing trade, the new trade is appended after
-        older_trades = [trade for trade in current_list if trade.date <= new_trade.date]
-        newer_trades = [trade for trade in current_list if trade.date > new_trade.date]
-        # Build the new trade list inserting the new trade
-        new_trade_list = older_trades + [new_trade] + newer_trades
-        self._validate_trade_list(new_trade_list)
-        self._db_handler.add_trade(new_trade)
-        self._load(self._db_handler.get_trades_list())
-        self._unsaved_changes = True
+        with self._write_lock:
+            self._load_trades_older_than(new_trade.date)
+            current_list = self._db_handler.get_trades_list()
+            if len(current_list) == 0 or new_trade.date >= current_list[-1].date:
+                # The new trade is the most recent one so it can be validated and
+                # applied on top of the current state without replaying the history
+                self._trade_is_allowed(new_trade, self._cash_available, self._holdings)
+                position = len(current_list)
+                # Build the new state before touching the database as applying the
+                # trade can still fail
+                try:
+                    state = self._apply_new_trade(new_trade)
+                except ValueError as e:
+                    raise TradeNotAllowedError(str(e), position) from e
+                self._db_handler.add_trade(new_trade)
+                if position > 0 and position % self._checkpoint_interval == 0:
+                    self._checkpoints.append(
+                        Checkpoint.create(
+                            position,
+                            self._cash_deposited,
+                            self._cash_available,
+                            self._holdings,
+                            self._lots,
+                        )
+                    )
+                self._append_trade(new_trade, *state)
+                self._append_balances(new_trade)
+                self._changes += 1
+                return
+            # Insert the new trade after any existing trade with the same date
+            position = self._db_handler.find_date_position(new_trade.date)
+            new_trade_list = _EditedTradeList(current_list, position, new_trade)
+            # Reject the trades not allowed before replaying the history
+            self._insert_balances([new_trade], new_trade_list)
+            # Build the new state replaying only the trades after the edited position
+            checkpoint = self._get_checkpoint(position)
+            try:
+                replay = self._load_from_trade_list(new_trade_list, checkpoint)
+            except Exception:
+                self._clear_balances()
+                raise
+            self._db_handler.add_trade(new_trade)
+            self._set_state(checkpoint, *replay)
+            self._changes += 1
+
+    def add_trades(self, new_trades: List[Trade]) -> None:
+        """
+        Add a list of trades into the Portfolio validating and loading the new
+        trade history at once. If any trade is not allowed none is added and the
+        raised error reports the first trade of the history that is not allowed
+        """
+        with self._write_lock:
+            if len(new_trades) == 0:
+                return
+            # New trades are merged after any existing trade with the same date
+            batch = sorted(new_trades, key=lambda t: t.date)
+            self._load_trades_older_than(batch[0].date)
+            current_list = self._db_handler.get_trades_list()
+            new_trade_list = list(
+                heapq.merge(current_list, batch, key=lambda t: t.date)
+            )
+            position = self._db_handler.find_date_position(batch[0].date)
+            checkpoint = self._get_checkpoint(position)
+            try:
+                # Reject the trades not allowed before replaying the history
+                self._insert_balances(batch, new_trade_list)
+                try:
+                    replay = self._load_from_trade_list(new_trade_list, checkpoint)
+                except Exception:
+                    self._clear_balances()
+                    raise
+            except TradeNotAllowedError as e:
+                trade = new_trade_list[e.position]
+                logging.warning(
+                    "Portfolio {}: trade {} not allowed".format(
+                        self._name, trade.to_string()
+                    )
+                )
+                raise TradeNotAllowedError(
+                    f"{e}: {trade.to_string()}", e.position
+                ) from e
+            self._db_handler.add_trades(batch)
+            self._set_state(checkpoint, *replay)
+            self._changes += 1
 
     def delete_trade(self, trade_id: str) -> None:
         """Remove a trade from the Portfolio"""
-        # Validate the trade list removing the trade
-        new_trade_list = [
-            t for t in self._db_handler.get_trades_list() if t.id != trade_id
-        ]
-        self._validate_trade_list(new_trade_list)
-        self._db_handler.delete_trade(trade_id)
-        self._load(self._db_handler.get_trades_list())
-        self._unsaved_changes = True
+        with self._write_lock:
+            position = self._db_handler.find_trade_position(trade_id)
+            if position is None:
+                # The trade can be older than the opening balance
+                self._load_older_trades()
+                position = self._db_handler.find_trade_position(trade_id)
+            current_list = self._db_handler.get_trades_list()
+            if position is None:
+                logging.error(
+                    "Portfolio {}: trade {} not found".format(self._name, trade_id)
+                )
+                raise RuntimeError("Unable to delete trade")
+            new_trade_list = _EditedTradeList(current_list, position)
+            # Reject the removal of a trade needed by later trades before
+            # replaying the history
+            self._remove_balances(position, new_trade_list)
+            # Build the new state replaying only the trades after the edited position
+            checkpoint = self._get_checkpoint(position)
+            try:
+                replay = self._load_from_trade_list(new_trade_list, checkpoint)
+            except Exception:
+                self._clear_balances()
+                raise
+            self._db_handler.delete_trade(trade_id)
+            self._set_state(checkpoint, *replay)
+            self._changes += 1
+
+    def get_state_as_of(self, date: datetime) -> PortfolioState:
+        """
+        Return the state of the portfolio after all the trades happened up to
+        and including the given date. Last prices of the holdings are not set
+        """
+        # The trade history and its checkpoints are read together as they are
+        # edited by other threads. The slice is a copy so it is replayed unlocked
+        with self._write_lock:
+            self._load_trades_older_than(date)
+            trades_list = self._db_handler.get_trades_list()
+            position = self._db_handler.find_date_position(date)
+            # Replay only the trades after the closest checkpoint before the date
+            checkpoint = self._get_checkpoint(position)
+            trades_until = trades_list[:position]
+        try:
+            cash_deposited, cash_available, holdings, _, _ = self._load_from_trade_list(
+                trades_until, checkpoint
+            )
+        except Exception as e:
+            logging.error(e)
+            raise RuntimeError(f"Unable to compute the portfolio state: {e}")
+        return PortfolioState.create(
+            Money.to_pounds(cash_deposited),
+            Money.to_pounds(cash_available),
+            holdings,
+            {},
+        )
 
-    def save_portfolio(self, filepath: Path) -> None:
-        """Save the portfolio at the given filepath"""
-        self._db_handler.write_data(filepath)
-        self._unsaved_changes = False
+    def save_portfolio(
+        self, filepath: Optional[Path] = None, overwrite: bool = False
+    ) -> None:
+        """Save the portfolio at the given filepath, or at its trading log if None,
+        in background. The changes are marked as saved once written, failures are
+        reported by pop_save_error.
+        Throws TradingLogConflictError if the trading log has changes made by
+        another process that could not be applied, unless overwrite is True
+        """
+        db_filepath = self._db_handler.get_db_filepath()
+        path = Path(filepath) if filepath is not None else db_filepath
+        # The snapshot of the trade history is taken between edits
+        with self._write_lock:
+            if overwrite:
+                self._db_handler.discard_external_changes()
+            opening = None
+            if path == db_filepath:
+                opening = self._get_opening_balance()
+            else:
+                # Exports write the whole trade history
+                self._load_older_trades()
+            changes = self._changes
+            self._db_handler.save_data(
+                path, lambda succeeded: self._on_saved(changes, succeeded), opening
+            )
+
+    def wait_for_saves(self) -> bool:
+        """Wait for the background saves to complete. Return True if succeeded"""
+        return self._db_handler.wait_for_saves()
 
     # PRIVATE API
 
+    def _on_saved(self, changes: int, succeeded: bool) -> None:
+        """
+        Record the result of the background save of the trade history taken
+        after the given number of edits
+        """
+        if succeeded:
+            self._saved_changes = max(self._saved_changes, changes)
+        else:
+            logging.error("Portfolio {}: unable to save".format(self._name))
+            self._save_error = Messages.ERROR_SAVE_FILE.value
+
+    def _publish_state(self) -> None:
+        """
+        Replace the snapshot read by the public API with a copy of the current state
+        """
+        with self._state_lock:
+            try:
+                self._state = PortfolioState.create(
+                    Money.to_pounds(self._cash_deposited),
+                    Money.to_pounds(self._cash_available),
+                    self._holdings,
+                    self._price_getter.get_last_data(),
+                )
+            except Exception as e:
+                logging.error(e)
+                raise RuntimeError("Unable to compute holdings profit/loss")
+
+    def _on_trading_log_changed(self) -> None:
+        """
+        Apply the trades added to or removed from the trading log file by another
+        process, replaying the trade history from the first changed position
+        """
+        with self._write_lock:
+            self._load_older_trades()
+            added, removed = self._db_handler.read_external_changes()
+            try:
+                self._apply_external_changes(added, removed)
+            except Exception:
+                # Keep the file as the only copy of the changes
+                self._db_handler.reject_external_changes()
+                raise
+            self._db_handler.accept_external_changes()
+
+    def _apply_external_changes(self, added: List[Trade], removed: List[str]) -> None:
+        """
+        Apply the trades added to and the ids of the trades removed from the
+        trading log by another process to the trade history and the state
+        """
+        current_list = self._db_handler.get_trades_list()
+        # Remove the first trades with the removed ids as delete_trade does
+        to_remove = Counter(removed)
+        removed_ids = []
+        kept_list = []
+        position = len(current_list)
+        for i, trade in enumerate(current_list):
+            if to_remove[trade.id] > 0:
+                to_remove[trade.id] -= 1
+                removed_ids.append(trade.id)
+                position = min(position, i)
+            else:
+                kept_list.append(trade)
+        batch = sorted(added, key=lambda t: t.date)
+        if len(batch) > 0:
+            position = min(position, self._db_handler.find_date_position(batch[0].date))
+        if len(batch) == 0 and len(removed_ids) == 0:
+            return
+        logging.info(
+            "Portfolio {}: {} trades added and {} removed by another process".format(
+                self._name, len(batch), len(removed_ids)
+            )
+        )
+        new_trade_list = list(heapq.merge(kept_list, batch, key=lambda t: t.date))
+        checkpoint = self._get_checkpoint(position)
+        replay = self._load_from_trade_list(new_trade_list, checkpoint)
+        for trade_id in removed_ids:
+            self._db_handler.delete_trade(trade_id)
+        if len(batch) > 0:
+            self._db_handler.add_trades(batch)
+        self._set_state(checkpoint, *replay)
+        self._clear_balances()
+
     def _clear(self) -> None:
         """
         Reset the Portfolio clearing all data
@@ -221,122 +503,536 @@ class Portfolio:
         self._cash_available = 0
         self._cash_deposited = 0
         self._holdings.clear()
+        self._lots.clear()
         self._price_getter.reset()
         logging.info("Portfolio {} cleared".format(self._name))
 
     def _load_from_trade_list(
-        self, trades: List[Trade]
-    ) -> Tuple[float, float, Dict[str, Holding]]:
+        self, trades: Sequence[Trade], checkpoint: Optional[Checkpoint] = None
+    ) -> Tuple[int, int, Dict[str, Holding], Dict[str, OpenLots], List[Checkpoint]]:
+        if self._replay_engine == ReplayEngines.NUMPY:
+            return self._load_from_trade_columns(trades, checkpoint)
         # Scan the trades list and build the portfolio in buffer variables
         # This allow us to validate each trade without changing the current state
-        cash_available = 0.0
-        cash_deposited = 0.0
+        # If a checkpoint is given the scan resumes from the state it holds
+        start = 0
+        cash_available = 0
+        cash_deposited = 0
         holdings: Dict[str, Holding] = {}
-        for trade in trades:
-            self._trade_is_allowed(trade, cash_available, holdings)
-            # Trade is valid so update buffers based on action type
-            if trade.action == Actions.DEPOSIT or trade.action == Actions.DIVIDEND:
-                cash_available += trade.quantity
-                if trade.action == Actions.DEPOSIT:
-                    cash_deposited += trade.quantity
-            elif trade.action == Actions.WITHDRAW:
-                cash_available -= trade.quantity
-                cash_deposited -= trade.quantity
-            elif trade.action == Actions.BUY:
-                if trade.symbol not in holdings:
-                    holdings[trade.symbol] = Holding(trade.symbol, int(trade.quantity))
-                else:
-                    holdings[trade.symbol].add_quantity(int(trade.quantity))
-                cost = (trade.price / 100) * trade.quantity
-                tax = (trade.sdr * cost) / 100
-                totalCost = cost + tax + trade.fee
-                cash_available -= totalCost
-            elif trade.action == Actions.SELL:
-                holdings[trade.symbol].add_quantity(int(-trade.quantity))  # negative
-                if holdings[trade.symbol].get_quantity() < 1:
-                    del holdings[trade.symbol]
-                profit = ((trade.price / 100) * trade.quantity) - trade.fee
-                cash_available += profit
-            elif trade.action == Actions.FEE:
-                cash_available -= trade.quantity
-        return cash_deposited, cash_available, holdings
+        lots: Dict[str, OpenLots] = {}
+        if checkpoint is not None:
+            start = checkpoint.position
+            cash_available = checkpoint.cash_available
+            cash_deposited = checkpoint.cash_deposited
+            holdings = checkpoint.get_holdings()
+            lots = checkpoint.get_lots()
+        checkpoints: List[Checkpoint] = []
+        for index in range(start, len(trades)):
+            if index > start and index % self._checkpoint_interval == 0:
+                checkpoints.append(
+                    Checkpoint.create(
+                        index, cash_deposited, cash_available, holdings, lots
+                    )
+                )
+            trade = trades[index]
+            try:
+                self._trade_is_allowed(trade, cash_available, holdings)
+                # Trade is valid so update buffers based on action type
+                cash_deposited, cash_available = self._apply_trade(
+                    trade, cash_deposited, cash_available, holdings, lots
+                )
+            except (RuntimeError, ValueError) as e:
+                raise TradeNotAllowedError(str(e), index) from e
+        # The open lots of each holding give its average open price
+        for symbol, holding in holdings.items():
+            holding.set_open_price(
+                self._compute_avg_open_price(lots[symbol], holding.get_quantity())
+            )
+        return cash_deposited, cash_available, holdings, lots, checkpoints
 
-    def _load(self, trades_list: List[Trade]) -> None:
+    def _load_from_trade_columns(
+        self, trades: Sequence[Trade], checkpoint: Optional[Checkpoint] = None
+    ) -> Tuple[int, int, Dict[str, Holding], Dict[str, OpenLots], List[Checkpoint]]:
         """
-        Load the portfolio from the database trade list
+        Replay the trade list as _load_from_trade_list does but using the
+        vectorized engine on the columnar view of the trades
         """
+        start = checkpoint.position if checkpoint is not None else 0
+        columns = TradeColumns.from_trades(trades[i] for i in range(start, len(trades)))
         try:
-            cash_deposited, cash_available, holdings = self._load_from_trade_list(
-                trades_list
+            replay = VectorizedReplay(self._checkpoint_interval).replay(
+                columns, checkpoint
+            )
+        except RuntimeError as e:
+            logging.warning("Portfolio {}: {}".format(self._name, e))
+            raise
+        _, _, holdings, lots, _ = replay
+        for symbol, holding in holdings.items():
+            holding.set_open_price(
+                self._compute_avg_open_price(lots[symbol], holding.get_quantity())
+            )
+        return replay
+
+    def _apply_trade(
+        self,
+        trade: Trade,
+        cash_deposited: int,
+        cash_available: int,
+        holdings: Dict[str, Holding],
+        lots: Dict[str, OpenLots],
+    ) -> Tuple[int, int]:
+        """
+        Apply the trade to the given state updating holdings and open lots in place
+        and return the new cash deposited and cash available
+        """
+        cash_available += Money.get_cash_delta(trade)
+        if trade.action == Actions.DEPOSIT:
+            cash_deposited += Money.from_pounds(trade.quantity)
+        elif trade.action == Actions.WITHDRAW:
+            cash_deposited -= Money.from_pounds(trade.quantity)
+        elif trade.action == Actions.BUY:
+            if trade.symbol not in holdings:
+                holdings[trade.symbol] = Holding(trade.symbol, int(trade.quantity))
+                lots[trade.symbol] = []
+            else:
+                holdings[trade.symbol].add_quantity(int(trade.quantity))
+            lots[trade.symbol].append((trade.price, int(trade.quantity)))
+        elif trade.action == Actions.SELL:
+            holdings[trade.symbol].add_quantity(int(-trade.quantity))  # negative
+            if holdings[trade.symbol].get_quantity() < 1:
+                del holdings[trade.symbol]
+                del lots[trade.symbol]
+            else:
+                self._drop_closed_lots(
+                    lots[trade.symbol], holdings[trade.symbol].get_quantity()
+                )
+        return cash_deposited, cash_available
+
+    def _apply_new_trade(
+        self, trade: Trade
+    ) -> Tuple[int, int, Dict[str, Holding], Dict[str, OpenLots]]:
+        """
+        Return the state of the portfolio after applying a validated trade, newer
+        than any other in the history, to the current one. The current state is
+        not modified: the holding and open lots of the trade symbol are copied
+        """
+        holdings = dict(self._holdings)
+        lots = dict(self._lots)
+        if trade.symbol in holdings:
+            holding = holdings[trade.symbol]
+            holdings[trade.symbol] = Holding(
+                trade.symbol, holding.get_quantity(), holding.get_open_price()
             )
+            lots[trade.symbol] = list(lots[trade.symbol])
+        cash_deposited, cash_available = self._apply_trade(
+            trade, self._cash_deposited, self._cash_available, holdings, lots
+        )
+        if trade.symbol in holdings:
+            holding = holdings[trade.symbol]
+            holding.set_open_price(
+                self._compute_avg_open_price(lots[trade.symbol], holding.get_quantity())
+            )
+        return cash_deposited, cash_available, holdings, lots
+
+    def _append_trade(
+        self,
+        trade: Trade,
+        cash_deposited: int,
+        cash_available: int,
+        holdings: Dict[str, Holding],
+        lots: Dict[str, OpenLots],
+    ) -> None:
+        """
+        Replace the current state of the portfolio with the one built applying
+        the given trade, newer than any other in the history
+        """
+        self._cash_deposited = cash_deposited
+        self._cash_available = cash_available
+        self._holdings = holdings
+        self._lots = lots
+        if trade.action == Actions.BUY or trade.action == Actions.SELL:
+            self._price_getter.set_symbol_list(sorted(self._holdings))
+        self._publish_state()
+        logging.info("Portfolio {} updated with new trade".format(self._name))
+
+    def _load(self, trades_list: List[Trade]) -> None:
+        """
+        Load the portfolio from the database trade list, replaying it from the
+        opening balance it starts from if the older trades are not loaded
+        """
+        self._clear_balances()
+        checkpoint = None
+        opening = self._db_handler.get_opening_balance()
+        if opening is not None:
+            # Positions are relative to the loaded trade history
+            checkpoint = opening.checkpoint._replace(position=0)
+        self._checkpoints = [] if checkpoint is None else [checkpoint]
+        # The state replayed from an unchanged trading log can be cached
+        cache_key = "replay_{}".format(self._checkpoint_interval)
+        replay = self._db_handler.get_cached_data(cache_key)
+        if replay is None:
+            try:
+                replay = self._load_from_trade_list(trades_list, checkpoint)
+            except Exception as e:
+                logging.error(e)
+                raise RuntimeError(f"Unable to load the portfolio: {e}")
+            self._db_handler.set_cached_data(cache_key, replay)
+        self._set_state(checkpoint, *replay)
+
+    def _load_trades_older_than(self, date: datetime) -> None:
+        """
+        Load the trades older than the opening balance the trade history starts
+        from if the given date is older
+        """
+        opening = self._db_handler.get_opening_balance()
+        if opening is not None and date < opening.date:
+            self._load_older_trades()
+
+    def _load_older_trades(self) -> None:
+        """
+        Load the trades older than the opening balance the trade history starts
+        from, if any, moving the checkpoints after them
+        """
+        opening = self._db_handler.get_opening_balance()
+        if opening is None:
+            return
+        count = self._db_handler.load_older_trades()
+        # The running balances start from the opening balance
+        self._clear_balances()
+        if count == opening.checkpoint.position:
+            self._checkpoints = [
+                c._replace(position=c.position + count) for c in self._checkpoints
+            ]
+            return
+        # The opening balance does not match the older trades so replay them all
+        logging.warning(
+            "Portfolio {}: opening balance not matching the trade history".format(
+                self._name
+            )
+        )
+        self._load(self._db_handler.get_trades_list())
+
+    def _get_opening_balance(self) -> Optional[OpeningBalance]:
+        """
+        Return the opening balance to store with the trade history, or None if
+        the trading log does not store one
+        """
+        date = self._db_handler.get_opening_date()
+        if date is None:
+            return None
+        trades_list = self._db_handler.get_trades_list()
+        position = self._db_handler.find_opening_position(date)
+        # Replay only the trades after the closest checkpoint before the date
+        checkpoint = self._get_checkpoint(position)
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.position
+            checkpoint = checkpoint._replace(position=0)
+        cash_deposited, cash_available, holdings, lots, _ = self._load_from_trade_list(
+            trades_list[start:position], checkpoint
+        )
+        # The position of the opening balance counts the trades not loaded
+        opening = self._db_handler.get_opening_balance()
+        if opening is not None:
+            position += opening.checkpoint.position
+        return OpeningBalance(
+            date,
+            Checkpoint.create(position, cash_deposited, cash_available, holdings, lots),
+        )
+
+    def _set_state(
+        self,
+        checkpoint: Optional[Checkpoint],
+        cash_deposited: int,
+        cash_available: int,
+        holdings: Dict[str, Holding],
+        lots: Dict[str, OpenLots],
+        checkpoints: List[Checkpoint],
+    ) -> None:
+        """
+        Replace the portfolio state with the one built replaying the trade history
+        from the given checkpoint
+        """
+        try:
             # All trades were valid so do the actual load of this portfolio
             self._clear()
             self._cash_available = cash_available
             self._cash_deposited = cash_deposited
             self._holdings = holdings
+            self._lots = lots
+            # Keep the checkpoints older than the one the replay started from
+            self._checkpoints = self._checkpoints_until(checkpoint) + checkpoints
             # Update symbol list of the worker thread that fetches prices
-            self._price_getter.set_symbol_list(self.get_holding_symbols())
-            # Compute the average open price of each holding
-            for symbol in self._holdings.keys():
-                self._holdings[symbol].set_open_price(
-                    self._compute_avg_holding_open_price(symbol, trades_list)
-                )
-            # If available set the last price of each holding
-            for symbol, price in self._price_getter.get_last_data().items():
-                self._holdings[symbol].set_last_price(price)
+            self._price_getter.set_symbol_list(sorted(self._holdings))
+            # Publish the new state setting the last price of each holding if available
+            self._publish_state()
             logging.info("Portfolio {} reloaded successfully".format(self._name))
         except Exception as e:
             logging.error(e)
             raise RuntimeError(f"Unable to load the portfolio: {e}")
 
-    def _compute_avg_holding_open_price(
-        self, symbol: str, trades_list: List[Trade]
-    ) -> float:
+    def _checkpoints_until(self, checkpoint: Optional[Checkpoint]) -> List[Checkpoint]:
+        """
+        Return the stored checkpoints up to and including the given one
+        """
+        if checkpoint is None:
+            return []
+        return [c for c in self._checkpoints if c.position <= checkpoint.position]
+
+    def _get_checkpoint(self, position: int) -> Optional[Checkpoint]:
+        """
+        Return the most recent checkpoint that is not affected by an edit of
+        the trade history at the given position
+        """
+        for checkpoint in reversed(self._checkpoints):
+            if checkpoint.position <= position:
+                return checkpoint
+        return None
+
+    def _clear_balances(self) -> None:
+        """
+        Drop the running balances so they are built again on the next edit of a
+        past trade. Building them costs more than replaying the trade history so
+        they are not built until needed
+        """
+        self._cash_balance = RunningBalance()
+        self._quantity_balances = {}
+        self._balances_built = False
+
+    def _ensure_balances(self) -> None:
         """
-        Return the average price paid to open the current positon of the requested stock.
-        Starting from the end of the history log, find the BUY transaction that led to
-        to have the current quantity, compute then the average price of these transactions
+        Build the running balances of cash and holdings quantity from the loaded
+        trade history and the opening balance it starts from, if cleared
+        """
+        if self._balances_built:
+            return
+        trades_list = self._db_handler.get_trades_list()
+        cash_available = 0
+        quantities: Dict[str, int] = {}
+        opening = self._db_handler.get_opening_balance()
+        if opening is not None:
+            cash_available = opening.checkpoint.cash_available
+            quantities = {s: q for s, q, _ in opening.checkpoint.holdings}
+        symbol_items: Dict[str, List[Tuple[datetime, int, Optional[float]]]] = {
+            symbol: [] for symbol in quantities
+        }
+        for trade in trades_list:
+            if trade.action == Actions.BUY or trade.action == Actions.SELL:
+                symbol_items.setdefault(trade.symbol, []).append(
+                    self._get_quantity_item(trade)
+                )
+        self._cash_balance = RunningBalance(
+            (self._get_cash_item(t) for t in trades_list), cash_available
+        )
+        self._quantity_balances = {
+            symbol: RunningBalance(items, quantities.get(symbol, 0))
+            for symbol, items in symbol_items.items()
+        }
+        self._balances_built = True
+
+    def _append_balances(self, trade: Trade) -> None:
+        """
+        Add the trade appended to the trade history to the running balances
+        """
+        if not self._balances_built:
+            return
+        self._cash_balance.insert(len(self._cash_balance), *self._get_cash_item(trade))
+        if trade.action == Actions.BUY or trade.action == Actions.SELL:
+            balance = self._quantity_balances.setdefault(trade.symbol, RunningBalance())
+            balance.insert(len(balance), *self._get_quantity_item(trade))
+
+    def _insert_balances(
+        self, batch: List[Trade], trades_list: Sequence[Trade]
+    ) -> None:
+        """
+        Add the date sorted trades to the running balances, after any trade with
+        the same date as in the given trade history that includes them.
+        Throws TradeNotAllowedError, leaving the balances unchanged, if any of
+        them or any later trade is not allowed as _trade_is_allowed does
+        """
+        self._ensure_balances()
+        inserted: List[Tuple[RunningBalance, int]] = []
+        cash_position = len(self._cash_balance)
+        symbol_positions: Dict[str, int] = {}
+        for trade in batch:
+            position = self._cash_balance.count_until(trade.date)
+            self._cash_balance.insert(position, *self._get_cash_item(trade))
+            inserted.append((self._cash_balance, position))
+            cash_position = min(cash_position, position)
+            if trade.action == Actions.BUY or trade.action == Actions.SELL:
+                balance = self._quantity_balances.setdefault(
+                    trade.symbol, RunningBalance()
+                )
+                position = balance.count_until(trade.date)
+                balance.insert(position, *self._get_quantity_item(trade))
+                inserted.append((balance, position))
+                symbol_positions.setdefault(trade.symbol, position)
+        try:
+            self._check_balances(trades_list, cash_position, symbol_positions)
+        except TradeNotAllowedError:
+            for balance, position in reversed(inserted):
+                balance.remove(position)
+            raise
+
+    def _remove_balances(self, position: int, trades_list: Sequence[Trade]) -> None:
+        """
+        Remove the trade at the given position of the trade history from the
+        running balances. Throws TradeNotAllowedError, leaving the balances
+        unchanged, if any later trade of the given trade history without it is
+        not allowed as _trade_is_allowed does
+        """
+        self._ensure_balances()
+        current_list = self._db_handler.get_trades_list()
+        trade = current_list[position]
+        symbol_positions: Dict[str, int] = {}
+        self._cash_balance.remove(position)
+        if trade.action == Actions.BUY or trade.action == Actions.SELL:
+            symbol_position = self._get_symbol_position(current_list, position)
+            self._quantity_balances[trade.symbol].remove(symbol_position)
+            symbol_positions[trade.symbol] = symbol_position
+        try:
+            self._check_balances(trades_list, position, symbol_positions)
+        except TradeNotAllowedError:
+            self._cash_balance.insert(position, *self._get_cash_item(trade))
+            for symbol, symbol_position in symbol_positions.items():
+                self._quantity_balances[symbol].insert(
+                    symbol_position, *self._get_quantity_item(trade)
+                )
+            raise
+
+    def _check_balances(
+        self,
+        trades_list: Sequence[Trade],
+        cash_position: int,
+        symbol_positions: Dict[str, int],
+    ) -> None:
+        """
+        Throws TradeNotAllowedError reporting the first trade of the given trade
+        history, from the given positions of the running balances onward, without
+        enough cash or holdings
+        """
+        failed: Optional[Tuple[int, Messages]] = None
+        position = self._cash_balance.find_negative_slack(cash_position)
+        if position is not None:
+            failed = (position, Messages.INSUF_FUNDING)
+        for symbol, symbol_position in symbol_positions.items():
+            balance = self._quantity_balances[symbol]
+            found = balance.find_negative_slack(symbol_position)
+            if found is None:
+                continue
+            position = self._get_history_position(trades_list, symbol, found)
+            if failed is None or position < failed[0]:
+                failed = (position, Messages.INSUF_HOLDINGS)
+        if failed is not None:
+            position, message = failed
+            logging.warning("Portfolio {}: {}".format(self._name, message.value))
+            raise TradeNotAllowedError(message.value, position)
+
+    def _get_symbol_position(self, trades_list: List[Trade], position: int) -> int:
+        """
+        Return the position in the running balance of its symbol of the trade at
+        the given position of the trade history
+        """
+        trade = trades_list[position]
+        symbol_position = self._quantity_balances[trade.symbol].count_before(trade.date)
+        # Count the trades of the same symbol happened at the same date
+        index = position - 1
+        while index >= 0 and trades_list[index].date == trade.date:
+            other = trades_list[index]
+            if other.symbol == trade.symbol and (
+                other.action == Actions.BUY or other.action == Actions.SELL
+            ):
+                symbol_position += 1
+            index -= 1
+        return symbol_position
+
+    def _get_history_position(
+        self, trades_list: Sequence[Trade], symbol: str, symbol_position: int
+    ) -> int:
+        """
+        Return the position in the given trade history of the trade at the given
+        position of the running balance of its symbol
+        """
+        balance = self._quantity_balances[symbol]
+        date = balance.get_key(symbol_position)
+        # Skip the trades of the same symbol happened at the same date before it
+        count = symbol_position - balance.count_before(date)
+        position = self._cash_balance.count_before(date)
+        while True:
+            trade = trades_list[position]
+            if trade.symbol == symbol and (
+                trade.action == Actions.BUY or trade.action == Actions.SELL
+            ):
+                if count == 0:
+                    return position
+                count -= 1
+            position += 1
+
+    def _get_cash_item(self, trade: Trade) -> Tuple[datetime, int, Optional[int]]:
+        """
+        Return the date of the trade, the change of the cash available it causes
+        and the cash that must be available before it as fixed point Money, None
+        if the trade does not spend cash
+        """
+        required = None
+        if trade.action == Actions.WITHDRAW or trade.action == Actions.FEE:
+            required = Money.from_pounds(trade.quantity)
+        elif trade.action == Actions.BUY:
+            required = Money.get_buy_total(trade)
+        return trade.date, Money.get_cash_delta(trade), required
+
+    def _get_quantity_item(self, trade: Trade) -> Tuple[datetime, int, Optional[float]]:
+        """
+        Return the date of the BUY or SELL trade, the change of the quantity held
+        of its symbol and the quantity that must be held before it, None for a BUY
+        """
+        if trade.action == Actions.BUY:
+            return trade.date, int(trade.quantity), None
+        return trade.date, int(-trade.quantity), trade.quantity
+
+    def _compute_avg_open_price(self, lots: OpenLots, quantity: int) -> float:
+        """
+        Return the average price paid to open a position of the given quantity.
+        Starting from the most recent of the open lots, find the BUY transactions
+        that led to have the current quantity and compute their average price
         """
         total_cost = 0.0
         count = 0
-        target = self.get_holding_quantity(symbol)
-        if target == 0:
-            raise ValueError("Market {} not in current holdings".format(symbol))
-        for trade in trades_list[::-1]:  # reverse order
-            if trade.symbol == symbol and trade.action == Actions.BUY:
-                target -= int(trade.quantity)
-                total_cost += trade.price * int(trade.quantity)
-                count += int(trade.quantity)
-                if target <= 0:
-                    break
+        target = quantity
+        for price, lot_quantity in reversed(lots):
+            target -= lot_quantity
+            total_cost += price * lot_quantity
+            count += lot_quantity
+            if target <= 0:
+                break
         avg = total_cost / count
         return round(avg, 4)
 
-    def _validate_trade_list(self, trade_list: List[Trade]) -> None:
+    def _drop_closed_lots(self, lots: OpenLots, quantity: int) -> None:
         """
-        Validate the trade list
+        Remove the oldest lots that are not needed anymore to compute the open
+        price of a position reduced to the given quantity
         """
-        # Verify that the new list is valid
-        deposited, available, holdings = self._load_from_trade_list(trade_list)
+        for index in range(len(lots) - 1, -1, -1):
+            quantity -= lots[index][1]
+            if quantity <= 0:
+                del lots[:index]
+                return
 
     def _trade_is_allowed(
-        self, new_trade: Trade, cash_available: float, holdings: Dict[str, Holding]
+        self, new_trade: Trade, cash_available: int, holdings: Dict[str, Holding]
     ) -> bool:
         """
         Throws RuntimeError is the trade is allowed basedo one the given quantities
         """
         if new_trade.action == Actions.WITHDRAW or new_trade.action == Actions.FEE:
-            if new_trade.quantity > cash_available:
+            if Money.from_pounds(new_trade.quantity) > cash_available:
                 logging.warning(
                     "Portfolio {}: {}".format(self._name, Messages.INSUF_FUNDING.value)
                 )
                 raise RuntimeError(Messages.INSUF_FUNDING.value)
         elif new_trade.action == Actions.BUY:
-            cost = (new_trade.price * new_trade.quantity) / 100  # in £
-            fee = new_trade.fee
-            tax = (new_trade.sdr * cost) / 100
-            totalCost = cost + fee + tax
-            if totalCost > cash_available:
+            if Money.get_buy_total(new_trade) > cash_available:
                 logging.warning(
                     "Portfolio {}: {}".format(self._name, Messages.INSUF_FUNDING.value)
                 )
@@ -354,18 +1050,16 @@ class Portfolio:
                 raise RuntimeError(Messages.INSUF_HOLDINGS.value)
         return True
 
-    def _create_id(self, seed: str) -> str:
-        """Create and return an unique id from the seed"""
-        seed += str(time.time())
-        return hashlib.sha1(seed.encode("utf-8")).hexdigest()
+    def _create_id(self) -> str:
+        """Create and return an unique id"""
+        return SESSION_ID_GENERATOR.next_id()
 
     # PRICE GETTER WORK THREAD
 
     def _on_new_price_data(self) -> None:
         priceDict = self._price_getter.get_last_data()
-        for symbol, price in priceDict.items():
-            if symbol in self._holdings:
-                self._holdings[symbol].set_last_price(price)
+        with self._state_lock:
+            self._state = self._state.with_last_prices(priceDict)
 
     def on_manual_refresh_live_data(self) -> None:
         logging.info("Portfolio {}: manual refresh of data".format(self._name))
@@ -382,3 +1076,42 @@ class Portfolio:
 
     def get_auto_refresh_enabled(self) -> bool:
         return self._price_getter.is_enabled()
+
+
+class _EditedTradeList(Sequence[Trade]):
+    """
+    Read only view of a trade list with a trade inserted at the given position,
+    or with the trade at the given position removed if none is given. It lets
+    the replay see an edit of the trade history without copying it
+    """
+
+    def __init__(
+        self, trades: List[Trade], position: int, inserted: Optional[Trade] = None
+    ) -> None:
+        self._trades = trades
+        self._position = position
+        self._inserted = inserted
+
+    def __len__(self) -> int:
+        return len(self._trades) + (1 if self._inserted is not None else -1)
+
+    @overload
+    def __getitem__(self, index: int) -> Trade:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Trade]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Trade, List[Trade]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0 or index >= len(self):
+            raise IndexError("Invalid trade index")
+        if index < self._position:
+            return self._trades[index]
+        if self._inserted is None:
+            return self._trades[index + 1]
+        if index == self._position:
+            return self._inserted
+        return self._trades[index - 1]
@@ -0,0 +1,73 @@
+from typing import Dict, List, NamedTuple, Optional
+
+from . import Holding, HoldingsTable, PortfolioSummary
+
+
+class PortfolioState(NamedTuple):
+    """Immutable snapshot of the cash and holdings of a portfolio.
+    The holdings of a snapshot are stored in a read only table that is never
+    modified after the snapshot is created, so it can be read from any thread
+    without locks
+    """
+
+    cash_deposited: float
+    cash_available: float
+    table: HoldingsTable
+    summary: PortfolioSummary
+
+    @staticmethod
+    def create(
+        cash_deposited: float,
+        cash_available: float,
+        holdings: Dict[str, Holding],
+        last_prices: Dict[str, float],
+    ) -> "PortfolioState":
+        """Create a snapshot copying the given holdings and setting their last price"""
+        table = HoldingsTable.create(holdings.values(), last_prices)
+        return PortfolioState(
+            cash_deposited, cash_available, table, table.get_summary()
+        )
+
+    def with_last_prices(self, last_prices: Dict[str, float]) -> "PortfolioState":
+        """Return a new snapshot with the last price of the holdings updated"""
+        table = self.table.with_last_prices(last_prices)
+        return PortfolioState(
+            self.cash_deposited, self.cash_available, table, table.get_summary()
+        )
+
+    @property
+    def holdings(self) -> Dict[str, Holding]:
+        """Return new Holding instances with the values of the holdings table"""
+        return {s: self.table.get_holding(s) for s in self.table.symbols}
+
+    def get_holding_list(self) -> List[Holding]:
+        """Return the holdings sorted alphabetically by symbol"""
+        return [self.table.get_holding(s) for s in self.table.symbols]
+
+    def get_holding_symbols(self) -> List[str]:
+        """Return the holding symbols sorted alphabetically"""
+        return list(self.table.symbols)
+
+    def get_total_value(self) -> Optional[float]:
+        """Return the value of the whole portfolio as cash + holdings"""
+        value = self.summary.holdings_value
+        if value is not None:
+            return self.cash_available + value
+        else:
+            return None
+
+    def get_portfolio_pl(self) -> Optional[float]:
+        """Return the profit/loss in £ of the portfolio over the deposited cash"""
+        value = self.get_total_value()
+        invested = self.cash_deposited
+        if value is None or invested is None:
+            return None
+        return value - invested
+
+    def get_portfolio_pl_perc(self) -> Optional[float]:
+        """Return the profit/loss in % of the portfolio over deposited cash"""
+        pl = self.get_portfolio_pl()
+        invested = self.cash_deposited
+        if pl is None or invested is None or invested < 1:
+            return None
+        return (pl / invested) * 100
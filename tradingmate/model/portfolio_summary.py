@@ -0,0 +1,11 @@
+from typing import NamedTuple, Optional
+
+
+class PortfolioSummary(NamedTuple):
+    """Aggregated values of the holdings of a portfolio. Each value is None if
+    it can't be computed for any of the holdings
+    """
+
+    holdings_value: Optional[float]
+    open_positions_pl: Optional[float]
+    open_positions_pl_perc: Optional[float]
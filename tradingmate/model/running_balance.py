@@ -0,0 +1,247 @@
+import math
+import random
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+
+class _Node:
+    """Element of the sequence stored as node of a treap"""
+
+    __slots__ = (
+        "key",
+        "value",
+        "required",
+        "priority",
+        "size",
+        "total",
+        "low",
+        "left",
+        "right",
+    )
+
+    def __init__(
+        self, key: datetime, value: float, required: Optional[float], priority: float
+    ) -> None:
+        self.key = key
+        self.value = value
+        self.required = required
+        self.priority = priority
+        # Number of elements, sum of the values and minimum slack of the
+        # subtree rooted in this node, relative to the balance before it
+        self.size = 1
+        self.total = value
+        self.low = -required if required is not None else math.inf
+        self.left: Optional[_Node] = None
+        self.right: Optional[_Node] = None
+
+    def update(self) -> None:
+        """Recompute the aggregated values of the subtree"""
+        size = 1
+        total: float = 0
+        low = math.inf
+        if self.left is not None:
+            size += self.left.size
+            total = self.left.total
+            low = self.left.low
+        if self.required is not None:
+            low = min(low, total - self.required)
+        total += self.value
+        if self.right is not None:
+            size += self.right.size
+            low = min(low, total + self.right.low)
+            total += self.right.total
+        self.size = size
+        self.total = total
+        self.low = low
+
+
+def _split(
+    node: Optional[_Node], count: int
+) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split the subtree in two subtrees with the first count elements and the rest"""
+    if node is None:
+        return None, None
+    left_size = node.left.size if node.left is not None else 0
+    if count <= left_size:
+        left, node.left = _split(node.left, count)
+        node.update()
+        return left, node
+    node.right, right = _split(node.right, count - left_size - 1)
+    node.update()
+    return node, right
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """Merge two subtrees appending the elements of the right one to the left one"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    right.left = _merge(left, right.left)
+    right.update()
+    return right
+
+
+class RunningBalance:
+    """
+    Sequence of values sorted by date that tracks the running balance, the initial
+    balance plus the values up to each element. An element can require a minimum
+    running balance before it, its slack is how much that balance exceeds the
+    requirement. Elements can be added or removed at any position and the first
+    element with a negative slack from any position onward is found in O(log n),
+    without scanning the sequence
+    """
+
+    _root: Optional[_Node]
+    _initial: float
+
+    def __init__(
+        self,
+        items: Iterable[Tuple[datetime, float, Optional[float]]] = (),
+        initial: float = 0,
+    ) -> None:
+        # Running balance before the first element
+        self._initial = initial
+        nodes = [_Node(key, value, required, 0.0) for key, value, required in items]
+        self._root = self._build(nodes, 0, len(nodes))
+        # Assign random priorities sorted by tree level to satisfy the heap property
+        priorities = sorted((random.random() for _ in nodes), reverse=True)
+        level = [self._root] if self._root is not None else []
+        index = 0
+        while level:
+            next_level: List[_Node] = []
+            for node in level:
+                node.priority = priorities[index]
+                index += 1
+                next_level.extend(n for n in (node.left, node.right) if n is not None)
+            level = next_level
+
+    def __len__(self) -> int:
+        return self._root.size if self._root is not None else 0
+
+    def insert(
+        self,
+        position: int,
+        key: datetime,
+        value: float,
+        required: Optional[float] = None,
+    ) -> None:
+        """Insert a new element at the given position, optionally requiring a
+        minimum running balance before it
+        """
+        left, right = _split(self._root, position)
+        node = _Node(key, value, required, random.random())
+        self._root = _merge(_merge(left, node), right)
+
+    def remove(self, position: int) -> float:
+        """Remove the element at the given position and return its value"""
+        if position < 0 or position >= len(self):
+            raise IndexError("Position out of range")
+        left, right = _split(self._root, position)
+        node, right = _split(right, 1)
+        self._root = _merge(left, right)
+        assert node is not None
+        return node.value
+
+    def get_balance(self, position: int) -> float:
+        """Return the running balance before the element at the given position"""
+        balance = self._initial
+        node = self._root
+        while node is not None and position > 0:
+            left_size = node.left.size if node.left is not None else 0
+            if position <= left_size:
+                node = node.left
+            else:
+                if node.left is not None:
+                    balance += node.left.total
+                balance += node.value
+                position -= left_size + 1
+                node = node.right
+        return balance
+
+    def get_key(self, position: int) -> datetime:
+        """Return the date of the element at the given position"""
+        if position < 0 or position >= len(self):
+            raise IndexError("Position out of range")
+        node = self._root
+        while node is not None:
+            left_size = node.left.size if node.left is not None else 0
+            if position < left_size:
+                node = node.left
+            elif position == left_size:
+                return node.key
+            else:
+                position -= left_size + 1
+                node = node.right
+        raise IndexError("Position out of range")
+
+    def find_negative_slack(self, position: int) -> Optional[int]:
+        """
+        Return the position of the first element from the given position onward
+        whose running balance before it is lower than the one it requires, or
+        None if all of them have enough balance
+        """
+        return self._find_negative_slack(self._root, position, self._initial)
+
+    def count_until(self, key: datetime) -> int:
+        """Return the number of elements with a date older or equal to key"""
+        return self._count(key, True)
+
+    def count_before(self, key: datetime) -> int:
+        """Return the number of elements with a date older than key"""
+        return self._count(key, False)
+
+    def _count(self, key: datetime, inclusive: bool) -> int:
+        count = 0
+        node = self._root
+        while node is not None:
+            if node.key < key or (inclusive and node.key == key):
+                count += (node.left.size if node.left is not None else 0) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def _find_negative_slack(
+        self, node: Optional[_Node], position: int, offset: float
+    ) -> Optional[int]:
+        """
+        Return the position in the subtree of the first element from the given
+        position onward with a negative slack, given the balance before the subtree
+        """
+        # Skip the subtrees where every element has enough balance
+        if node is None or offset + node.low >= 0:
+            return None
+        left_size = node.left.size if node.left is not None else 0
+        if position < left_size:
+            found = self._find_negative_slack(node.left, position, offset)
+            if found is not None:
+                return found
+        before = offset + (node.left.total if node.left is not None else 0)
+        if (
+            position <= left_size
+            and node.required is not None
+            and before < node.required
+        ):
+            return left_size
+        found = self._find_negative_slack(
+            node.right, max(position - left_size - 1, 0), before + node.value
+        )
+        if found is not None:
+            return left_size + 1 + found
+        return None
+
+    def _build(self, nodes: List[_Node], start: int, end: int) -> Optional[_Node]:
+        """Build a balanced tree from the given slice of nodes"""
+        if start >= end:
+            return None
+        middle = (start + end) // 2
+        node = nodes[middle]
+        node.left = self._build(nodes, start, middle)
+        node.right = self._build(nodes, middle + 1, end)
+        node.update()
+        return node
@@ -13,7 +13,7 @@ class StockPriceGetter(TaskThread):
     _price_update_callback: Callable[[], None]
     _stock_ifc: StocksInterface
     _interval: float
-    lastData: Dict[str, float] = {}
+    lastData: Dict[str, float]
     symbolList: List[str]
 
     def __init__(
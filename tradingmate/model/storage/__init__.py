@@ -0,0 +1,13 @@
+from .json_stream_reader import JsonStreamReader  # NOQA # isort:skip
+from .trading_log_storage import TradingLogStorage  # NOQA # isort:skip
+from .json_storage import JsonStorage  # NOQA # isort:skip
+from .journal_storage import JournalStorage  # NOQA # isort:skip
+from .sqlite_storage import SqliteStorage  # NOQA # isort:skip
+from .sharded_storage import ShardedStorage  # NOQA # isort:skip
+from .trading_log_cache import (  # NOQA # isort:skip
+    CacheEntry,
+    CacheKey,
+    TradingLogCache,
+)
+from .storage_factory import StorageFactory, StorageImpl  # NOQA # isort:skip
+from .save_worker import SaveCallback, SaveWorker  # NOQA # isort:skip
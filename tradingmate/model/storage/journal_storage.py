@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .. import Trade
+from . import JsonStorage
+from .json_storage import JournalEntry
+
+# Number of journal entries that triggers a compaction of the journal
+COMPACTION_THRESHOLD: int = 1000
+
+
+class JournalStorage(JsonStorage):
+    """Trading log stored in a json file plus a journal of the changes made after
+    the json file was written. Each added or deleted trade is appended to the
+    journal as one json line and the journal is periodically compacted into the
+    json file in background
+    """
+
+    cacheable = False
+    watchable = False
+    _compaction_threshold: int
+    _sequence: int
+    _compacted_sequence: int
+    _pending_entries: int
+    _lock: threading.Lock
+    _compaction: Optional[threading.Thread]
+
+    def __init__(
+        self, filepath: Path, compaction_threshold: int = COMPACTION_THRESHOLD
+    ) -> None:
+        super().__init__(filepath)
+        self._compaction_threshold = compaction_threshold
+        self._sequence = 0
+        self._compacted_sequence = 0
+        self._pending_entries = 0
+        self._lock = threading.Lock()
+        self._compaction = None
+
+    def read(self) -> Tuple[str, List[Trade]]:
+        logging.info("JournalStorage - reading data from {}".format(self._filepath))
+        members, trades = self._read_file()
+        # Replay the journal entries written after the json file
+        compacted = members.get("journal_sequence", 0)
+        self._sequence = compacted
+        self._compacted_sequence = compacted
+        self._pending_entries = 0
+        entries = [e for e in self._read_journal() if e["sequence"] > compacted]
+        for entry in entries:
+            if "add" in entry:
+                trades.append(Trade.from_dict(entry["add"]))
+            elif "delete" in entry:
+                self._delete_first(trades, entry["delete"])
+            self._sequence = entry["sequence"]
+            self._pending_entries += 1
+        # Drop any incomplete entry left by a crash so new entries can be appended
+        if self._journal_filepath.exists():
+            self._replace_file(
+                self._journal_filepath, "".join(json.dumps(e) + "\n" for e in entries)
+            )
+        return members["name"], trades
+
+    def write(self, name: str, trades: List[Trade]) -> bool:
+        return self.write_snapshot(name, trades, self.get_version())
+
+    def get_version(self) -> int:
+        """Return the sequence number of the last journal entry"""
+        with self._lock:
+            return self._sequence
+
+    def write_snapshot(self, name: str, trades: List[Trade], version: int) -> bool:
+        # Changes are already stored in the journal so the save only starts
+        # a compaction if there is anything to compact. The snapshot includes
+        # exactly the journal entries up to its version
+        if self._pending_entries > 0:
+            self._start_compaction(name, trades, version)
+        return True
+
+    def on_trade_added(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        self._append([{"add": trade.to_dict()}], name, trades)
+
+    def on_trades_added(
+        self, added: List[Trade], name: str, trades: List[Trade]
+    ) -> None:
+        # The trade history already includes the whole batch so it can be
+        # compacted only once all the batch entries are in the journal
+        self._append([{"add": t.to_dict()} for t in added], name, trades)
+
+    def on_trade_deleted(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        self._append([{"delete": trade.id}], name, trades)
+
+    def close(self) -> None:
+        self.wait_for_compaction()
+        # Compact the pending entries so that the trading log is complete
+        # without the journal, as when read with the journal disabled
+        if self._pending_entries > 0:
+            name, trades = self.read()
+            self._compact(name, trades, self._sequence)
+
+    def wait_for_compaction(self) -> None:
+        """Wait for the background compaction of the journal, if running"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _append(
+        self, entries: List[JournalEntry], name: str, trades: List[Trade]
+    ) -> None:
+        """Append the entries of the changes that led to the given trade history
+        to the journal making sure they reach the disk
+        """
+        with self._lock:
+            sequence = self._sequence
+            for entry in entries:
+                sequence += 1
+                entry["sequence"] = sequence
+            with self._journal_filepath.open(mode="a") as f:
+                size = f.tell()
+                try:
+                    f.write("".join(json.dumps(e) + "\n" for e in entries))
+                    f.flush()
+                    os.fsync(f.fileno())
+                except Exception:
+                    # Drop what may have been written of the failed entries
+                    f.truncate(size)
+                    raise
+            self._sequence = sequence
+            self._pending_entries += len(entries)
+        if self._pending_entries >= self._compaction_threshold:
+            self._start_compaction(name, trades, sequence)
+
+    def _start_compaction(self, name: str, trades: List[Trade], sequence: int) -> None:
+        """Compact the journal into the snapshot of the trade history that
+        includes the journal entries up to the given sequence number, in a
+        background thread if not already running
+        """
+        # Called by both the editing and the saving threads so only one of
+        # them can start the compaction
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            # An older snapshot would drop the changes compacted after it
+            if sequence <= self._compacted_sequence:
+                return
+            snapshot = list(trades)
+            self._compaction = threading.Thread(
+                target=self._compact, args=(name, snapshot, sequence), daemon=True
+            )
+            self._compaction.start()
+
+    def _compact(self, name: str, trades: List[Trade], sequence: int) -> None:
+        """Write the json file including the journal entries up to the given
+        sequence number and then drop those entries from the journal
+        """
+        logging.info("JournalStorage - compacting {}".format(self._journal_filepath))
+        try:
+            json_obj = self._to_json(name, trades)
+            json_obj["journal_sequence"] = sequence
+            temp_filepath = self._write_temp_file(
+                self._filepath, json.dumps(json_obj, indent=4, separators=(",", ": "))
+            )
+            with self._lock:
+                # A newer snapshot may have been compacted while this one was written
+                if sequence <= self._compacted_sequence:
+                    temp_filepath.unlink()
+                    return
+                os.replace(str(temp_filepath), str(self._filepath))
+                # Keep the entries appended while the json file was written
+                entries = [e for e in self._read_journal() if e["sequence"] > sequence]
+                self._replace_file(
+                    self._journal_filepath,
+                    "".join(json.dumps(e) + "\n" for e in entries),
+                )
+                self._pending_entries = len(entries)
+                self._compacted_sequence = sequence
+        except Exception as e:
+            logging.error(
+                "JournalStorage - unable to compact the journal: {}".format(e)
+            )
+
+    def _delete_first(self, trades: List[Trade], trade_id: str) -> None:
+        """Remove the oldest trade with the given id from the trade list"""
+        matches = [i for i, t in enumerate(trades) if t.id == trade_id]
+        if len(matches) == 0:
+            logging.warning("JournalStorage - trade {} not found".format(trade_id))
+            return
+        del trades[min(matches, key=lambda i: trades[i].date)]
+
+    def _replace_file(self, filepath: Path, content: str) -> None:
+        """Atomically replace the content of the file"""
+        temp_filepath = self._write_temp_file(filepath, content)
+        os.replace(str(temp_filepath), str(filepath))
+
+    def _write_temp_file(self, filepath: Path, content: str) -> Path:
+        """Write the content to a new temporary file next to the given one making
+        sure it reaches the disk and return its path
+        """
+        temp_filepath = Path("{}.{}.tmp".format(filepath, threading.get_ident()))
+        with temp_filepath.open(mode="w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        return temp_filepath
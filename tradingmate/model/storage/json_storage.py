@@ -0,0 +1,93 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from ...utils import Utils
+from .. import Trade, TradeDecoder
+from . import JsonStreamReader, TradingLogStorage
+
+# Suffix appended to the trading log filepath to get the journal filepath
+JOURNAL_SUFFIX: str = ".journal"
+
+JournalEntry = Dict[str, Any]
+
+
+class JsonStorage(TradingLogStorage):
+    """Trading log stored in a single json file, optionally compressed"""
+
+    cacheable = True
+    watchable = True
+    _compact_json: bool
+    _journal_filepath: Path
+
+    def __init__(self, filepath: Path, compact: bool = False) -> None:
+        super().__init__(filepath)
+        self._compact_json = compact
+        self._journal_filepath = Path(str(filepath) + JOURNAL_SUFFIX)
+
+    def get_journal_filepath(self) -> Path:
+        """Return the path of the journal of the trading log changes"""
+        return self._journal_filepath
+
+    def read(self) -> Tuple[str, List[Trade]]:
+        logging.info("JsonStorage - reading data from {}".format(self._filepath))
+        members, trades = self._read_file()
+        # Trades journaled but not compacted would be lost by the next write
+        compacted = members.get("journal_sequence", 0)
+        if any(e["sequence"] > compacted for e in self._read_journal()):
+            logging.error(
+                "JsonStorage - {} has changes in {} not yet compacted, enable "
+                "trading_log_journal to load them".format(
+                    self._filepath, self._journal_filepath
+                )
+            )
+            raise RuntimeError("Unable to read {}".format(self._filepath))
+        return members["name"], trades
+
+    def _read_file(self) -> Tuple[Dict[str, Any], List[Trade]]:
+        """
+        Stream the json file building each trade as soon as it is decoded.
+        Return the other members of the json object and the trades
+        """
+        trades: List[Trade] = []
+        decoder = TradeDecoder()
+        try:
+            with Utils.open_file(self._filepath, "r") as f:
+                members = JsonStreamReader(f).read_object(
+                    "trades", lambda item: trades.append(decoder.decode(item))
+                )
+        except Exception as e:
+            logging.error("Unable to load JSON file {}".format(e))
+            raise RuntimeError("Unable to read {}".format(self._filepath))
+        return members, trades
+
+    def _read_journal(self) -> List[JournalEntry]:
+        """Return the entries of the journal skipping any incomplete line"""
+        if not self._journal_filepath.exists():
+            return []
+        entries = []
+        with self._journal_filepath.open(mode="r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logging.warning(
+                        "{} - skipping invalid entry in {}".format(
+                            type(self).__name__, self._journal_filepath
+                        )
+                    )
+        return entries
+
+    def write(self, name: str, trades: List[Trade]) -> bool:
+        logging.info("JsonStorage - writing data to {}".format(self._filepath))
+        return Utils.write_json_file(
+            self._filepath, self._to_json(name, trades), self._compact_json
+        )
+
+    def _to_json(self, name: str, trades: List[Trade]) -> Any:
+        """Return the json object of the trading log"""
+        return {
+            "name": name,
+            "trades": [t.to_dict() for t in trades],
+        }
@@ -0,0 +1,141 @@
+import json
+from typing import IO, Any, Callable, Dict
+
+# Number of characters read from the file at once
+CHUNK_SIZE: int = 64 * 1024
+# Characters that can continue a json number
+NUMBER_CHARS: str = "0123456789.eE+-"
+
+
+class JsonStreamReader:
+    """Incremental reader of a json object containing a large array. The
+    elements of the array are decoded one at a time from the file so the
+    whole document is never held in memory
+    """
+
+    _file: IO[str]
+    _chunk_size: int
+    _decoder: json.JSONDecoder
+    _buffer: str
+    _pos: int
+    _eof: bool
+
+    def __init__(self, file: IO[str], chunk_size: int = CHUNK_SIZE) -> None:
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def read_object(
+        self, array_key: str, on_item: Callable[[Any], None]
+    ) -> Dict[str, Any]:
+        """
+        Read the json object calling on_item for each element of the array
+        stored with the given key and return the other members of the object
+        """
+        members: Dict[str, Any] = {}
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            self._expect_end()
+            return members
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise ValueError("Invalid json object key")
+            self._expect(":")
+            if key == array_key and self._peek() == "[":
+                self._read_array(on_item)
+            else:
+                members[key] = self._decode()
+            if self._next_separator("}"):
+                self._expect_end()
+                return members
+
+    def _read_array(self, on_item: Callable[[Any], None]) -> None:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            on_item(self._decode())
+            if self._next_separator("]"):
+                return
+
+    def _next_separator(self, closing: str) -> bool:
+        """Consume a comma or the closing character returning True for the latter"""
+        char = self._peek()
+        self._pos += 1
+        if char == closing:
+            return True
+        if char != ",":
+            raise ValueError("Expected ',' or '{}'".format(closing))
+        return False
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise ValueError("Expected '{}'".format(char))
+        self._pos += 1
+
+    def _expect_end(self) -> None:
+        """Throws ValueError if anything but whitespace follows the json document"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                raise ValueError("Extra data after the json document")
+            if not self._fill():
+                return
+
+    def _peek(self) -> str:
+        """Return the next non whitespace character"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of json document")
+
+    def _decode(self) -> Any:
+        """Decode the next json value reading more data until it is complete"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                if self._is_complete(value, end):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def _is_complete(self, value: Any, end: int) -> bool:
+        """
+        Return True if the value decoded up to the end position can not
+        continue in the next chunk of the file
+        """
+        if self._eof:
+            return True
+        if end == len(self._buffer):
+            return False
+        # A number is complete only if followed by a delimiter
+        if isinstance(value, (int, float)):
+            return self._buffer[end] not in NUMBER_CHARS
+        return True
+
+    def _fill(self) -> bool:
+        """Read the next chunk of the file dropping the data already decoded"""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if len(chunk) == 0:
+            self._eof = True
+            return False
+        start = self._pos
+        self._buffer = self._buffer[start:] + chunk
+        self._pos = 0
+        return True
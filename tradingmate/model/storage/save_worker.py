@@ -0,0 +1,107 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Function writing a snapshot of a trading log, returning True if succeeded
+SaveRequest = Callable[[], bool]
+# Function called with the result of a save once written
+SaveCallback = Callable[[bool], None]
+
+
+class SaveWorker:
+    """Background thread writing snapshots of the trading logs. Save requests
+    of a trading log submitted while a previous one is waiting are coalesced,
+    so only the latest snapshot is written
+    """
+
+    _condition: threading.Condition
+    _pending: Dict[Path, Tuple[SaveRequest, List[SaveCallback]]]
+    _thread: Optional[threading.Thread]
+    _busy: bool
+    _succeeded: bool
+    _stopped: bool
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._thread = None
+        self._busy = False
+        self._succeeded = True
+        self._stopped = False
+
+    def submit(
+        self,
+        filepath: Path,
+        save: SaveRequest,
+        on_saved: Optional[SaveCallback] = None,
+    ) -> None:
+        """
+        Queue the save of the trading log at filepath returning immediately.
+        If given, on_saved is called from the worker thread with the result of
+        the write that includes the snapshot
+        """
+        with self._condition:
+            # Replace the snapshot of the same trading log still waiting, the
+            # newer one is written in its place so it gets its callbacks too
+            _, callbacks = self._pending.pop(filepath, (save, []))
+            if on_saved is not None:
+                callbacks.append(on_saved)
+            self._pending[filepath] = (save, callbacks)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self) -> bool:
+        """
+        Wait until all the queued saves are written. Return True if they all
+        succeeded since the last flush, False otherwise
+        """
+        with self._condition:
+            while self._pending or self._busy:
+                self._condition.wait()
+            succeeded = self._succeeded
+            self._succeeded = True
+            return succeeded
+
+    def stop(self) -> bool:
+        """Write the queued saves and stop the thread. Return the result of flush"""
+        succeeded = self.flush()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._condition:
+            self._thread = None
+            self._stopped = False
+        return succeeded
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                filepath = next(iter(self._pending))
+                save, callbacks = self._pending.pop(filepath)
+                self._busy = True
+            try:
+                succeeded = save()
+            except Exception as e:
+                logging.error("Unable to save {}: {}".format(filepath, e))
+                succeeded = False
+            for on_saved in callbacks:
+                try:
+                    on_saved(succeeded)
+                except Exception as e:
+                    logging.error(
+                        "Unable to notify the save of {}: {}".format(filepath, e)
+                    )
+            with self._condition:
+                self._busy = False
+                self._succeeded = self._succeeded and succeeded
+                self._condition.notify_all()
@@ -0,0 +1,189 @@
+import logging
+import operator
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ...utils import Utils
+from .. import OpeningBalance, Trade
+from . import JsonStorage, TradingLogStorage
+
+# Suffix of the manifest file of a sharded trading log
+MANIFEST_SUFFIX: str = ".manifest.json"
+
+
+class ShardedStorage(TradingLogStorage):
+    """Trading log split in one json file per year listed in a manifest file.
+    Saving the trading log writes only the shards of the years whose trades
+    changed since they were last read or written. The manifest stores the
+    opening balance of the most recent year when saved, so reading the trading
+    log reads only the shards from that year and the older shards are read when
+    needed
+    """
+
+    stores_opening_balance = True
+    _loaded: bool
+    _name: str
+    _shards: Dict[int, str]
+    _written: Dict[int, List[Trade]]
+    _opening: Optional[OpeningBalance]
+    # First year of the shards read, None if all of them have been read
+    _first_year: Optional[int]
+
+    def __init__(self, filepath: Path) -> None:
+        super().__init__(filepath)
+        self._loaded = False
+        self._name = ""
+        self._shards = {}
+        self._written = {}
+        self._opening = None
+        self._first_year = None
+
+    def read(self) -> Tuple[str, List[Trade]]:
+        logging.info("ShardedStorage - reading data from {}".format(self._filepath))
+        self._read_manifest()
+        self._written = {}
+        self._first_year = None
+        return self._name, self._read_shards(list(self._shards))
+
+    def read_recent(self) -> Optional[Tuple[str, List[Trade], OpeningBalance]]:
+        self._read_manifest()
+        opening = self._opening
+        if opening is None:
+            return None
+        logging.info(
+            "ShardedStorage - reading data from {} since {}".format(
+                self._filepath, opening.date.year
+            )
+        )
+        self._written = {}
+        self._first_year = opening.date.year
+        years = [y for y in self._shards if y >= self._first_year]
+        return self._name, self._read_shards(years), opening
+
+    def read_older(self, date: datetime, symbol: Optional[str] = None) -> List[Trade]:
+        if symbol is not None:
+            years = [y for y in self._shards if y < date.year]
+            return [t for t in self._read_shards(years, False) if t.symbol == symbol]
+        if self._first_year is None:
+            return []
+        trades = self._read_shards([y for y in self._shards if y < self._first_year])
+        self._first_year = None
+        return trades
+
+    def write(self, name: str, trades: List[Trade]) -> bool:
+        logging.info("ShardedStorage - writing data to {}".format(self._filepath))
+        years: Dict[int, List[Trade]] = {}
+        for trade in trades:
+            years.setdefault(trade.date.year, []).append(trade)
+        if not all(self._is_read(y) for y in years):
+            logging.error(
+                "ShardedStorage - {} has older shards not read".format(self._filepath)
+            )
+            return False
+        # The shards not read are kept as they are
+        shards = {y: f for y, f in self._shards.items() if not self._is_read(y)}
+        shards.update({y: self._shards.get(y, self._get_shard_name(y)) for y in years})
+        changed = [
+            y
+            for y in sorted(years)
+            if not self._is_unchanged(y, years[y]) or name != self._name
+        ]
+        removed = [y for y in self._shards if y not in shards]
+        opening = self._opening
+        if opening is not None and any(
+            y < opening.date.year for y in changed + removed
+        ):
+            # The manifest drops the opening balance before the older shards change
+            opening = None
+            if not self._write_manifest(self._name, self._shards, None):
+                return False
+            self._opening = None
+        for year in changed:
+            storage = JsonStorage(Path(self._filepath.parent, shards[year]))
+            if not storage.write(name, years[year]):
+                return False
+            self._written[year] = years[year]
+        self._written = {y: self._written[y] for y in years}
+        # The manifest is written last so it never lists a missing shard
+        if not self._loaded or name != self._name or shards != self._shards:
+            if not self._write_manifest(name, shards, opening):
+                return False
+        self._loaded = True
+        self._name = name
+        self._shards = shards
+        return True
+
+    def write_opening_balance(self, opening: OpeningBalance, version: int) -> bool:
+        # The opening balance is written with the snapshot it has been computed
+        # from, and it can start only at the first trade of a shard
+        if opening.date != datetime(opening.date.year, 1, 1):
+            return False
+        if opening == self._opening:
+            return True
+        if not self._write_manifest(self._name, self._shards, opening):
+            return False
+        self._opening = opening
+        return True
+
+    def _read_manifest(self) -> None:
+        """Read the name, the shards and the opening balance of the manifest"""
+        manifest = Utils.load_json_file(self._filepath)
+        if manifest is None:
+            raise RuntimeError("Unable to read {}".format(self._filepath))
+        self._name = manifest["name"]
+        self._shards = {int(year): f for year, f in manifest["shards"].items()}
+        self._opening = None
+        if "opening" in manifest:
+            try:
+                self._opening = OpeningBalance.from_dict(manifest["opening"])
+            except ValueError as e:
+                logging.warning(
+                    "ShardedStorage - ignoring the opening balance of {}: {}".format(
+                        self._filepath, e
+                    )
+                )
+        self._loaded = True
+
+    def _write_manifest(
+        self, name: str, shards: Dict[int, str], opening: Optional[OpeningBalance]
+    ) -> bool:
+        """Write the manifest listing the given shards and opening balance"""
+        manifest = {
+            "name": name,
+            "shards": {str(y): shards[y] for y in sorted(shards)},
+        }
+        if opening is not None:
+            manifest["opening"] = opening.to_dict()
+        return Utils.write_json_file(self._filepath, manifest)
+
+    def _read_shards(self, years: List[int], record: bool = True) -> List[Trade]:
+        """Return the trades of the shards of the given years, recording them as
+        the ones read from each shard if record is True
+        """
+        trades: List[Trade] = []
+        for year in sorted(years):
+            _, shard_trades = self._get_shard_storage(year).read()
+            trades.extend(shard_trades)
+            if record:
+                self._written[year] = shard_trades
+        return trades
+
+    def _is_read(self, year: int) -> bool:
+        """Return True if the shard of the given year has been read or written"""
+        return self._first_year is None or year >= self._first_year
+
+    def _is_unchanged(self, year: int, trades: List[Trade]) -> bool:
+        """Return True if the trades of the year are the ones last read or written"""
+        written = self._written.get(year)
+        if written is None or len(written) != len(trades):
+            return False
+        return all(map(operator.is_, written, trades))
+
+    def _get_shard_storage(self, year: int) -> JsonStorage:
+        return JsonStorage(Path(self._filepath.parent, self._shards[year]))
+
+    def _get_shard_name(self, year: int) -> str:
+        """Return the file name of the shard of the given year"""
+        stem = self._filepath.name[: -len(MANIFEST_SUFFIX)]
+        return "{}.{}.json".format(stem, year)
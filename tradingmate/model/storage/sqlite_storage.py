@@ -0,0 +1,286 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...utils import Actions
+from .. import OpeningBalance, Trade, TradeDecoder
+from . import TradingLogStorage
+
+# Format of the dates stored in the database, sortable as strings
+SQLITE_DATETIME_FORMAT: str = "%Y-%m-%d %H:%M"
+
+SCHEMA: List[str] = [
+    "CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS trades ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, date TEXT NOT NULL, "
+    "action TEXT NOT NULL, quantity REAL NOT NULL, symbol TEXT NOT NULL, "
+    "price REAL NOT NULL, fee REAL NOT NULL, stamp_duty REAL NOT NULL, "
+    "notes TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS trades_date ON trades (date, seq)",
+    "CREATE INDEX IF NOT EXISTS trades_symbol ON trades (symbol, date, seq)",
+    "CREATE INDEX IF NOT EXISTS trades_id ON trades (id, date, seq)",
+]
+
+COLUMNS: str = "id, date, action, quantity, symbol, price, fee, stamp_duty, notes"
+
+INSERT: str = f"INSERT INTO trades ({COLUMNS}) VALUES (?,?,?,?,?,?,?,?,?)"
+
+Row = Tuple[Any, ...]
+
+
+class SqliteStorage(TradingLogStorage):
+    """Trading log stored in a SQLite database. Each added or deleted trade, or
+    batch of added trades, is stored in its own transaction so saving the
+    trading log does not rewrite it. Trades are indexed by date, symbol and id so
+    they can be queried by date range and by symbol. When saved the database
+    stores the opening balance of the trades of the most recent year, so it is
+    loaded reading only them and the older ones are read when needed
+    """
+
+    stores_opening_balance = True
+    _db: Optional[sqlite3.Connection]
+    _lock: threading.Lock
+    _in_sync: bool
+    _version: int
+    _opening_date: Optional[datetime]
+    # Version and date of the changes notified after the last opening balance write
+    _changes: List[Tuple[int, datetime]]
+
+    def __init__(self, filepath: Path) -> None:
+        super().__init__(filepath)
+        self._db = None
+        self._lock = threading.Lock()
+        self._in_sync = False
+        self._version = 0
+        self._opening_date = None
+        self._changes = []
+
+    def read(self) -> Tuple[str, List[Trade]]:
+        logging.info("SqliteStorage - reading data from {}".format(self._filepath))
+        with self._lock:
+            name = self._read_name()
+            trades = self._query("ORDER BY date, seq", ())
+            self._in_sync = True
+        return name, trades
+
+    def read_recent(self) -> Optional[Tuple[str, List[Trade], OpeningBalance]]:
+        with self._lock:
+            name = self._read_name()
+            db = self._get_db()
+            row = db.execute("SELECT value FROM info WHERE key = 'opening'").fetchone()
+            if row is None:
+                return None
+            try:
+                opening = OpeningBalance.from_dict(json.loads(row[0]))
+            except ValueError as e:
+                logging.warning(
+                    "SqliteStorage - ignoring the opening balance of {}: {}".format(
+                        self._filepath, e
+                    )
+                )
+                return None
+            logging.info(
+                "SqliteStorage - reading data from {} since {}".format(
+                    self._filepath, opening.date
+                )
+            )
+            self._opening_date = opening.date
+            self._in_sync = True
+        return name, self.get_trades_between(opening.date, None), opening
+
+    def read_older(self, date: datetime, symbol: Optional[str] = None) -> List[Trade]:
+        if symbol is not None:
+            return self.get_symbol_trades(symbol, None, date)
+        return self.get_trades_between(None, date)
+
+    def get_trades_between(
+        self, start: Optional[datetime], end: Optional[datetime]
+    ) -> List[Trade]:
+        """Return the date sorted trades from the start date, included, to the end
+        date, excluded. Any of the two can be None to not limit the range
+        """
+        clause, args = self._get_range(start, end)
+        with self._lock:
+            return self._query(f"WHERE 1 {clause} ORDER BY date, seq", args)
+
+    def get_symbol_trades(
+        self,
+        symbol: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Trade]:
+        """Return the date sorted trades of the given symbol in the optional range
+        of dates from start, included, to end, excluded
+        """
+        clause, args = self._get_range(start, end)
+        with self._lock:
+            return self._query(
+                f"WHERE symbol = ? {clause} ORDER BY date, seq", (symbol,) + args
+            )
+
+    def write(self, name: str, trades: List[Trade]) -> bool:
+        with self._lock:
+            # Once read the database is kept up to date trade by trade
+            if self._in_sync:
+                return True
+            logging.info("SqliteStorage - writing data to {}".format(self._filepath))
+            try:
+                db = self._get_db()
+                with db:
+                    db.execute("DELETE FROM trades")
+                    db.execute("DELETE FROM info WHERE key = 'opening'")
+                    db.execute(
+                        "INSERT OR REPLACE INTO info (key, value) VALUES ('name', ?)",
+                        (name,),
+                    )
+                    db.executemany(INSERT, (self._to_row(t) for t in trades))
+                self._opening_date = None
+                return True
+            except Exception as e:
+                logging.error("Unable to write SQLite database: {}".format(e))
+            return False
+
+    def get_version(self) -> int:
+        return self._version
+
+    def write_opening_balance(self, opening: OpeningBalance, version: int) -> bool:
+        with self._lock:
+            # The opening balance does not include the older changes made later
+            stale = any(v > version and d < opening.date for v, d in self._changes)
+            self._changes = [(v, d) for v, d in self._changes if v > version]
+            if stale:
+                return False
+            try:
+                db = self._get_db()
+                with db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO info (key, value) "
+                        "VALUES ('opening', ?)",
+                        (json.dumps(opening.to_dict()),),
+                    )
+                self._opening_date = opening.date
+                return True
+            except Exception as e:
+                logging.error("Unable to write SQLite database: {}".format(e))
+            return False
+
+    def on_trade_added(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        self.on_trades_added([trade], name, trades)
+
+    def on_trades_added(
+        self, added: List[Trade], name: str, trades: List[Trade]
+    ) -> None:
+        with self._lock:
+            db = self._get_db()
+            with db:
+                db.executemany(INSERT, (self._to_row(t) for t in added))
+                self._on_changed(db, min(t.date for t in added))
+
+    def on_trade_deleted(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        with self._lock:
+            db = self._get_db()
+            with db:
+                # Delete the same trade removed from the trade history, the older
+                # trades with the id may not be loaded
+                db.execute(
+                    "DELETE FROM trades WHERE seq = (SELECT seq FROM trades "
+                    "WHERE id = ? AND date = ? ORDER BY seq LIMIT 1)",
+                    (trade.id, trade.date.strftime(SQLITE_DATETIME_FORMAT)),
+                )
+                self._on_changed(db, trade.date)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _on_changed(self, db: sqlite3.Connection, date: datetime) -> None:
+        """Record a change of the trades of the given date, in the transaction
+        that stores it, removing the opening balance that does not include it
+        """
+        self._version += 1
+        self._changes.append((self._version, date))
+        if self._opening_date is not None and date < self._opening_date:
+            db.execute("DELETE FROM info WHERE key = 'opening'")
+            self._opening_date = None
+
+    def _get_db(self) -> sqlite3.Connection:
+        """Return the connection to the database, opened and its schema created
+        if missing on first use. It is shared with the background saves
+        """
+        if self._db is None:
+            db = sqlite3.connect(str(self._filepath), check_same_thread=False)
+            with db:
+                for statement in SCHEMA:
+                    db.execute(statement)
+            self._db = db
+        return self._db
+
+    def _read_name(self) -> str:
+        """Return the name of the trading log stored in the database"""
+        if self._db is None and not self._filepath.exists():
+            raise RuntimeError("Unable to read {}".format(self._filepath))
+        row = self._get_db().execute("SELECT value FROM info WHERE key = 'name'")
+        name = row.fetchone()
+        if name is None:
+            raise RuntimeError("Unable to read {}".format(self._filepath))
+        return name[0]
+
+    def _get_range(
+        self, start: Optional[datetime], end: Optional[datetime]
+    ) -> Tuple[str, Row]:
+        """Return the clause and arguments selecting the trades between the dates"""
+        clause = ""
+        args: Row = ()
+        if start is not None:
+            clause += " AND date >= ?"
+            args += (start.strftime(SQLITE_DATETIME_FORMAT),)
+        if end is not None:
+            clause += " AND date < ?"
+            args += (end.strftime(SQLITE_DATETIME_FORMAT),)
+        return clause, args
+
+    def _query(self, clause: str, args: Row) -> List[Trade]:
+        """Return the trades selected by the given clause"""
+        rows = self._get_db().execute(f"SELECT {COLUMNS} FROM trades {clause}", args)
+        decoder = TradeDecoder()
+        actions = dict(Actions.__members__)
+        dates: Dict[str, datetime] = {}
+        trades = []
+        for row in rows:
+            date = dates.get(row[1])
+            if date is None:
+                # Stored in the ISO format parsed natively by datetime
+                date = dates[row[1]] = datetime.fromisoformat(row[1])
+            trades.append(
+                decoder.create(
+                    date,
+                    actions[row[2]],
+                    row[3],
+                    row[4],
+                    row[5],
+                    row[6],
+                    row[7],
+                    row[8],
+                    row[0],
+                )
+            )
+        return trades
+
+    def _to_row(self, trade: Trade) -> Row:
+        return (
+            trade.id,
+            trade.date.strftime(SQLITE_DATETIME_FORMAT),
+            trade.action.name,
+            trade.quantity,
+            trade.symbol,
+            trade.price,
+            trade.fee,
+            trade.sdr,
+            trade.notes,
+        )
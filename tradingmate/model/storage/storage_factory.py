@@ -0,0 +1,44 @@
+from pathlib import Path
+from typing import List, Union
+
+from ...utils import Utils
+from .. import ConfigurationManager
+from . import JournalStorage, JsonStorage, ShardedStorage, SqliteStorage
+from .sharded_storage import MANIFEST_SUFFIX
+
+StorageImpl = Union[JsonStorage, JournalStorage, SqliteStorage, ShardedStorage]
+
+# File extensions of the trading logs stored in a SQLite database
+SQLITE_SUFFIXES: List[str] = [".db", ".sqlite", ".sqlite3"]
+
+
+class StorageFactory:
+    """Factory for the storage of the trading logs"""
+
+    _config: ConfigurationManager
+
+    def __init__(self, config: ConfigurationManager):
+        self._config = config
+
+    def make(self, filepath: Path) -> StorageImpl:
+        """Return the storage of the trading log at the given filepath"""
+        if filepath.suffix in SQLITE_SUFFIXES:
+            return SqliteStorage(filepath)
+        if filepath.name.endswith(MANIFEST_SUFFIX):
+            return ShardedStorage(filepath)
+        if Utils.is_compressed_file(filepath):
+            return JsonStorage(filepath, self._config.get_trading_log_compact())
+        return JsonStorage(filepath)
+
+    def make_from_configuration(self, filepath: Path) -> StorageImpl:
+        """Return the configured storage of the trading log at the given filepath"""
+        # SQLite databases store each change in its own transaction already
+        if self._config.get_trading_log_journal() and self._is_json(filepath):
+            return JournalStorage(filepath)
+        return self.make(filepath)
+
+    def _is_json(self, filepath: Path) -> bool:
+        """Return True if the filepath is a single json file trading log"""
+        return filepath.suffix == ".json" and not filepath.name.endswith(
+            MANIFEST_SUFFIX
+        )
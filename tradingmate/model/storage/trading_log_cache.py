@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from ...utils import Utils
+from .. import Trade
+
+# Folder where the parsed trading logs are cached
+CACHE_DIR: Path = Path(Utils.get_install_path(), "cache")
+# Version of the cache format, increase it when the cached objects change
+CACHE_VERSION: int = 3
+
+# Path, size, modification time and content hash of a file
+FileFingerprint = Tuple[str, int, int, str]
+# Cache version and fingerprints of the files of a trading log
+CacheKey = Tuple[int, List[FileFingerprint]]
+
+
+class CacheEntry(NamedTuple):
+    """Parsed trading log and any data computed from it"""
+
+    name: str
+    trades: List[Trade]
+    data: Dict[str, Any]
+
+
+class TradingLogCache:
+    """On disk cache of the parsed trading logs in binary form. Entries are keyed
+    by the fingerprint of the files of the trading log so any change of the
+    files invalidates them
+    """
+
+    _cache_dir: Path
+
+    def __init__(self, cache_dir: Path = CACHE_DIR) -> None:
+        self._cache_dir = cache_dir
+
+    def load(
+        self, files: List[Path], key: Optional[CacheKey] = None
+    ) -> Optional[CacheEntry]:
+        """Return the cached entry of the trading log stored in the given files
+        or None if it is not cached or the files have changed. If given, the key
+        is used in place of the current one of the files
+        """
+        cache_path = self._get_cache_path(files)
+        if not cache_path.exists():
+            return None
+        try:
+            with cache_path.open(mode="rb") as f:
+                stored_key, entry = pickle.load(f)
+            if stored_key != (key if key is not None else self.get_key(files)):
+                logging.info("TradingLogCache - {} has changed".format(files[0]))
+                return None
+            logging.info("TradingLogCache - {} loaded from cache".format(files[0]))
+            return entry
+        except Exception as e:
+            logging.warning("TradingLogCache - unable to load cache: {}".format(e))
+        return None
+
+    def store(
+        self, files: List[Path], entry: CacheEntry, key: Optional[CacheKey] = None
+    ) -> None:
+        """Store the entry of the trading log stored in the given files. The key
+        should be taken before reading the files, so that an entry read from
+        files changed meanwhile is never stored under their new key
+        """
+        if key is None:
+            key = self.get_key(files)
+        cache_path = self._get_cache_path(files)
+        temp_path = Path(str(cache_path) + ".tmp")
+        try:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            with temp_path.open(mode="wb") as f:
+                pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(str(temp_path), str(cache_path))
+        except Exception as e:
+            logging.warning("TradingLogCache - unable to store cache: {}".format(e))
+
+    def _get_cache_path(self, files: List[Path]) -> Path:
+        digest = hashlib.sha1(str(files[0].resolve()).encode("utf-8")).hexdigest()
+        return Path(self._cache_dir, "{}.pickle".format(digest))
+
+    def get_key(self, files: List[Path]) -> CacheKey:
+        """Return the key of the current content of the given files"""
+        return CACHE_VERSION, [self._get_fingerprint(f) for f in files if f.exists()]
+
+    def _get_fingerprint(self, filepath: Path) -> FileFingerprint:
+        stat = filepath.stat()
+        digest = hashlib.sha1()
+        with filepath.open(mode="rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return (
+            str(filepath.resolve()),
+            stat.st_size,
+            stat.st_mtime_ns,
+            digest.hexdigest(),
+        )
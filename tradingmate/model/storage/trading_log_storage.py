@@ -0,0 +1,86 @@
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .. import OpeningBalance, Trade
+
+
+class TradingLogStorage:
+    """Interface of the persistent storage of a trading log"""
+
+    # True if the trading log can be loaded from the cache instead of reading it
+    cacheable: bool = False
+    # True if the trading log file changes only when the trading log is written
+    watchable: bool = False
+    # True if the trading log can store an opening balance and be read from it
+    stores_opening_balance: bool = False
+    _filepath: Path
+
+    def __init__(self, filepath: Path) -> None:
+        self._filepath = filepath
+
+    def get_filepath(self) -> Path:
+        """Return the path of the trading log"""
+        return self._filepath
+
+    def read(self) -> Tuple[str, List[Trade]]:
+        """Return the name and the trades of the trading log"""
+        raise NotImplementedError("Must implement read")
+
+    def read_recent(self) -> Optional[Tuple[str, List[Trade], OpeningBalance]]:
+        """Return the name of the trading log, its stored opening balance and the
+        trades not older than its date. Return None if there is no opening balance,
+        then the whole trading log is read with read
+        """
+        return None
+
+    def read_older(self, date: datetime, symbol: Optional[str] = None) -> List[Trade]:
+        """Return the trades older than the given date, only the ones of the given
+        symbol if set. Once read without a symbol the whole trading log is loaded
+        """
+        raise NotImplementedError("Must implement read_older")
+
+    def write(self, name: str, trades: List[Trade]) -> bool:
+        """Store the whole trading log. Return True if succeed, False otherwise"""
+        raise NotImplementedError("Must implement write")
+
+    def get_version(self) -> int:
+        """Return the version of the trading log changes notified to the storage.
+        A snapshot of the trade history taken at the same time is written with
+        write_snapshot
+        """
+        return 0
+
+    def write_snapshot(self, name: str, trades: List[Trade], version: int) -> bool:
+        """Store a snapshot of the trade history taken when the storage had the
+        given version. Return True if succeed, False otherwise
+        """
+        return self.write(name, trades)
+
+    def write_opening_balance(self, opening: OpeningBalance, version: int) -> bool:
+        """Store the opening balance computed from the snapshot of the trade history
+        taken when the storage had the given version. It is not stored if older
+        trades changed since then. Return True if stored, False otherwise
+        """
+        return False
+
+    def on_trade_added(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        """Notify that the trade has been added to the given trade history"""
+        pass
+
+    def on_trades_added(
+        self, added: List[Trade], name: str, trades: List[Trade]
+    ) -> None:
+        """Notify that the trades have been added at once to the given trade
+        history, that already includes all of them
+        """
+        for trade in added:
+            self.on_trade_added(trade, name, trades)
+
+    def on_trade_deleted(self, trade: Trade, name: str, trades: List[Trade]) -> None:
+        """Notify that the trade has been removed from the given trade history"""
+        pass
+
+    def close(self) -> None:
+        """Complete any pending operation on the storage"""
+        pass
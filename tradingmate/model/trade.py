@@ -1,10 +1,9 @@
-import hashlib
 import logging
-import time
+import sys
 from datetime import datetime
 from typing import Dict, Union
 
-from ..utils import Actions
+from ..utils import SESSION_ID_GENERATOR, Actions
 
 TIME_FORMAT: str = "%H:%M"
 DATE_FORMAT: str = "%d/%m/%Y"
@@ -16,6 +15,19 @@ TradeDict = Dict[str, Union[str, float, int]]
 class Trade:
     """Represent a trade action"""
 
+    __slots__ = (
+        "date",
+        "action",
+        "quantity",
+        "symbol",
+        "price",
+        "fee",
+        "sdr",
+        "notes",
+        "total",
+        "id",
+    )
+
     date: datetime
     action: Actions
     quantity: float
@@ -45,12 +57,13 @@ class Trade:
                 raise ValueError("Invalid action")
             self.action = action
             self.quantity = quantity
-            self.symbol = symbol
+            # Symbols repeat across the trades so they share a single string
+            self.symbol = sys.intern(symbol)
             self.price = price
             self.fee = fee
             self.sdr = sdr
             self.notes = notes
-            self.total = self.__compute_total()
+            self.total = Trade.compute_total(action, quantity, price, fee, sdr)
             self.id = self._create_id() if id is None else id
         except Exception as e:
             logging.error(e)
@@ -103,23 +116,27 @@ class Trade:
             str(item["id"]),
         )
 
-    def __compute_total(self) -> float:
-        if self.action in (
+    @staticmethod
+    def compute_total(
+        action: Actions, quantity: float, price: float, fee: float, sdr: float
+    ) -> float:
+        """Return the cash amount moved by a trade with the given fields"""
+        if action in (
             Actions.DEPOSIT,
             Actions.WITHDRAW,
             Actions.DIVIDEND,
             Actions.FEE,
         ):
-            return self.quantity
-        elif self.action == Actions.BUY:
-            cost = (self.price / 100) * self.quantity
-            total = cost + self.fee + ((cost * self.sdr) / 100)
+            return quantity
+        elif action == Actions.BUY:
+            cost = (price / 100) * quantity
+            total = cost + fee + ((cost * sdr) / 100)
             return total * -1
-        elif self.action == Actions.SELL:
-            cost = (self.price / 100) * self.quantity
-            total = cost + self.fee + ((cost * self.sdr) / 100)
+        elif action == Actions.SELL:
+            cost = (price / 100) * quantity
+            total = cost + fee + ((cost * sdr) / 100)
             return total
         return 0.0
 
     def _create_id(self) -> str:
-        return hashlib.sha1(str(time.time()).encode("utf-8")).hexdigest()
+        return SESSION_ID_GENERATOR.next_id()
@@ -0,0 +1,67 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from . import Trade
+
+
+class TradeColumns:
+    """Columnar view of a list of trades storing each field in a NumPy array.
+    Symbols are stored as indexes of the ``symbols`` list
+    """
+
+    action: np.ndarray
+    quantity: np.ndarray
+    price: np.ndarray
+    fee: np.ndarray
+    sdr: np.ndarray
+    symbol: np.ndarray
+    symbols: List[str]
+
+    def __init__(
+        self,
+        action: np.ndarray,
+        quantity: np.ndarray,
+        price: np.ndarray,
+        fee: np.ndarray,
+        sdr: np.ndarray,
+        symbol: np.ndarray,
+        symbols: List[str],
+    ) -> None:
+        self.action = action
+        self.quantity = quantity
+        self.price = price
+        self.fee = fee
+        self.sdr = sdr
+        self.symbol = symbol
+        self.symbols = symbols
+
+    def __len__(self) -> int:
+        return len(self.action)
+
+    @staticmethod
+    def from_trades(trades: Iterable[Trade]) -> "TradeColumns":
+        """Build the columnar view of the given trades"""
+        symbol_ids: Dict[str, int] = {}
+        action: List[int] = []
+        quantity: List[float] = []
+        price: List[float] = []
+        fee: List[float] = []
+        sdr: List[float] = []
+        symbol: List[int] = []
+        for trade in trades:
+            action.append(trade.action.value)
+            quantity.append(trade.quantity)
+            price.append(trade.price)
+            fee.append(trade.fee)
+            sdr.append(trade.sdr)
+            symbol.append(symbol_ids.setdefault(trade.symbol, len(symbol_ids)))
+        return TradeColumns(
+            np.array(action, dtype=np.int8),
+            np.array(quantity, dtype=np.float64),
+            np.array(price, dtype=np.float64),
+            np.array(fee, dtype=np.float64),
+            np.array(sdr, dtype=np.float64),
+            np.array(symbol, dtype=np.int32),
+            list(symbol_ids),
+        )
@@ -0,0 +1,86 @@
+import sys
+from datetime import datetime
+from typing import Dict
+
+from ..utils import Actions
+from . import DATETIME_FORMAT, Trade, TradeDict
+
+
+class TradeDecoder:
+    """Decoder of the trades read from the trading logs. It produces the same
+    trades of Trade.from_dict parsing the dates in the dd/mm/YYYY HH:MM format
+    with the native ISO parser instead of strptime, reusing the dates already
+    parsed and skipping the checks of the Trade constructor on fields that are
+    known to be valid
+    """
+
+    _dates: Dict[str, datetime]
+    _actions: Dict[str, Actions]
+
+    def __init__(self) -> None:
+        self._dates = {}
+        self._actions = dict(Actions.__members__)
+
+    def decode(self, item: TradeDict) -> Trade:
+        """Return the trade of the given dictionary"""
+        try:
+            date = str(item["date"])
+            action = self._actions[str(item["action"])]
+            quantity = float(item["quantity"])
+            price = float(item["price"])
+            fee = float(item["fee"])
+            sdr = float(item["stamp_duty"])
+            symbol = str(item["symbol"])
+            notes = str(item["notes"])
+            id = str(item["id"])
+        except KeyError:
+            raise ValueError("item not well formatted")
+        return self.create(
+            self._parse_date(date), action, quantity, symbol, price, fee, sdr, notes, id
+        )
+
+    def create(
+        self,
+        date: datetime,
+        action: Actions,
+        quantity: float,
+        symbol: str,
+        price: float,
+        fee: float,
+        sdr: float,
+        notes: str,
+        id: str,
+    ) -> Trade:
+        """Return the trade of the given fields, that are known to be valid"""
+        trade = object.__new__(Trade)
+        trade.date = date
+        trade.action = action
+        trade.quantity = quantity
+        trade.symbol = sys.intern(symbol)
+        trade.price = price
+        trade.fee = fee
+        trade.sdr = sdr
+        trade.notes = notes
+        trade.total = Trade.compute_total(action, quantity, price, fee, sdr)
+        trade.id = id
+        return trade
+
+    def _parse_date(self, date: str) -> datetime:
+        """Return the datetime of the string formatted as DATETIME_FORMAT"""
+        value = self._dates.get(date)
+        if value is None:
+            value = self._parse_new_date(date)
+            self._dates[date] = value
+        return value
+
+    def _parse_new_date(self, date: str) -> datetime:
+        if len(date) == 16 and date[2] + date[5] + date[10] + date[13] == "// :":
+            # Reorder the fields in the ISO format parsed natively by datetime
+            try:
+                return datetime.fromisoformat(
+                    date[6:10] + "-" + date[3:5] + "-" + date[0:2] + "T" + date[11:16]
+                )
+            except ValueError:
+                pass
+        # Let strptime parse or reject any other format
+        return datetime.strptime(date, DATETIME_FORMAT)
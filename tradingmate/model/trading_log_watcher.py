@@ -0,0 +1,37 @@
+import logging
+from typing import Callable
+
+from ..utils import TaskThread
+from . import DatabaseHandler
+
+
+class TradingLogWatcher(TaskThread):
+    """Worker thread that periodically checks if the trading log file has been
+    modified by another process. The check compares only the file size and
+    modification time so it is cheap enough to run every few seconds
+    """
+
+    _db_handler: DatabaseHandler
+    _change_callback: Callable[[], None]
+
+    def __init__(
+        self,
+        db_handler: DatabaseHandler,
+        interval: float,
+        change_callback: Callable[[], None],
+    ) -> None:
+        super(TradingLogWatcher, self).__init__()
+        self._db_handler = db_handler
+        self._change_callback = change_callback  # type: ignore
+        self.setInterval(interval)
+
+    def task(self) -> None:
+        try:
+            if self._db_handler.has_external_changes():
+                self._change_callback()  # type: ignore
+        except Exception as e:
+            logging.error(
+                "TradingLogWatcher - Unable to apply changes of {}: {}".format(
+                    self._db_handler.get_db_filepath(), e
+                )
+            )
@@ -0,0 +1,252 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils import Actions, Messages, TradeNotAllowedError
+from . import (
+    UNITS_PER_PENNY,
+    UNITS_PER_POUND,
+    Checkpoint,
+    Holding,
+    OpenLots,
+    TradeColumns,
+)
+
+# Trades of a symbol as (positions, quantity held after, quantity held before)
+SymbolTrades = Tuple[np.ndarray, np.ndarray, np.ndarray]
+# Holdings as stored in a Checkpoint
+HoldingsSnapshot = Tuple[Tuple[str, int, Tuple[Tuple[float, int], ...]], ...]
+
+
+class VectorizedReplay:
+    """
+    Replay engine that builds the portfolio state from the columnar view of the
+    trade history using cumulative sums and group-by reductions on NumPy arrays
+    instead of a loop over the trades
+    """
+
+    _checkpoint_interval: int
+
+    def __init__(self, checkpoint_interval: int) -> None:
+        self._checkpoint_interval = checkpoint_interval
+
+    def replay(
+        self, columns: TradeColumns, checkpoint: Optional[Checkpoint] = None
+    ) -> Tuple[int, int, Dict[str, Holding], Dict[str, OpenLots], List[Checkpoint]]:
+        """
+        Replay the trades starting from the checkpoint state, if given, and return
+        cash deposited and cash available as fixed point Money, holdings, open lots
+        and the new checkpoints.
+        The columns must contain the trades from the checkpoint position onward.
+        Throws RuntimeError if any trade is not allowed
+        """
+        start = 0
+        initial_cash = 0
+        initial_deposit = 0
+        initial_holdings: Dict[str, Tuple[int, OpenLots]] = {}
+        if checkpoint is not None:
+            start = checkpoint.position
+            initial_cash = checkpoint.cash_available
+            initial_deposit = checkpoint.cash_deposited
+            initial_holdings = {s: (q, list(l)) for s, q, l in checkpoint.holdings}
+        action = columns.action
+        quantity = columns.quantity
+        is_buy = action == Actions.BUY.value
+        is_sell = action == Actions.SELL.value
+        is_deposit = action == Actions.DEPOSIT.value
+        is_withdraw = action == Actions.WITHDRAW.value
+        is_spend = is_withdraw | (action == Actions.FEE.value)
+        # Fixed point Money amounts of each trade rounded as Money does
+        amount = _to_money(quantity * UNITS_PER_POUND)
+        fee = _to_money(columns.fee * UNITS_PER_POUND)
+        cost = _to_money(_to_money(columns.price * UNITS_PER_PENNY) * quantity)
+        buy_total = cost + fee + _to_money(cost * columns.sdr / 100)
+        # Change of cash available and cash deposited of each trade
+        cash_delta = amount.copy()
+        cash_delta[is_spend] = -amount[is_spend]
+        cash_delta[is_buy] = -buy_total[is_buy]
+        cash_delta[is_sell] = (cost - fee)[is_sell]
+        deposit_delta = np.zeros(len(columns), dtype=np.int64)
+        deposit_delta[is_deposit] = amount[is_deposit]
+        deposit_delta[is_withdraw] = -amount[is_withdraw]
+        # Running balances before each trade and after the last one
+        cash = np.cumsum(np.concatenate(([initial_cash], cash_delta)))
+        deposited = np.cumsum(np.concatenate(([initial_deposit], deposit_delta)))
+        # Funds required by each trade computed as in the trade validation
+        required = np.full(len(columns), np.iinfo(np.int64).min)
+        required[is_spend] = amount[is_spend]
+        required[is_buy] = buy_total[is_buy]
+        # Group the BUY and SELL trades by symbol preserving their order
+        int_quantity = np.trunc(quantity).astype(np.int64)
+        rows = np.flatnonzero(is_buy | is_sell)
+        rows = rows[np.argsort(columns.symbol[rows], kind="stable")]
+        symbol = columns.symbol[rows]
+        delta = np.where(is_buy[rows], int_quantity[rows], -int_quantity[rows])
+        starts = np.flatnonzero(np.r_[True, symbol[1:] != symbol[:-1]])[: len(rows)]
+        ends = np.r_[starts[1:], len(rows)].astype(np.int64)
+        # Running quantity held of each symbol after each of its trades
+        initial = np.array(
+            [initial_holdings.get(s, (0, []))[0] for s in columns.symbols],
+            dtype=np.int64,
+        )
+        running = np.cumsum(delta)
+        offset = np.repeat(running[starts] - delta[starts], ends - starts)
+        held = running - offset + initial[symbol]
+        held_before = held - delta
+        # Prefix checks of cash and holdings
+        self._raise_first_failure(
+            start,
+            np.flatnonzero(required > cash[:-1]),
+            rows[is_sell[rows] & (quantity[rows] > held_before)],
+            rows[is_buy[rows] & (held_before == 0) & (delta < 1)],
+        )
+        state = _HoldingsHistory(
+            columns,
+            is_buy,
+            int_quantity,
+            initial_holdings,
+            {
+                columns.symbols[symbol[s]]: (rows[s:e], held[s:e], held_before[s:e])
+                for s, e in zip(starts, ends)
+            },
+        )
+        # Holdings of all the checkpoints and after the last trade built at once
+        interval = self._checkpoint_interval
+        first = (start // interval + 1) * interval
+        positions = list(range(first, start + len(columns), interval))
+        snapshots = state.get_holdings([p - start for p in positions] + [len(columns)])
+        checkpoints = [
+            Checkpoint(
+                position,
+                int(deposited[position - start]),
+                int(cash[position - start]),
+                snapshot,
+            )
+            for position, snapshot in zip(positions, snapshots)
+        ]
+        holdings = {s: Holding(s, q) for s, q, _ in snapshots[-1]}
+        lots = {s: list(l) for s, _, l in snapshots[-1]}
+        return int(deposited[-1]), int(cash[-1]), holdings, lots, checkpoints
+
+    def _raise_first_failure(
+        self,
+        start: int,
+        funding: np.ndarray,
+        holdings: np.ndarray,
+        quantity: np.ndarray,
+    ) -> None:
+        """
+        Throws the error of the first trade that is not allowed given the positions
+        of the trades failing the funding, holdings and quantity checks
+        """
+        failures: List[Tuple[int, Exception]] = []
+        if len(funding) > 0:
+            position = start + int(funding[0])
+            failures.append(
+                (
+                    position,
+                    TradeNotAllowedError(Messages.INSUF_FUNDING.value, position),
+                )
+            )
+        if len(holdings) > 0:
+            position = start + int(holdings.min())
+            failures.append(
+                (
+                    position,
+                    TradeNotAllowedError(Messages.INSUF_HOLDINGS.value, position),
+                )
+            )
+        if len(quantity) > 0:
+            # Same error of the holding opened by the trade in the Python engine
+            position = start + int(quantity.min())
+            failures.append(
+                (position, TradeNotAllowedError("Invalid quantity", position))
+            )
+        if len(failures) > 0:
+            raise min(failures, key=lambda f: f[0])[1]
+
+
+def _to_money(values: np.ndarray) -> np.ndarray:
+    """Round the values to the closest integers, halves to even as round does"""
+    return np.rint(values).astype(np.int64)
+
+
+class _HoldingsHistory:
+    """Holdings and open lots at any position of the replayed trades"""
+
+    def __init__(
+        self,
+        columns: TradeColumns,
+        is_buy: np.ndarray,
+        int_quantity: np.ndarray,
+        initial_holdings: Dict[str, Tuple[int, OpenLots]],
+        symbol_trades: Dict[str, SymbolTrades],
+    ) -> None:
+        self._price = columns.price
+        self._is_buy = is_buy
+        self._int_quantity = int_quantity
+        self._initial_holdings = initial_holdings
+        self._symbol_trades = symbol_trades
+        self._symbols = list(initial_holdings) + [
+            s for s in symbol_trades if s not in initial_holdings
+        ]
+
+    def get_holdings(self, indexes: List[int]) -> List[HoldingsSnapshot]:
+        """
+        Return holdings and open lots before the trade at each of the given
+        indexes as stored in a Checkpoint, with holdings sorted by the time their
+        position was opened. Each symbol is processed once for all the indexes
+        """
+        targets = np.array(indexes, dtype=np.int64)
+        opened: List[List[Tuple[int, int, str, int, Tuple[Tuple[float, int], ...]]]]
+        opened = [[] for _ in indexes]
+        for rank, symbol in enumerate(self._symbols):
+            quantity, lots = self._initial_holdings.get(symbol, (0, []))
+            if symbol not in self._symbol_trades:
+                # Positions opened before the replay keep the order they had
+                entry = (-1, rank, symbol, quantity, tuple(lots))
+                for entries in opened:
+                    entries.append(entry)
+                continue
+            rows, held, held_before = self._symbol_trades[symbol]
+            buys = self._is_buy[rows]
+            # Lots of the symbol as the initial ones followed by the BUY trades
+            sizes = np.concatenate(
+                ([q for _, q in lots], self._int_quantity[rows[buys]])
+            ).astype(np.int64)
+            first = len(lots)
+            symbol_lots = list(lots) + list(
+                zip(self._price[rows[buys]].tolist(), sizes[first:].tolist())
+            )
+            covered = np.concatenate(([0], np.cumsum(sizes)))
+            # Quantity held and number of lots before each index
+            counts = np.searchsorted(rows, targets)
+            quantities = np.concatenate(([quantity], held))[counts]
+            ends = len(lots) + np.concatenate(([0], np.cumsum(buys)))[counts]
+            # The open lots are the most recent ones covering the quantity held,
+            # the lots before the last time the position was opened are closed
+            starts = np.searchsorted(covered, covered[ends] - quantities, "right") - 1
+            opens = rows[buys & (held_before == 0)]
+            openings = np.concatenate(([-1], opens))[np.searchsorted(opens, targets)]
+            open_indexes = np.flatnonzero(quantities >= 1)
+            for k, opening, held_quantity, first, end in zip(
+                open_indexes.tolist(),
+                openings[open_indexes].tolist(),
+                quantities[open_indexes].tolist(),
+                starts[open_indexes].tolist(),
+                ends[open_indexes].tolist(),
+            ):
+                opened[k].append(
+                    (
+                        opening,
+                        rank,
+                        symbol,
+                        held_quantity,
+                        tuple(symbol_lots[first:end]),
+                    )
+                )
+        snapshots = []
+        for entries in opened:
+            entries.sort(key=lambda o: (o[0], o[1]))
+            snapshots.append(tuple((o[2], o[3], o[4]) for o in entries))
+        return snapshots
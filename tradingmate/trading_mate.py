@@ -1,6 +1,7 @@
 import logging
 import re
 import subprocess
+import threading
 from pathlib import Path
 from typing import List
 
@@ -96,6 +97,17 @@ class TradingMate:
             if pf.get_id() == portfolio_id:
                 pf.add_trade(new_trade)
 
+    def new_trades_event(self, new_trades: List[Trade], portfolio_id: str) -> None:
+        """
+        Callback function to handle import of multiple trades at once
+        """
+        logging.info(
+            f"TradingMate - {len(new_trades)} new trades for portfolio {portfolio_id}"
+        )
+        for pf in self._portfolios:
+            if pf.get_id() == portfolio_id:
+                pf.add_trades(new_trades)
+
     def delete_trade_event(self, portfolio_id: str, trade_id: str) -> None:
         """
         Callback function to handle delete of a trade
@@ -109,6 +121,18 @@ class TradingMate:
             if pf.get_id() == portfolio_id:
                 pf.delete_trade(trade_id)
 
+    def load_older_trades_event(self, portfolio_id: str) -> None:
+        """
+        Callback function to handle request to load the trades older than the
+        opening balance of the portfolio. They are read in background
+        """
+        logging.info(
+            "TradingMate - load older trades for portfolio {}".format(portfolio_id)
+        )
+        for pf in self._portfolios:
+            if pf.get_id() == portfolio_id:
+                threading.Thread(target=pf.load_older_trades, daemon=True).start()
+
     def open_portfolio_event(self, filepath: Path) -> None:
         """
         Callback function to handle request to open a new portfolio file
@@ -118,16 +142,20 @@ class TradingMate:
         pf = Portfolio(self._config, filepath)
         self._portfolios.append(pf)
 
-    def save_portfolio_event(self, portfolio_id: str, filepath: Path) -> None:
+    def save_portfolio_event(
+        self, portfolio_id: str, filepath: Path, overwrite: bool = False
+    ) -> None:
         """
-        Callback function to handle request to save/export the portfolio
+        Callback function to handle request to save/export the portfolio.
+        When overwrite is True the changes of the trading log made by other
+        processes that could not be applied are discarded
         """
         logging.info(
             "TradingMate - save portfolio {} to {}".format(portfolio_id, filepath)
         )
         for pf in self._portfolios:
             if pf.get_id() == portfolio_id:
-                pf.save_portfolio(filepath)
+                pf.save_portfolio(filepath, overwrite)
 
     def get_settings_event(self):
         """
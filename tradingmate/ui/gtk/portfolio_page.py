@@ -1,5 +1,6 @@
 # flake8: noqa: E402 # Required to allow use of gi.require_version
 
+import math
 import os
 from pathlib import Path
 
@@ -9,7 +10,7 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import Gdk as gdk
 from gi.repository import Gtk as gtk
 
-from ...utils import Messages, Utils
+from ...utils import Messages, TradingLogConflictError, Utils
 from . import AddTradeWindow, ConfirmDialog, MessageDialog
 
 INVALID_STRING = "-"
@@ -37,6 +38,7 @@ TREE_TRADING_HISTORY = "trading_history_tree"
 TREE_TRADING_HISTORY_MENU = "trading_history_popover"
 TREE_TRADING_HISTORY_MENU_ADD = "trading_history_popover_add"
 TREE_TRADING_HISTORY_MENU_DELETE = "trading_history_popover_delete"
+TREE_TRADING_HISTORY_MENU_LOAD_OLDER = "trading_history_popover_load_older"
 
 
 class PortfolioPage(gtk.Box):
@@ -77,6 +79,9 @@ class PortfolioPage(gtk.Box):
         self._history_menu = builder.get_object(TREE_TRADING_HISTORY_MENU)
         _history_menu_add_item = builder.get_object(TREE_TRADING_HISTORY_MENU_ADD)
         _history_menu_delete_item = builder.get_object(TREE_TRADING_HISTORY_MENU_DELETE)
+        self._history_menu_load_older_item = builder.get_object(
+            TREE_TRADING_HISTORY_MENU_LOAD_OLDER
+        )
         # Link callbacks to widgets
         save_button.connect("clicked", self._on_save_event)
         save_as_button.connect("clicked", self._on_save_as_event)
@@ -88,6 +93,9 @@ class PortfolioPage(gtk.Box):
         )
         _history_menu_add_item.connect("clicked", self._on_add_event)
         _history_menu_delete_item.connect("clicked", self._on_delete_event)
+        self._history_menu_load_older_item.connect(
+            "clicked", self._on_load_older_trades_event
+        )
         # Set initial status of refresh switch and button based on portfolio status
         self._update_refresh_box()
         # Add the top level container to self
@@ -116,7 +124,24 @@ class PortfolioPage(gtk.Box):
         return False if self._cache["trade_history"] == trade_list else True
 
     def _on_save_event(self, widget):
-        self._server.save_portfolio_event(self._id, None)
+        try:
+            self._server.save_portfolio_event(self._id, None)
+        except TradingLogConflictError as e:
+            ConfirmDialog(
+                self._parent_window, str(e), self._on_confirmed_overwrite_event
+            ).show()
+        except RuntimeError as e:
+            MessageDialog(
+                self._parent_window, "Error", str(e), gtk.MessageType.ERROR
+            ).show()
+
+    def _on_confirmed_overwrite_event(self):
+        try:
+            self._server.save_portfolio_event(self._id, None, True)
+        except RuntimeError as e:
+            MessageDialog(
+                self._parent_window, "Error", str(e), gtk.MessageType.ERROR
+            ).show()
 
     def _on_save_as_event(self, widget):
         try:
@@ -158,6 +183,9 @@ class PortfolioPage(gtk.Box):
             self._on_confirmed_delete_trade_event,
         ).show()
 
+    def _on_load_older_trades_event(self, widget):
+        self._server.load_older_trades(self._id)
+
     def _on_confirmed_delete_trade_event(self):
         try:
             model, pathlist = self._history_tree.get_selection().get_selected_rows()
@@ -179,6 +207,7 @@ class PortfolioPage(gtk.Box):
         if (
             value is None
             or (isinstance(value, str) and len(value) < 1)
+            or (isinstance(value, float) and math.isnan(value))
             or (isinstance(value, float) and not negative_ok and value < 0.0)
             or (isinstance(value, int) and not negative_ok and value < 0)
         ):
@@ -187,35 +216,45 @@ class PortfolioPage(gtk.Box):
             value = round(value, 3)
         return str(value)
 
-    def _update_portfolio_balances(self, portfolio):
-        self._label_account.set_text(self._validate_value(portfolio.get_total_value()))
-        self._label_cash.set_text(self._validate_value(portfolio.get_cash_available()))
+    def _update_portfolio_balances(self, state):
+        self._label_account.set_text(self._validate_value(state.get_total_value()))
+        self._label_cash.set_text(self._validate_value(state.cash_available))
         self._label_positions.set_text(
-            self._validate_value(portfolio.get_holdings_value())
-        )
-        self._label_invested.set_text(
-            self._validate_value(portfolio.get_cash_deposited())
+            self._validate_value(state.summary.holdings_value)
         )
+        self._label_invested.set_text(self._validate_value(state.cash_deposited))
         self._label_pl.set_text(
-            self._validate_value(portfolio.get_portfolio_pl(), negative_ok=True)
+            self._validate_value(state.get_portfolio_pl(), negative_ok=True)
         )
         self._label_pl_pc.set_text(
-            self._validate_value(portfolio.get_portfolio_pl_perc(), negative_ok=True)
+            self._validate_value(state.get_portfolio_pl_perc(), negative_ok=True)
         )
 
-    def _update_positions_treeview(self, positions_list):
+    def _update_positions_treeview(self, holdings):
         self._positions_tree_model.clear()
-        for h in positions_list:
+        # Each column of the holdings table is computed at once, unknown values
+        # are NaN
+        rows = zip(
+            holdings.symbols,
+            holdings.quantity.tolist(),
+            holdings.open_price.tolist(),
+            holdings.last_price.tolist(),
+            holdings.get_costs().tolist(),
+            holdings.get_values().tolist(),
+            holdings.get_profit_loss().tolist(),
+            holdings.get_profit_loss_perc().tolist(),
+        )
+        for symbol, quantity, open_price, last_price, cost, value, pl, pl_perc in rows:
             self._positions_tree_model.append(
                 [
-                    self._validate_value(h.get_symbol()),
-                    self._validate_value(h.get_quantity()),
-                    self._validate_value(h.get_open_price()),
-                    self._validate_value(h.get_last_price()),
-                    self._validate_value(h.get_cost()),
-                    self._validate_value(h.get_value()),
-                    self._validate_value(h.get_profit_loss(), negative_ok=True),
-                    self._validate_value(h.get_profit_loss_perc(), negative_ok=True),
+                    self._validate_value(symbol),
+                    self._validate_value(quantity),
+                    self._validate_value(open_price),
+                    self._validate_value(last_price),
+                    self._validate_value(cost),
+                    self._validate_value(value),
+                    self._validate_value(pl, negative_ok=True),
+                    self._validate_value(pl_perc, negative_ok=True),
                 ]
             )
 
@@ -258,14 +297,24 @@ class PortfolioPage(gtk.Box):
     ### Public API
 
     def update_data(self, portfolio):
+        # Read balances and positions from the same snapshot of the portfolio
+        state = portfolio.get_state()
         # Update account balances labels
-        self._update_portfolio_balances(portfolio)
+        self._update_portfolio_balances(state)
         # Update current positions tree
-        self._update_positions_treeview(portfolio.get_holding_list())
+        self._update_positions_treeview(state.table)
         # Update history tree
         self._update_trading_history_treeview(portfolio.get_trade_history()[::-1])
+        # The trades older than the opening balance are loaded on request
+        self._history_menu_load_older_item.set_sensitive(portfolio.has_older_trades())
         # Restore refresh box status
         self._update_refresh_box()
+        # Report the background saves that failed
+        error = portfolio.pop_save_error()
+        if error is not None:
+            MessageDialog(
+                self._parent_window, "Error", error, gtk.MessageType.ERROR
+            ).show()
 
     def get_portfolio_path(self):
         return str(self._portfolio_path)
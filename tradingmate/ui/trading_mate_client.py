@@ -23,6 +23,10 @@ class TradingMateClient:
         """Push new trade notification to the server"""
         self._server.new_trade_event(new_trade, portfolio_id)
 
+    def new_trades_event(self, new_trades: List[Trade], portfolio_id: str) -> None:
+        """Push a list of new trades to the server"""
+        self._server.new_trades_event(new_trades, portfolio_id)
+
     def manual_refresh_event(self, portfolio_id: str) -> None:
         """Request server to refresh portfolio data"""
         self._server.manual_refresh_event(portfolio_id)
@@ -35,9 +39,11 @@ class TradingMateClient:
         """Request server to open a portfolio"""
         self._server.open_portfolio_event(filepath)
 
-    def save_portfolio_event(self, portfolio_id: str, filepath: Path) -> None:
+    def save_portfolio_event(
+        self, portfolio_id: str, filepath: Path, overwrite: bool = False
+    ) -> None:
         """Request server to save a portfolio"""
-        self._server.save_portfolio_event(portfolio_id, filepath)
+        self._server.save_portfolio_event(portfolio_id, filepath, overwrite)
 
     def get_settings_event(self) -> None:
         """Request server to fetch TradingMate settings"""
@@ -73,5 +79,8 @@ class TradingMateClient:
     def delete_trade(self, portfolio_id: str, trade_id: str) -> None:
         self._server.delete_trade_event(portfolio_id, trade_id)
 
+    def load_older_trades(self, portfolio_id: str) -> None:
+        self._server.load_older_trades_event(portfolio_id)
+
     def get_market_details(self, market_ticker: str) -> Any:
         return self._server.get_market_details(market_ticker)
@@ -1,3 +1,8 @@
-from .enums import Actions, Markets, Messages  # NOQA # isort:skip
+from .enums import Actions, Markets, Messages, ReplayEngines  # NOQA # isort:skip
 from .task_thread import TaskThread  # NOQA # isort:skip
 from .functions import Utils  # NOQA # isort:skip
+from .id_generator import IdGenerator, SESSION_ID_GENERATOR  # NOQA # isort:skip
+from .exceptions import (  # NOQA # isort:skip
+    TradeNotAllowedError,
+    TradingLogConflictError,
+)
@@ -19,6 +19,10 @@ class Messages(Enum):
     )
     ERROR_SAVE_FILE = "Error saving the log. Try again."
     ERROR_OPEN_FILE = "Error opening the file. Try again."
+    SAVE_CONFLICTS = (
+        "The log has been changed by another program and its changes can not be "
+        "applied. Overwrite them?"
+    )
     UNSAVED_CHANGES = "There are unsaved changes, are you sure?"
     ERROR_SAVE_SETTINGS = "Unable to save the settings"
     WINDOW_UNSUPPORTED_ACTION = "This window does not support the selected action"
@@ -31,3 +35,8 @@ class Messages(Enum):
 
 class Markets(Enum):
     LSE = "LSE"
+
+
+class ReplayEngines(Enum):
+    PYTHON = "python"
+    NUMPY = "numpy"
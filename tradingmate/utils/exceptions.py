@@ -0,0 +1,19 @@
+class TradeNotAllowedError(RuntimeError):
+    """Raised when a trade of the trade history is not allowed by the portfolio
+    state at that point of the history. The position is the index of the trade
+    in the replayed trade list
+    """
+
+    position: int
+
+    def __init__(self, message: str, position: int) -> None:
+        super(TradeNotAllowedError, self).__init__(message)
+        self.position = position
+
+
+class TradingLogConflictError(RuntimeError):
+    """Raised when saving a trading log that holds changes made by another
+    process that could not be applied to the portfolio
+    """
+
+    pass
@@ -1,7 +1,18 @@
+import bz2
+import gzip
 import json
 import logging
+import lzma
+import os
 from pathlib import Path
-from typing import Any
+from typing import IO, Any, Callable, Dict, Optional
+
+# Functions opening the files compressed with the format of each extension
+COMPRESSED_FILE_OPENERS: Dict[str, Callable[..., IO[Any]]] = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".bz2": bz2.open,
+}
 
 
 class Utils:
@@ -21,29 +32,69 @@ class Utils:
             - Return a dictionary of the loaded json
         """
         try:
-            with filepath.open(mode="r") as file:
+            with Utils.open_file(filepath, "r") as file:
                 return json.load(file)
         except Exception as e:
             logging.error("Unable to load JSON file {}".format(e))
         return None
 
     @staticmethod
-    def write_json_file(filepath: Path, data: Any) -> bool:
+    def write_json_file(filepath: Path, data: Any, compact: bool = False) -> bool:
         """
-        Write a python dict object into a file with json formatting
+        Write a python dict object into a file with json formatting. The data
+        is written to a temporary file that replaces the given file only once
+        it is complete, so the file is never left truncated
 
             -**filepath** The filepath
             -**data** The python dict to write
+            -**compact** optional, if True the json is written without indentation
             - Return True if succed, False otherwise
         """
+        temp_filepath = filepath.with_name(filepath.name + ".tmp")
         try:
-            with filepath.open(mode="w") as file:
-                json.dump(data, file, indent=4, separators=(",", ": "))
-                return True
+            with Utils.open_file(temp_filepath, "w", filepath.suffix) as file:
+                if compact:
+                    json.dump(data, file, separators=(",", ":"))
+                else:
+                    json.dump(data, file, indent=4, separators=(",", ": "))
+            # Make sure the data reaches the disk before replacing the file
+            fd = os.open(str(temp_filepath), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(str(temp_filepath), str(filepath))
+            return True
         except Exception as e:
             logging.error("Unable to write JSON file: {}".format(e))
+            if temp_filepath.exists():
+                temp_filepath.unlink()
         return False
 
+    @staticmethod
+    def open_file(filepath: Path, mode: str, suffix: Optional[str] = None) -> IO[Any]:
+        """
+        Open a text file compressing or decompressing it while it is written or
+        read if its extension is .gz, .xz or .bz2
+
+            -**filepath** The filepath
+            -**mode** "r" to read or "w" to write the file
+            -**suffix** optional, the extension defining the file format if it
+              is not the one of the filepath
+            - Return the file object
+        """
+        opener = COMPRESSED_FILE_OPENERS.get(suffix or filepath.suffix)
+        if opener is None:
+            return filepath.open(mode=mode)
+        return opener(str(filepath), mode + "t")
+
+    @staticmethod
+    def is_compressed_file(filepath: Path) -> bool:
+        """
+        Return True if the extension of the file is a supported compression format
+        """
+        return filepath.suffix in COMPRESSED_FILE_OPENERS
+
     @staticmethod
     def get_install_path() -> str:
         """
@@ -0,0 +1,29 @@
+import itertools
+import os
+import time
+from typing import Iterator
+
+
+class IdGenerator:
+    """Generator of unique ids made of a prefix unique to the generator followed by
+    a monotonic counter. The prefix is the creation time in milliseconds and a
+    random part, so ids of different sessions sort by creation time. Ids are 40
+    hex characters long as the SHA-1 ids of the older trading logs
+    """
+
+    _prefix: str
+    _counter: Iterator[int]
+
+    def __init__(self) -> None:
+        timestamp = int(time.time() * 1000) & 0xFFFFFFFFFFFF
+        self._prefix = "{:012x}{}".format(timestamp, os.urandom(6).hex())
+        self._counter = itertools.count(1)
+
+    def next_id(self) -> str:
+        """Return a new id, greater than any id returned before by this generator"""
+        # Calls of next on itertools.count are atomic so no lock is needed
+        return "{}{:016x}".format(self._prefix, next(self._counter))
+
+
+# Generator of the ids created in this session
+SESSION_ID_GENERATOR: IdGenerator = IdGenerator()